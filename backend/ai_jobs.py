@@ -0,0 +1,391 @@
+"""Background job queue for AI tool runs.
+
+POST /ai/jobs returns a job id straight away instead of holding the
+connection open for the whole LLM call; clients poll GET /ai/jobs/{id}
+(optionally long-polling with ?wait=), or subscribe to its Server-Sent
+Events. A bounded pool of QMS_AI_JOB_WORKERS workers takes queued jobs
+highest priority first and runs them through QMSAIService.execute_ai_tool,
+so every tool works exactly as through /ai/query.
+
+Jobs and their results are persisted in the ai_jobs table, and finished
+jobs are dropped after QMS_AI_JOB_RETENTION_HOURS. Several processes may
+share the table: each unfinished job is held by one process, which renews a
+QMS_AI_JOB_LEASE_SECONDS lease on it while it lives. A worker marks a job
+running with a conditional UPDATE, so only its holder ever runs it, and any
+process adopts (re-queues) jobs whose lease has lapsed, so work left by a
+crashed process is picked up again; such a job may therefore run twice
+(at-least-once). A clean shutdown releases its jobs for immediate adoption.
+
+Submitting a job identical to one this process holds queued or running
+(same tool, query and context) returns that job instead of queueing
+another; cancelling it therefore cancels it for every submitter. Jobs held
+by other processes are not deduplicated against and are followed by polling
+the table. Cancelling a job that another process is running records the
+request on its row, and that process cancels the job when it next renews
+its lease (or whoever adopts the job cancels it instead of running it).
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import crud
+
+AI_JOB_WORKERS = int(os.getenv("QMS_AI_JOB_WORKERS", "2"))
+AI_JOB_MAX_QUEUED = int(os.getenv("QMS_AI_JOB_MAX_QUEUED", "100"))
+AI_JOB_RETENTION_HOURS = float(os.getenv("QMS_AI_JOB_RETENTION_HOURS", "24"))
+AI_JOB_LEASE_SECONDS = float(os.getenv("QMS_AI_JOB_LEASE_SECONDS", "30"))
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+# How often finished jobs past the retention window are purged
+_PURGE_INTERVAL_SECONDS = 3600
+# How often watch() re-reads a job held by another process
+_POLL_SECONDS = 1.0
+
+logger = logging.getLogger("qms.ai_jobs")
+
+
+class JobQueueFull(Exception):
+    """Raised by submit() when QMS_AI_JOB_MAX_QUEUED jobs are already waiting"""
+
+
+def dedupe_key(tool: str, query: str, context: Optional[Dict]) -> str:
+    return json.dumps([tool, query, context], sort_keys=True, default=str)
+
+
+class AIJobQueue:
+    def __init__(
+        self, service, session_factory: Callable, workers: int = AI_JOB_WORKERS,
+        max_queued: int = AI_JOB_MAX_QUEUED, retention_hours: float = AI_JOB_RETENTION_HOURS,
+        lease_seconds: float = AI_JOB_LEASE_SECONDS
+    ):
+        self._service = service
+        self._session_factory = session_factory
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention = timedelta(hours=retention_hours)
+        self.lease = timedelta(seconds=lease_seconds)
+        # Identifies this queue in the owner column of the jobs it holds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Unfinished jobs live here; finished ones are only in the database
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._by_key: Dict[str, str] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._listeners: Dict[str, List[asyncio.Queue]] = {}
+        # (-priority, sequence, job_id); entries for jobs no longer queued are skipped when popped
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+
+    def _db_call(self, fn, *args, **kwargs):
+        """Run a crud function on its own session (called from the thread pool)"""
+        db = self._session_factory()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    async def start(self) -> None:
+        """Adopt unfinished jobs nobody holds any more and start the workers"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        await self._purge()
+        await self._adopt()
+        self._worker_tasks = [asyncio.create_task(self._worker(), name=f"qms-ai-job-worker-{index}")
+                              for index in range(self.workers)]
+        self._lease_task = asyncio.create_task(self._keep_leases(), name="qms-ai-job-leases")
+
+    async def stop(self) -> None:
+        """Stop the workers and release this process's unfinished jobs for adoption"""
+        tasks = self._worker_tasks + ([self._lease_task] if self._lease_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks, self._lease_task = [], None
+        self._queue = None
+        self._jobs.clear()
+        self._by_key.clear()
+        try:
+            await run_in_threadpool(self._db_call, crud.release_ai_jobs, self.owner)
+        except Exception:
+            # Not fatal: the jobs are adopted once their leases lapse instead
+            logger.exception("Could not release AI jobs")
+
+    def _push(self, job: Dict[str, Any]) -> None:
+        self._queue.put_nowait((-job["priority"], next(self._sequence), job["job_id"]))
+
+    def queued_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["status"] == "queued")
+
+    async def submit(
+        self, tool: str, query: str, context: Optional[Dict] = None, priority: int = 0
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Queue a tool run; returns (job, deduplicated). Raises ValueError for unknown tools."""
+        if self._queue is None:
+            raise RuntimeError("AI job queue is not running")
+        if tool not in self._service.tools:
+            raise ValueError(f"Unknown tool: {tool}")
+        key = dedupe_key(tool, query, context)
+        existing = self._jobs.get(self._by_key.get(key))
+        if existing is not None:
+            if existing["status"] == "queued" and priority > existing["priority"]:
+                # A more urgent duplicate moves the job up; its old queue entry is skipped later
+                existing["priority"] = priority
+                self._push(existing)
+                await self._persist(existing["job_id"], priority=priority)
+            return dict(existing), True
+        if self.queued_count() >= self.max_queued:
+            raise JobQueueFull(f"{self.max_queued} AI jobs are already queued")
+
+        job = {
+            "job_id": uuid.uuid4().hex, "tool": tool, "query": query, "context": context,
+            "priority": priority, "status": "queued", "result": None, "error": None,
+            "created_at": datetime.now(timezone.utc), "started_at": None, "finished_at": None,
+            "cancel_requested_at": None,
+        }
+        # Registered before the insert, so a concurrent identical submit dedupes onto this job
+        self._jobs[job["job_id"]] = job
+        self._by_key[key] = job["job_id"]
+        try:
+            await run_in_threadpool(self._db_call, crud.create_ai_job, job, self.owner, self._lease_until())
+        except Exception:
+            self._forget(job)
+            raise
+        self._push(job)
+        return dict(job), False
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+        return await run_in_threadpool(self._db_call, crud.get_ai_job, job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job and return it.
+
+        Queued jobs are cancelled straight away, whichever process holds them. A job another
+        process is running, or one here that does not unwind within a few seconds, is returned
+        still running with cancel_requested_at set; its holder finishes the cancellation.
+        Finished jobs are returned unchanged.
+        """
+        now = datetime.now(timezone.utc)
+        job = self._jobs.get(job_id)
+        if job is None:
+            # Held by another process: its worker skips a job cancelled while queued, and a
+            # running one is cancelled when that process next renews its lease
+            if not await run_in_threadpool(self._db_call, crud.cancel_queued_ai_job, job_id, now):
+                await run_in_threadpool(self._db_call, crud.request_ai_job_cancel, job_id, now)
+            return await self.get(job_id)
+        if job["status"] == "queued":
+            await self._finish(job, "cancelled")
+            return dict(job)
+        # Recorded too, so a process that adopts the job after this one dies cancels it
+        job["cancel_requested_at"] = now
+        await self._persist(job_id, cancel_requested_at=now)
+        self._cancel_held(job_id)
+        # The worker records the cancellation once the tool has unwound
+        return await self.wait(job_id, timeout=5.0)
+
+    def _cancel_held(self, job_id: str) -> None:
+        """Cancel the task running a job this process holds, if it has one"""
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+
+    async def watch(self, job_id: str, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield the job now and after every status change until it finishes.
+
+        With a heartbeat, None is yielded whenever that many seconds pass without a change.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        listeners = self._listeners.setdefault(job_id, [])
+        listeners.append(queue)
+        try:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield job
+            last_yield = time.monotonic()
+            while job["status"] not in FINISHED_STATUSES:
+                held = job_id in self._jobs
+                # Jobs held by another process publish nothing here, so they are polled
+                timeout = heartbeat if held else min(_POLL_SECONDS, heartbeat or _POLL_SECONDS)
+                try:
+                    update = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    update = None
+                    if not held:
+                        polled = await self.get(job_id)
+                        if polled is None:
+                            return
+                        if polled["status"] != job["status"]:
+                            update = polled
+                if update is not None:
+                    job = update
+                    yield job
+                    last_yield = time.monotonic()
+                elif heartbeat is not None and time.monotonic() - last_yield >= heartbeat:
+                    yield None
+                    last_yield = time.monotonic()
+        finally:
+            listeners.remove(queue)
+            if not listeners:
+                self._listeners.pop(job_id, None)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """The job once it finishes, or as it stands after `timeout` seconds"""
+        last = None
+
+        async def follow() -> None:
+            nonlocal last
+            async with contextlib.aclosing(self.watch(job_id)) as updates:
+                async for job in updates:
+                    last = job
+
+        try:
+            await asyncio.wait_for(follow(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return last
+
+    def _publish(self, job: Dict[str, Any]) -> None:
+        for queue in self._listeners.get(job["job_id"], ()):
+            queue.put_nowait(dict(job))
+
+    def _forget(self, job: Dict[str, Any]) -> None:
+        self._jobs.pop(job["job_id"], None)
+        key = dedupe_key(job["tool"], job["query"], job["context"])
+        if self._by_key.get(key) == job["job_id"]:
+            del self._by_key[key]
+
+    async def _persist(self, job_id: str, **fields) -> None:
+        try:
+            # Only while this process holds the job; one that was taken over belongs to its adopter
+            await run_in_threadpool(self._db_call, crud.update_ai_job, job_id, owned_by=self.owner, **fields)
+        except Exception:
+            # The in-memory job stays authoritative while it is unfinished; a lost write only
+            # matters for polling after it finishes or across a restart
+            logger.exception("Could not persist AI job %s", job_id)
+
+    async def _finish(self, job: Dict[str, Any], status: str, result: Optional[Dict] = None,
+                      error: Optional[str] = None) -> None:
+        job.update(status=status, result=result, error=error, finished_at=datetime.now(timezone.utc))
+        await self._persist(job["job_id"], status=status, result=result, error=error, finished_at=job["finished_at"])
+        self._forget(job)
+        self._publish(job)
+
+    def _lease_until(self) -> datetime:
+        return datetime.now(timezone.utc) + self.lease
+
+    async def _adopt(self) -> None:
+        """Queue the unfinished jobs whose holder let its lease lapse"""
+        now = datetime.now(timezone.utc)
+        for job in await run_in_threadpool(self._db_call, crud.adopt_expired_ai_jobs, self.owner, now, now + self.lease):
+            if job["cancel_requested_at"] is not None:
+                # Its previous holder was asked to cancel it and never got to
+                await self._finish(job, "cancelled")
+                continue
+            self._jobs[job["job_id"]] = job
+            self._by_key.setdefault(dedupe_key(job["tool"], job["query"], job["context"]), job["job_id"])
+            self._push(job)
+            self._publish(job)
+
+    async def _keep_leases(self) -> None:
+        """Renew this process's leases and adopt lapsed jobs, several times per lease period"""
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                cancel_requested = await run_in_threadpool(self._db_call, crud.renew_ai_job_leases, self.owner,
+                                                           list(self._jobs), self._lease_until())
+                for job_id in cancel_requested:
+                    await self._cancel_requested(job_id)
+                await self._adopt()
+            except Exception:
+                logger.exception("Could not renew or adopt AI job leases")
+            if time.monotonic() - self._last_purge > _PURGE_INTERVAL_SECONDS:
+                await self._purge()
+
+    async def _cancel_requested(self, job_id: str) -> None:
+        """Act on a cancellation another process recorded for a job this one holds"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        if job["status"] == "queued":
+            await self._finish(job, "cancelled")
+        else:
+            self._cancel_held(job_id)
+
+    async def _purge(self) -> None:
+        self._last_purge = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - self.retention
+        try:
+            await run_in_threadpool(self._db_call, crud.delete_finished_ai_jobs, cutoff)
+        except Exception:
+            logger.exception("Could not purge finished AI jobs")
+
+    async def _execute(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        db = self._session_factory()
+        try:
+            return await self._service.execute_ai_tool(job["tool"], job["query"], db, job["context"])
+        finally:
+            db.close()
+
+    async def _worker(self) -> None:
+        while True:
+            priority, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued" or -priority != job["priority"]:
+                continue
+            started_at = datetime.now(timezone.utc)
+            try:
+                claimed = await run_in_threadpool(self._db_call, crud.claim_ai_job, job_id, self.owner, started_at)
+            except Exception:
+                logger.exception("Could not claim AI job %s", job_id)
+                await self._finish(job, "failed", error="AI job could not be started")
+                continue
+            if job["status"] != "queued":
+                # Cancelled here while the claim was in flight; make sure the claim does not outlive that
+                if claimed:
+                    await self._persist(job_id, status=job["status"], finished_at=job["finished_at"])
+                continue
+            if not claimed:
+                # Cancelled through another process, or adopted by one after this process's lease lapsed
+                self._forget(job)
+                self._publish(await self.get(job_id) or job)
+                continue
+            job.update(status="running", started_at=started_at)
+            # Registered before the next await, so cancel() always finds a running job's task
+            task = asyncio.create_task(self._execute(job))
+            self._running[job_id] = task
+            self._publish(job)
+            try:
+                # wait() rather than awaiting the task, so cancelling the job is not mistaken for shutdown
+                await asyncio.wait((task,))
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                self._running.pop(job_id, None)
+
+            if task.cancelled():
+                await self._finish(job, "cancelled")
+            elif task.exception() is not None:
+                await self._finish(job, "failed", error=f"AI service error: {task.exception()}")
+            else:
+                # Round-trip through JSON so the result column never sees dates or other objects
+                result = json.loads(json.dumps(task.result(), default=str))
+                error = result.get("error") if isinstance(result, dict) else None
+                await self._finish(job, "failed" if error else "completed", result=result,
+                                   error=str(error) if error else None)
@@ -1,19 +1,241 @@
 import os
 import json
 import re
-from typing import List, Dict, Any, Optional
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import inspect
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, Tuple
 from datetime import datetime, date, timedelta
 from sqlalchemy.orm import Session
-import google.generativeai as genai
 from models import Audit, AuditStatus, AuditType
+import analytics
 import crud
+import llm_providers
+import metrics
+import prompt_encoding
+import risk
+
+# LLM execution limits (overridable via environment)
+AI_MAX_CONCURRENCY = int(os.getenv("QMS_AI_MAX_CONCURRENCY", "4"))
+AI_TIMEOUT_SECONDS = float(os.getenv("QMS_AI_TIMEOUT_SECONDS", "60"))
+AI_CACHE_SIZE = int(os.getenv("QMS_AI_CACHE_SIZE", "128"))
+AI_CACHE_TTL_SECONDS = float(os.getenv("QMS_AI_CACHE_TTL_SECONDS", "300"))
+# Token budget for the audit data in one prompt; larger inputs are map-reduced in chunks
+AI_CHUNK_TOKEN_BUDGET = int(os.getenv("QMS_AI_CHUNK_TOKENS", "6000"))
+# Per-chunk results are keyed by chunk content, so they survive audit writes
+AI_CHUNK_CACHE_SIZE = int(os.getenv("QMS_AI_CHUNK_CACHE_SIZE", "1024"))
+AI_CHUNK_CACHE_TTL_SECONDS = float(os.getenv("QMS_AI_CHUNK_CACHE_TTL_SECONDS", "86400"))
+
+# Tool requests a single /ai/batch call may carry, and how many of them run at once
+AI_BATCH_MAX_ITEMS = int(os.getenv("QMS_AI_BATCH_MAX_ITEMS", "10"))
+AI_BATCH_MAX_CONCURRENCY = int(os.getenv("QMS_AI_BATCH_MAX_CONCURRENCY", str(AI_MAX_CONCURRENCY)))
+# Idle interval after which a streaming response sends a keep-alive
+AI_STREAM_HEARTBEAT_SECONDS = float(os.getenv("QMS_AI_STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Audits listed by show_high_risk_events unless the context asks for another limit
+HIGH_RISK_TOP_N = int(os.getenv("QMS_HIGH_RISK_TOP_N", "10"))
+# Upper bound on a requested limit; every listed audit goes into the commentary prompt
+HIGH_RISK_MAX_TOP_N = int(os.getenv("QMS_HIGH_RISK_MAX_TOP_N", "50"))
+
+# Tools whose answer depends only on the query and the audit table contents
+CACHEABLE_TOOLS = {"show_high_risk_events", "summarize_open_events", "identify_trends"}
+
+# Queue that LLM output chunks are copied to while a tool runs under stream_ai_tool()
+_token_sink: contextvars.ContextVar[Optional[asyncio.Queue]] = contextvars.ContextVar("qms_ai_token_sink", default=None)
+
+# Tool label for the LLM call metrics recorded while execute_ai_tool() runs
+_current_tool: contextvars.ContextVar[str] = contextvars.ContextVar("qms_ai_tool", default="unknown")
+
+
+class _StreamedResponse:
+    """The full text of a streamed generation, shaped like a generate_content response"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def chunk_spans(lines: List[str], budget: int = AI_CHUNK_TOKEN_BUDGET) -> List[Tuple[int, int]]:
+    """Split prompt lines into [start, end) chunks of at most budget tokens (an oversized line gets
+    a chunk of its own).
+
+    Boundaries are content-defined: once a chunk is half full it also ends after any line
+    whose hash is 0 mod 4, so an edited, added or removed line only moves the boundaries
+    next to it and the other chunks keep their fingerprints.
+    """
+    spans: List[Tuple[int, int]] = []
+    start, size = 0, 0
+    for index, line in enumerate(lines):
+        tokens = llm_providers.estimate_tokens(line)
+        if index > start and size + tokens > budget:
+            spans.append((start, index))
+            start, size = index, 0
+        size += tokens
+        if size >= budget // 2 and zlib.crc32(line.encode()) % 4 == 0:
+            spans.append((start, index + 1))
+            start, size = index + 1, 0
+    if start < len(lines):
+        spans.append((start, len(lines)))
+    return spans
+
+
+# Columns of the open-audit table in summarize_open_events prompts
+OPEN_AUDIT_COLUMNS = (
+    ("audit_id", "text"), ("title", "text"), ("type", "type"), ("status", "status"), ("auditee", "text"),
+    ("lead_auditor", "name"), ("start_date", "date"), ("end_date", "date"),
+)
+HIGH_RISK_COLUMNS = (("audit_id", "text"), ("risk_score", "text"), ("risk_factors", "list"))
+
+
+def high_risk_limit(value: Any) -> int:
+    """A context-supplied limit as an int in 1..HIGH_RISK_MAX_TOP_N; unparseable values get the default"""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError, OverflowError):
+        limit = HIGH_RISK_TOP_N
+    return max(1, min(limit, HIGH_RISK_MAX_TOP_N))
+
+
+def open_audit_summary(audit) -> Dict[str, Any]:
+    """The fields of an open audit that summarize_open_events reports and prompts with"""
+    return {
+        "audit_id": audit.audit_id,
+        "title": audit.audit_title,
+        "type": audit.audit_type.value if audit.audit_type else "",
+        "status": audit.status.value if audit.status else "",
+        "auditee": audit.auditee_name,
+        "lead_auditor": audit.lead_auditor,
+        "start_date": audit.confirmed_start_date.isoformat() if audit.confirmed_start_date else "",
+        "end_date": audit.confirmed_end_date.isoformat() if audit.confirmed_end_date else ""
+    }
+
+
+class AuditSnapshot:
+    """Audit reads the AI tools share; each is loaded at most once per snapshot.
+
+    Every tool call gets a snapshot; a batch shares one between its tools.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._loaded: Dict[Any, Any] = {}
+
+    def _load(self, key, loader):
+        if key not in self._loaded:
+            self._loaded[key] = loader()
+        return self._loaded[key]
+
+    def fingerprint(self) -> tuple:
+        return self._load("fingerprint", lambda: crud.get_audits_fingerprint(self.db))
+
+    def open_audits(self, created_since: Optional[date] = None) -> List[Any]:
+        return self._load(("open_audits", created_since), lambda: crud.get_open_audits(self.db, created_since))
+
+    def audit(self, audit_id: str) -> Optional[Audit]:
+        return self._load(("audit", audit_id), lambda: crud.get_audit(self.db, audit_id))
+
+    def trend_stats(self) -> Dict[str, Any]:
+        return self._load("trend_stats", lambda: analytics.trend_stats(self.db))
+
+    def high_risk_audits(self, limit: int) -> Tuple[list, int]:
+        def load():
+            crud.ensure_risk_scores_current(self.db)
+            return crud.get_high_risk_audits(self.db, limit=limit)
+        return self._load(("high_risk", limit), load)
+
+
+class AIResponseCache:
+    """LRU + TTL cache for tool results with single-flight for identical in-flight requests"""
+
+    def __init__(self, max_size: int = AI_CACHE_SIZE, ttl: float = AI_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._waiters: Dict[tuple, int] = {}
+
+    @staticmethod
+    def make_key(tool_name: str, query: str, context: Optional[Dict], fingerprint: tuple) -> tuple:
+        normalized_query = " ".join(query.lower().split())
+        normalized_context = json.dumps(context or {}, sort_keys=True, default=str)
+        return (tool_name, normalized_query, normalized_context, fingerprint)
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple, value: Dict[str, Any]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_compute(self, key: tuple, compute) -> Dict[str, Any]:
+        """Return a cached result, join an identical in-flight call, or run compute()"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(compute())
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda task: self._finish(key, task))
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                if not pending.done():
+                    # Every caller has gone away (a streaming client disconnected); stop the work
+                    pending.cancel()
+
+    def _finish(self, key: tuple, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        # Only complete, successful analyses are worth reusing
+        if result.get("success") and not result.get("error") and not result.get("partial"):
+            self.put(key, result)
 
 class QMSAIService:
-    def __init__(self):
-        # Configure Gemini API
-        api_key = "api key here"
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(
+        self, max_concurrency: int = AI_MAX_CONCURRENCY, timeout: float = AI_TIMEOUT_SECONDS,
+        provider: Optional[llm_providers.LLMProvider] = None
+    ):
+        # Gemini unless QMS_LLM_PROVIDER selects another provider (e.g. the offline stub)
+        self.model = provider or llm_providers.create_provider()
+
+        # Blocking LLM calls run on a bounded pool so they never stall the event loop
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="qms-ai")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Cached tool results are dropped whenever an audit is written
+        self.cache = AIResponseCache()
+        crud.register_audit_write_listener(self.cache.clear)
+        # Map-reduce chunk results are keyed by content instead and outlive writes
+        self.chunk_cache = AIResponseCache(max_size=AI_CHUNK_CACHE_SIZE, ttl=AI_CHUNK_CACHE_TTL_SECONDS)
         
         # AI Tools definitions
         self.tools = {
@@ -44,6 +266,184 @@ class QMSAIService:
             }
         }
 
+    async def stream_ai_tool(
+        self, tool_name: str, query: str, db: Session, context: Optional[Dict] = None,
+        heartbeat: float = AI_STREAM_HEARTBEAT_SECONDS
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Run execute_ai_tool, yielding ("token", text) as the LLM writes, ("heartbeat", None)
+        while idle and finally ("result", result). Closing the iterator cancels the tool."""
+        queue: asyncio.Queue = asyncio.Queue()
+        reset = _token_sink.set(queue)
+        try:
+            # The task copies the current context, so the tool's LLM calls see the sink
+            task = asyncio.ensure_future(self.execute_ai_tool(tool_name, query, db, context))
+        finally:
+            _token_sink.reset(reset)
+        getter = None
+        try:
+            while not task.done():
+                getter = getter or asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, task}, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield "token", getter.result()
+                    getter = None
+                elif not done:
+                    yield "heartbeat", None
+            if getter is not None and getter.done():
+                yield "token", getter.result()
+            while not queue.empty():
+                yield "token", queue.get_nowait()
+            yield "result", task.result()
+        finally:
+            if getter is not None:
+                getter.cancel()
+            if not task.done():
+                task.cancel()
+
+    def _supports_streaming(self) -> bool:
+        try:
+            parameters = inspect.signature(self.model.generate_content).parameters
+        except (TypeError, ValueError):
+            return False
+        return "stream" in parameters or any(p.kind is p.VAR_KEYWORD for p in parameters.values())
+
+    @contextlib.asynccontextmanager
+    async def _llm_slot(self, prompt: str):
+        """Hold one of the max_concurrency LLM slots for a call, recording its latency, prompt size and failure.
+
+        Yields run(fn, *args), which starts the blocking call on the executor. The slot is released
+        when that call's thread finishes, not when the caller stops waiting: a timed-out call keeps
+        its executor worker until generate_content returns, and later calls must not queue behind it.
+        """
+        tool = _current_tool.get()
+        metrics.LLM_PROMPT_TOKENS.observe(llm_providers.estimate_tokens(prompt), tool)
+        loop = asyncio.get_running_loop()
+        await self._semaphore.acquire()
+        handed_off = False
+
+        def release(_) -> None:
+            try:
+                loop.call_soon_threadsafe(self._semaphore.release)
+            except RuntimeError:
+                # The event loop is already closed; nobody is left to wait for the slot
+                pass
+
+        def run(fn, *args) -> asyncio.Future:
+            nonlocal handed_off
+            future = self._executor.submit(fn, *args)
+            handed_off = True
+            future.add_done_callback(release)
+            return asyncio.wrap_future(future, loop=loop)
+
+        started = time.perf_counter()
+        try:
+            yield run
+        except TimeoutError:
+            metrics.LLM_FAILURES.inc(tool, "timeout")
+            raise
+        except Exception:
+            metrics.LLM_FAILURES.inc(tool, "error")
+            raise
+        finally:
+            metrics.LLM_CALL_SECONDS.observe(time.perf_counter() - started, tool)
+            if not handed_off:
+                self._semaphore.release()
+
+    async def _generate(self, prompt: str, stream: bool = True):
+        """Run a blocking generate_content call off the event loop with a concurrency cap and timeout.
+
+        Output is streamed to the caller's token sink, if any, unless stream is False.
+        """
+        sink = _token_sink.get()
+        if stream and sink is not None and self._supports_streaming():
+            return await self._generate_streaming(prompt, sink)
+        async with self._llm_slot(prompt) as run:
+            future = run(self.model.generate_content, prompt)
+            try:
+                return await asyncio.wait_for(future, timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"LLM call exceeded {self.timeout:g}s timeout")
+
+    async def _generate_streaming(self, prompt: str, sink: asyncio.Queue) -> _StreamedResponse:
+        """_generate with stream=True, copying each chunk's text to sink as it arrives"""
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+
+        def consume() -> str:
+            parts = []
+            for chunk in self.model.generate_content(prompt, stream=True):
+                if stop.is_set():
+                    # The caller is gone; abandon the rest of the stream
+                    break
+                text = chunk.text
+                if text:
+                    parts.append(text)
+                    loop.call_soon_threadsafe(sink.put_nowait, text)
+            return "".join(parts)
+
+        async with self._llm_slot(prompt) as run:
+            future = run(consume)
+            try:
+                return _StreamedResponse(await asyncio.wait_for(future, timeout=self.timeout))
+            except asyncio.TimeoutError:
+                stop.set()
+                raise TimeoutError(f"LLM call exceeded {self.timeout:g}s timeout")
+            except asyncio.CancelledError:
+                stop.set()
+                raise
+
+    async def _map_reduce(
+        self, tool_name: str, items: List[Any], lines: List[str], encode: Callable[[List[Any]], str],
+        map_prompt: Callable[[str], str], combine_prompt: Callable[[str], str]
+    ) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """Condense items whose prompt lines exceed the token budget into partial results that fit one prompt.
+
+        lines[i] is item i as it will appear in a prompt and sizes the chunks; each chunk of items
+        is rendered with encode(). Chunks are mapped in parallel (still under the LLM concurrency
+        cap); while the partial results are too large themselves they are combined in further
+        rounds. Returns (partials, chunk count, complete); complete is False if any chunk failed.
+        """
+        complete = True
+        spans = chunk_spans(lines)
+        chunk_count = len(spans)
+        texts = [encode(items[start:end]) for start, end in spans]
+        stage, build_prompt = "map", map_prompt
+        while True:
+            results = await asyncio.gather(
+                *(self._chunk_result(tool_name, stage, text, build_prompt) for text in texts)
+            )
+            partials = [result for result in results if result is not None]
+            complete = complete and len(partials) == len(results)
+            lines = [json.dumps(partial, separators=(",", ":")) for partial in partials]
+            if llm_providers.estimate_tokens("\n".join(lines)) <= AI_CHUNK_TOKEN_BUDGET:
+                return partials, chunk_count, complete
+            spans = chunk_spans(lines)
+            if len(spans) >= len(lines):
+                # Every partial fills a chunk on its own; combining further cannot shrink them
+                return partials, chunk_count, complete
+            texts = ["\n".join(lines[start:end]) for start, end in spans]
+            stage, build_prompt = "combine", combine_prompt
+
+    async def _chunk_result(
+        self, tool_name: str, stage: str, chunk_text: str, build_prompt: Callable[[str], str]
+    ) -> Optional[Dict[str, Any]]:
+        """LLM result for one chunk, cached on the chunk's fingerprint; None if it failed"""
+        key = (tool_name, stage, hashlib.sha1(chunk_text.encode()).hexdigest())
+
+        async def compute() -> Dict[str, Any]:
+            # Chunk output is not the answer; keep it out of any token stream
+            response = await self._generate(build_prompt(chunk_text), stream=False)
+            result = self._extract_json_from_response(response.text)
+            if result.get("fallback"):
+                return {"success": False, "error": result.get("error")}
+            return {"success": True, "result": result}
+
+        try:
+            outcome = await self.chunk_cache.get_or_compute(key, compute)
+        except Exception:
+            return None
+        return outcome["result"] if outcome.get("success") else None
+
     def _extract_json_from_response(self, response_text: str) -> Dict[str, Any]:
         """Extract JSON from AI response, handling various formats"""
         try:
@@ -88,110 +488,171 @@ class QMSAIService:
             "error": "AI returned non-JSON response. Check raw response for details."
         }
 
-    async def execute_ai_tool(self, tool_name: str, query: str, db: Session, context: Optional[Dict] = None) -> Dict[str, Any]:
+    async def execute_ai_tool(
+        self, tool_name: str, query: str, db: Session, context: Optional[Dict] = None,
+        snapshot: Optional[AuditSnapshot] = None
+    ) -> Dict[str, Any]:
         """Execute AI tool based on tool name and query"""
+        label = tool_name if tool_name in self.tools else "unknown"
+        token = _current_tool.set(label)
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self._execute_ai_tool(tool_name, query, db, context, snapshot)
+            if isinstance(result, dict) and not (result.get("error") or result.get("commentary_error")):
+                outcome = "ok"
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            _current_tool.reset(token)
+            metrics.AI_TOOL_SECONDS.observe(time.perf_counter() - started, label)
+            metrics.AI_TOOL_RUNS.inc(label, outcome)
+
+    async def _execute_ai_tool(
+        self, tool_name: str, query: str, db: Session, context: Optional[Dict],
+        snapshot: Optional[AuditSnapshot]
+    ) -> Dict[str, Any]:
+        snapshot = snapshot or AuditSnapshot(db)
+        if tool_name not in CACHEABLE_TOOLS:
+            return await self._run_tool(tool_name, query, db, context, snapshot)
+
+        try:
+            fingerprint = snapshot.fingerprint()
+        except Exception as e:
+            return {"error": f"AI service error: {str(e)}"}
+        key = self.cache.make_key(tool_name, query, context, fingerprint)
+        return await self.cache.get_or_compute(key, lambda: self._run_tool(tool_name, query, db, context, snapshot))
+
+    async def iter_ai_batch(
+        self, requests: List[Tuple[str, str, Optional[Dict]]], db: Session,
+        max_concurrency: int = AI_BATCH_MAX_CONCURRENCY
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Run (tool, query, context) requests concurrently over one shared audit snapshot,
+        yielding (index, result) as each finishes. Closing the iterator cancels the rest."""
+        snapshot = AuditSnapshot(db)
+        limit = asyncio.Semaphore(max(1, max_concurrency))
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def run(index: int, tool_name: str, query: str, context: Optional[Dict]) -> None:
+            try:
+                async with limit:
+                    result = await self.execute_ai_tool(tool_name, query, db, context, snapshot)
+            except Exception as e:
+                result = {"error": f"AI service error: {str(e)}"}
+            finished.put_nowait((index, result))
+
+        batch = asyncio.gather(*(run(index, *request) for index, request in enumerate(requests)))
+        try:
+            for _ in requests:
+                yield await finished.get()
+            await batch
+        finally:
+            if not batch.done():
+                batch.cancel()
+                # Nobody awaits the cancelled batch; consume its outcome so asyncio does not log it
+                batch.add_done_callback(lambda future: future.cancelled() or future.exception())
+
+    async def _run_tool(
+        self, tool_name: str, query: str, db: Session, context: Optional[Dict] = None,
+        snapshot: Optional[AuditSnapshot] = None
+    ) -> Dict[str, Any]:
+        """Dispatch to the tool implementation"""
+        snapshot = snapshot or AuditSnapshot(db)
         try:
             if tool_name == "show_high_risk_events":
-                return await self._show_high_risk_events(query, db)
+                return await self._show_high_risk_events(query, snapshot, context)
             elif tool_name == "summarize_open_events":
-                return await self._summarize_open_events(query, db)
+                return await self._summarize_open_events(query, snapshot)
             elif tool_name == "suggest_next_steps":
-                return await self._suggest_next_steps(query, db, context)
+                return await self._suggest_next_steps(query, snapshot, context)
             elif tool_name == "identify_trends":
-                return await self._identify_trends(query, db)
+                return await self._identify_trends(query, snapshot)
             elif tool_name == "generate_notification":
-                return await self._generate_notification(query, db, context)
+                return await self._generate_notification(query, snapshot, context)
             else:
                 return {"error": f"Unknown tool: {tool_name}"}
                 
         except Exception as e:
             return {"error": f"AI service error: {str(e)}"}
 
-    async def _show_high_risk_events(self, query: str, db: Session) -> Dict[str, Any]:
-        """Identify high-risk audit events"""
+    async def _show_high_risk_events(self, query: str, snapshot: AuditSnapshot, context: Optional[Dict] = None) -> Dict[str, Any]:
+        """Identify high-risk audit events from the stored rule-based scores; the LLM only comments"""
         try:
-            # Get all audits
-            audits = crud.get_audits(db, limit=1000)
-            
-            # Prepare audit data for AI analysis
-            audit_data = []
-            for audit in audits:
-                audit_info = {
-                    "audit_id": audit.audit_id,
-                    "title": audit.audit_title,
-                    "type": audit.audit_type.value if audit.audit_type else "",
-                    "status": audit.status.value if audit.status else "",
-                    "auditee": audit.auditee_name,
-                    "country": audit.auditee_country,
-                    "start_date": audit.confirmed_start_date.isoformat() if audit.confirmed_start_date else "",
-                    "end_date": audit.confirmed_end_date.isoformat() if audit.confirmed_end_date else "",
-                    "lead_auditor": audit.lead_auditor,
-                    "scope": audit.audit_scope
-                }
-                audit_data.append(audit_info)
-
-            # Create AI prompt with explicit JSON format instructions
+            context = context or {}
+            rows, total_high_risk = snapshot.high_risk_audits(high_risk_limit(context.get("limit", HIGH_RISK_TOP_N)))
+
+            high_risk_audits = [
+                {
+                    "audit_id": row.audit_id,
+                    "risk_score": row.risk_score,
+                    "risk_factors": row.risk_factors or [],
+                    "recommendations": []
+                } for row in rows
+            ]
+            ai_result = {
+                "high_risk_audits": high_risk_audits,
+                "summary": f"{total_high_risk} audit(s) score {risk.HIGH_RISK_MIN_SCORE}/10 or higher on the risk rules",
+                "total_high_risk": total_high_risk
+            }
+            result = {
+                "tool": "show_high_risk_events",
+                "query": query,
+                "ai_analysis": ai_result,
+                "filtered_audits": [
+                    {
+                        "id": row.id,
+                        "audit_id": row.audit_id,
+                        "audit_title": row.audit_title,
+                        "audit_type": row.audit_type.value if row.audit_type else "",
+                        "status": row.status.value if row.status else "",
+                        "auditee_name": row.auditee_name,
+                        "lead_auditor": row.lead_auditor,
+                        "confirmed_end_date": row.confirmed_end_date.isoformat() if row.confirmed_end_date else "",
+                        "auditee_country": row.auditee_country
+                    } for row in rows
+                ],
+                "success": True
+            }
+            if not high_risk_audits or not context.get("commentary", True):
+                return result
+
             prompt = f"""
 IMPORTANT: You must respond with ONLY valid JSON, no additional text, explanations, or markdown formatting.
 
-As a QMS expert, analyze the audit data and identify high-risk events. Return ONLY this JSON structure:
+As a QMS expert, comment on these high-risk audits. Their risk scores and factors are final; do not change them.
+Return ONLY this JSON structure:
 
 {{
-    "high_risk_audits": [
-        {{
-            "audit_id": "string",
-            "risk_score": 8,
-            "risk_factors": ["Regulatory audit", "Critical materials"],
-            "recommendations": ["Immediate review required"]
-        }}
-    ],
     "summary": "Brief summary of findings",
-    "total_high_risk": 3
+    "recommendations": {{"<audit_id>": ["Immediate review required"]}}
 }}
 
 Query: {query}
-Audit Data: {json.dumps(audit_data[:10])}  # Limit data to prevent token overflow
-
-Criteria for high-risk:
-- Regulatory audits (score 9-10)
-- Supplier/Vendor audits with critical materials (score 7-8)
-- Overdue or delayed audits (score 6-8)
-- Audits with broad scope (score 6-7)
-- Multi-site or international audits (score 5-7)
+High-risk audits ({total_high_risk} in total, top {len(high_risk_audits)} shown):
+{prompt_encoding.AuditTable(HIGH_RISK_COLUMNS).encode(high_risk_audits)}
 
 Return only the JSON response:
 """
+            try:
+                response = await self._generate(prompt)
+                commentary = self._extract_json_from_response(response.text)
+            except Exception as e:
+                commentary = {"fallback": True, "error": str(e)}
+            if commentary.get("fallback"):
+                # Scores stand on their own; report the missing commentary without caching the result
+                result["partial"] = True
+                result["commentary_error"] = commentary.get("error")
+                return result
 
-            response = self.model.generate_content(prompt)
-            ai_result = self._extract_json_from_response(response.text)
-            
-            # Handle fallback response
-            if ai_result.get("fallback"):
-                return self._create_fallback_response("show_high_risk_events", query, response.text)
-            
-            # Filter actual audits based on AI recommendations
-            high_risk_ids = [item.get("audit_id") for item in ai_result.get("high_risk_audits", []) if item.get("audit_id")]
-            filtered_audits = [audit for audit in audits if audit.audit_id in high_risk_ids]
-            
-            return {
-                "tool": "show_high_risk_events",
-                "query": query,
-                "ai_analysis": ai_result,
-                "filtered_audits": [
-                    {
-                        "id": audit.id,
-                        "audit_id": audit.audit_id,
-                        "audit_title": audit.audit_title,
-                        "audit_type": audit.audit_type.value if audit.audit_type else "",
-                        "status": audit.status.value if audit.status else "",
-                        "auditee_name": audit.auditee_name,
-                        "lead_auditor": audit.lead_auditor,
-                        "confirmed_end_date": audit.confirmed_end_date.isoformat() if audit.confirmed_end_date else "",
-                        "auditee_country": audit.auditee_country
-                    } for audit in filtered_audits
-                ],
-                "success": True
-            }
+            if isinstance(commentary.get("summary"), str):
+                ai_result["summary"] = commentary["summary"]
+            recommendations = commentary.get("recommendations")
+            if isinstance(recommendations, dict):
+                for audit in high_risk_audits:
+                    audit["recommendations"] = list(recommendations.get(audit["audit_id"]) or [])
+            return result
             
         except Exception as e:
             return {
@@ -201,32 +662,32 @@ Return only the JSON response:
                 "error": f"Processing error: {str(e)}"
             }
 
-    async def _summarize_open_events(self, query: str, db: Session) -> Dict[str, Any]:
-        """Summarize open audit events"""
+    async def _summarize_open_events(self, query: str, snapshot: AuditSnapshot) -> Dict[str, Any]:
+        """Summarize open audit events; inputs over the token budget are map-reduced"""
         try:
             # Get open/planned audits from last month
             one_month_ago = date.today() - timedelta(days=30)
-            audits = crud.get_audits(db, limit=1000)
-            
-            # Filter for open events in timeframe
-            open_audits = [
-                audit for audit in audits 
-                if audit.status in [AuditStatus.PLANNED, AuditStatus.IN_PROGRESS] 
-                and audit.created_at and audit.created_at.date() >= one_month_ago
-            ]
+            open_audits = snapshot.open_audits(one_month_ago)
+
+            audit_summary = [open_audit_summary(audit) for audit in open_audits]
+            # Counts are exact; the model only writes the narrative parts
+            breakdown = {
+                "by_type": dict(Counter(audit["type"] for audit in audit_summary)),
+                "by_status": dict(Counter(audit["status"] for audit in audit_summary))
+            }
 
-            audit_summary = []
-            for audit in open_audits:
-                audit_summary.append({
-                    "audit_id": audit.audit_id,
-                    "title": audit.audit_title,
-                    "type": audit.audit_type.value if audit.audit_type else "",
-                    "status": audit.status.value if audit.status else "",
-                    "auditee": audit.auditee_name,
-                    "lead_auditor": audit.lead_auditor,
-                    "start_date": audit.confirmed_start_date.isoformat() if audit.confirmed_start_date else "",
-                    "end_date": audit.confirmed_end_date.isoformat() if audit.confirmed_end_date else ""
-                })
+            table = prompt_encoding.AuditTable(OPEN_AUDIT_COLUMNS)
+            lines = table.rows(audit_summary)
+            chunk_count, complete = 1, True
+            if llm_providers.estimate_tokens("\n".join(lines)) <= AI_CHUNK_TOKEN_BUDGET:
+                audit_data = "Open Audits:\n" + table.encode(audit_summary)
+            else:
+                partials, chunk_count, complete = await self._map_reduce(
+                    "summarize_open_events", audit_summary, lines, table.encode,
+                    self._open_events_map_prompt, self._open_events_combine_prompt
+                )
+                audit_data = f"Findings from all {len(open_audits)} open audits, condensed in parts (one per line):\n" + \
+                    "\n".join(json.dumps(partial, separators=(",", ":")) for partial in partials)
 
             prompt = f"""
 IMPORTANT: Respond with ONLY valid JSON, no markdown or additional text.
@@ -246,25 +707,34 @@ Analyze open audits and return this exact JSON structure:
 }}
 
 Query: {query}
-Open Audits Data: {json.dumps(audit_summary[:20])}
+Exact breakdown:
+{prompt_encoding.encode_mapping(breakdown)}
+{audit_data}
 
 Return only JSON:
 """
 
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt)
             ai_result = self._extract_json_from_response(response.text)
             
             if ai_result.get("fallback"):
                 return self._create_fallback_response("summarize_open_events", query, response.text)
-            
-            return {
+
+            ai_result["breakdown"] = breakdown
+            ai_result["total_open"] = len(open_audits)
+            result = {
                 "tool": "summarize_open_events",
                 "query": query,
                 "ai_analysis": ai_result,
                 "audit_count": len(open_audits),
                 "audits": audit_summary,
+                "chunks": chunk_count,
                 "success": True
             }
+            if not complete:
+                # Some chunks failed; the summary misses their audits, so do not cache it
+                result["partial"] = True
+            return result
             
         except Exception as e:
             return {
@@ -274,13 +744,53 @@ Return only JSON:
                 "error": f"Processing error: {str(e)}"
             }
 
-    async def _suggest_next_steps(self, query: str, db: Session, context: Optional[Dict] = None) -> Dict[str, Any]:
+    @staticmethod
+    def _open_events_map_prompt(chunk: str) -> str:
+        return f"""
+IMPORTANT: Respond with ONLY valid JSON, no markdown or additional text.
+
+Below is one part of the list of open audits. Note what a summary of all open audits
+should mention about them and return this exact JSON structure:
+
+{{
+    "upcoming_deadlines": ["Audit AUD-2025-001 due Dec 15"],
+    "resource_insights": "Team allocation and workload observations",
+    "key_concerns": ["Concern 1"]
+}}
+
+Open Audits:
+{chunk}
+
+Return only JSON:
+"""
+
+    @staticmethod
+    def _open_events_combine_prompt(chunk: str) -> str:
+        return f"""
+IMPORTANT: Respond with ONLY valid JSON, no markdown or additional text.
+
+Below are notes on several parts of the list of open audits. Merge them, keeping the most
+important points, and return this exact JSON structure:
+
+{{
+    "upcoming_deadlines": ["Audit AUD-2025-001 due Dec 15"],
+    "resource_insights": "Team allocation and workload observations",
+    "key_concerns": ["Concern 1"]
+}}
+
+Notes (one per line):
+{chunk}
+
+Return only JSON:
+"""
+
+    async def _suggest_next_steps(self, query: str, snapshot: AuditSnapshot, context: Optional[Dict] = None) -> Dict[str, Any]:
         """Suggest next steps for specific audit"""
         try:
             audit_id = context.get("audit_id") if context else None
             
             if audit_id:
-                audit = crud.get_audit(db, audit_id)
+                audit = snapshot.audit(audit_id)
                 if not audit:
                     return {"error": f"Audit {audit_id} not found"}
             else:
@@ -289,7 +799,7 @@ Return only JSON:
                 audit_id_match = re.search(r'(AUD-\d{4}-[A-Z0-9]+)', query)
                 if audit_id_match:
                     audit_id = audit_id_match.group(1)
-                    audit = crud.get_audit(db, audit_id)
+                    audit = snapshot.audit(audit_id)
                 else:
                     return {"error": "No audit ID specified"}
 
@@ -329,12 +839,13 @@ Provide recommendations for this audit. Return this exact JSON structure:
 }}
 
 Query: {query}
-Audit: {json.dumps(audit_details)}
+Audit:
+{prompt_encoding.encode_record(audit_details, date_keys=("start_date", "end_date"))}
 
 Return only JSON:
 """
 
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt)
             ai_result = self._extract_json_from_response(response.text)
             
             if ai_result.get("fallback"):
@@ -356,58 +867,49 @@ Return only JSON:
                 "error": f"Processing error: {str(e)}"
             }
 
-    async def _identify_trends(self, query: str, db: Session) -> Dict[str, Any]:
-        """Identify trends in audit data"""
+    async def _identify_trends(self, query: str, snapshot: AuditSnapshot) -> Dict[str, Any]:
+        """Identify trends in audit data: figures are computed exactly in SQL, the LLM only narrates them"""
+        stats = None
         try:
-            audits = crud.get_audits(db, limit=1000)
-            
-            # Prepare trend analysis data
-            trend_data = []
-            for audit in audits:
-                trend_data.append({
-                    "audit_id": audit.audit_id,
-                    "type": audit.audit_type.value if audit.audit_type else "",
-                    "status": audit.status.value if audit.status else "",
-                    "country": audit.auditee_country,
-                    "lead_auditor": audit.lead_auditor,
-                    "created_date": audit.created_at.isoformat() if audit.created_at else "",
-                    "start_date": audit.confirmed_start_date.isoformat() if audit.confirmed_start_date else "",
-                    "end_date": audit.confirmed_end_date.isoformat() if audit.confirmed_end_date else ""
-                })
+            stats = snapshot.trend_stats()
 
             prompt = f"""
 IMPORTANT: Return ONLY valid JSON with no additional text.
 
-Analyze trends and return this exact JSON structure:
+The figures below are exact aggregates over all {stats["total_audits"]} audits. Do not recompute or
+change them; describe what they show. Return this exact JSON structure:
 
 {{
     "frequency_trends": "Trend description",
-    "type_distribution": {{"Internal": 45, "Regulatory": 30, "Supplier": 25}},
-    "geographic_distribution": {{"US": 40, "Europe": 35, "Asia": 25}},
-    "auditor_workload": {{"John Smith": 12, "Jane Doe": 8}},
-    "seasonal_patterns": "Pattern description", 
-    "completion_metrics": {{"average_days": 14, "completion_rate": 85}},
+    "seasonal_patterns": "Pattern description",
     "risk_areas": ["Risk area 1", "Risk area 2"],
     "recommendations": ["Recommendation 1", "Recommendation 2"]
 }}
 
 Query: {query}
-Data: {json.dumps(trend_data[:30])}
+Figures:
+{prompt_encoding.encode_mapping(analytics.prompt_summary(stats))}
 
 Return only JSON:
 """
 
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt)
             ai_result = self._extract_json_from_response(response.text)
             
             if ai_result.get("fallback"):
-                return self._create_fallback_response("identify_trends", query, response.text)
+                return dict(self._create_fallback_response("identify_trends", query, response.text), statistics=stats)
             
+            # Exact figures always win over anything the model echoed back
+            ai_result.update(
+                (key, stats[key])
+                for key in ("type_distribution", "geographic_distribution", "auditor_workload", "completion_metrics")
+            )
             return {
                 "tool": "identify_trends",
                 "query": query,
                 "ai_analysis": ai_result,
-                "data_points": len(trend_data),
+                "statistics": stats,
+                "data_points": stats["total_audits"],
                 "success": True
             }
             
@@ -415,11 +917,12 @@ Return only JSON:
             return {
                 "tool": "identify_trends",
                 "query": query,
+                "statistics": stats,
                 "success": False,
                 "error": f"Processing error: {str(e)}"
             }
 
-    async def _generate_notification(self, query: str, db: Session, context: Optional[Dict] = None) -> Dict[str, Any]:
+    async def _generate_notification(self, query: str, snapshot: AuditSnapshot, context: Optional[Dict] = None) -> Dict[str, Any]:
         """Generate notification drafts"""
         try:
             notification_type = context.get("type", "general") if context else "general"
@@ -427,7 +930,7 @@ Return only JSON:
 
             audit_details = {}
             if audit_id:
-                audit = crud.get_audit(db, audit_id)
+                audit = snapshot.audit(audit_id)
                 if audit:
                     audit_details = {
                         "audit_id": audit.audit_id,
@@ -480,12 +983,13 @@ Generate notifications and return this exact JSON structure:
 
 Query: {query}
 Type: {notification_type}
-Audit: {json.dumps(audit_details) if audit_details else "General notification"}
+Audit:
+{prompt_encoding.encode_record(audit_details) if audit_details else "General notification"}
 
 Return only JSON:
 """
 
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt)
             ai_result = self._extract_json_from_response(response.text)
             
             if ai_result.get("fallback"):
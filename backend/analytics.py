@@ -0,0 +1,142 @@
+"""Exact audit aggregates computed in the database.
+
+identify_trends used to send a 30-row sample to the LLM and ask it to guess
+distributions from it. The figures are now computed here over the whole
+audits table with a handful of GROUP BY queries, each an index-only scan,
+and the LLM is only asked to narrate them. Results are memoized on the
+audit collection version, so they are recomputed only after a write.
+"""
+import calendar
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+import crud
+from models import Audit, AuditStatus
+
+OPEN_STATUSES = (AuditStatus.PLANNED, AuditStatus.IN_PROGRESS)
+
+# Prompt summaries keep the largest N buckets (plus "Other") and the most recent months
+PROMPT_TOP_N = 8
+PROMPT_MONTHS = 24
+
+
+def _days_between(db: Session, start, end):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.julianday(end) - func.julianday(start)
+    return end - start
+
+
+def _counts(db: Session, column) -> Dict[Any, int]:
+    rows = db.query(column, func.count(Audit.id)).group_by(column).all()
+    return {key.value if hasattr(key, "value") else key: count for key, count in rows}
+
+
+# (database url, collection version, today) -> stats of the last trend_stats call
+_memo: Tuple[Optional[tuple], Optional[Dict[str, Any]]] = (None, None)
+
+
+def trend_stats(db: Session, today: Optional[date] = None) -> Dict[str, Any]:
+    """Exact distributions, workload, monthly volume and completion metrics over all audits.
+
+    The returned dict is shared between callers until the next audit write; treat it as read-only.
+    """
+    global _memo
+    today = today or date.today()
+    key = (str(db.get_bind().url), crud.get_audits_collection_version(db), today)
+    if _memo[0] == key:
+        return _memo[1]
+    stats = _compute_trend_stats(db, today)
+    _memo = (key, stats)
+    return stats
+
+
+def _compute_trend_stats(db: Session, today: date) -> Dict[str, Any]:
+    status_counts = crud.get_audit_status_counts(db)
+
+    workload = defaultdict(lambda: {"total": 0, "open": 0})
+    for auditor, status, count in (
+        db.query(Audit.lead_auditor, Audit.status, func.count(Audit.id))
+        .group_by(Audit.lead_auditor, Audit.status)
+        .all()
+    ):
+        workload[auditor]["total"] += count
+        if status in OPEN_STATUSES:
+            workload[auditor]["open"] += count
+
+    # One pass over ix_audits_trend_dates: volume per start date and status, durations and
+    # overdue counts; months are bucketed here, which is cheaper than strftime() per row
+    duration = _days_between(db, Audit.confirmed_start_date, Audit.confirmed_end_date)
+    past_end = case((Audit.confirmed_end_date < today, 1), else_=0)
+    monthly = Counter()
+    seasonal = Counter()
+    durations = defaultdict(lambda: [0, 0.0])
+    overdue_open = 0
+    for start, status, count, total_days, ended in (
+        db.query(
+            Audit.confirmed_start_date, Audit.status, func.count(Audit.id), func.sum(duration), func.sum(past_end)
+        )
+        .group_by(Audit.confirmed_start_date, Audit.status)
+        .all()
+    ):
+        if start is not None:
+            monthly[f"{start.year:04d}-{start.month:02d}"] += count
+            seasonal[start.month] += count
+        durations[status][0] += count
+        durations[status][1] += float(total_days or 0)
+        if status in OPEN_STATUSES:
+            overdue_open += ended or 0
+
+    total = sum(status_counts.values())
+    closed = status_counts.get(AuditStatus.CLOSED.value, 0)
+    cancelled = status_counts.get(AuditStatus.CANCELLED.value, 0)
+    closed_count, closed_days = durations[AuditStatus.CLOSED]
+    all_count = sum(count for count, _ in durations.values())
+    all_days = sum(days for _, days in durations.values())
+    return {
+        "total_audits": total,
+        "type_distribution": _counts(db, Audit.audit_type),
+        "status_distribution": status_counts,
+        "geographic_distribution": _counts(db, Audit.auditee_country),
+        "auditor_workload": {auditor: counts["total"] for auditor, counts in workload.items()},
+        "auditor_open_workload": {auditor: counts["open"] for auditor, counts in workload.items()},
+        "monthly_volume": dict(sorted(monthly.items())),
+        "seasonal_distribution": {calendar.month_abbr[m]: seasonal[m] for m in range(1, 13) if seasonal[m]},
+        "completion_metrics": {
+            # Planned (confirmed start to end) duration; the schema has no actual close date
+            "average_days": round(closed_days / closed_count, 1) if closed_count else None,
+            "average_planned_days": round(all_days / all_count, 1) if all_count else None,
+            "completion_rate": round(100.0 * closed / (total - cancelled), 1) if total > cancelled else None,
+            "closed": closed,
+            "cancelled": cancelled,
+            "open": total - closed - cancelled,
+            "overdue_open": overdue_open,
+        },
+    }
+
+
+def _top(counts: Dict[Any, int], n: int = PROMPT_TOP_N) -> Dict[Any, int]:
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+    top = dict(ranked[:n])
+    rest = sum(count for _, count in ranked[n:])
+    if rest:
+        top["Other"] = rest
+    return top
+
+
+def prompt_summary(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Bounded-size view of trend_stats for an LLM prompt, whatever the table size"""
+    return {
+        "total_audits": stats["total_audits"],
+        "type_distribution": _top(stats["type_distribution"]),
+        "status_distribution": stats["status_distribution"],
+        "geographic_distribution": _top(stats["geographic_distribution"]),
+        "auditor_workload": _top(stats["auditor_workload"]),
+        "auditor_open_workload": _top(stats["auditor_open_workload"]),
+        "monthly_volume": dict(list(stats["monthly_volume"].items())[-PROMPT_MONTHS:]),
+        "seasonal_distribution": stats["seasonal_distribution"],
+        "completion_metrics": stats["completion_metrics"],
+    }
@@ -0,0 +1,127 @@
+"""Streaming readers and writers for bulk audit import and export.
+
+Readers yield (row_number, fields) pairs one record at a time from a binary
+file object, and writers turn an iterator of row tuples into encoded chunks,
+so neither side ever holds a whole file in memory.
+"""
+import codecs
+import csv
+import io
+import json
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+IMPORT_FORMATS = ("csv", "ndjson")
+EXPORT_FORMATS = ("csv", "ndjson", "columnar")
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "columnar": "application/x-ndjson",
+}
+# Rows buffered per emitted chunk (and per row group in the columnar format)
+EXPORT_CHUNK_ROWS = 1000
+
+Row = Tuple[int, Dict[str, Any]]
+
+
+def detect_format(filename: str = "", content_type: str = "") -> str:
+    """Guess the import format from an upload's filename or content type"""
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return "ndjson"
+    return "csv"
+
+
+def iter_csv_rows(stream: BinaryIO) -> Iterator[Row]:
+    """Yield CSV records keyed by header; empty cells become None"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        # Header is row 1, so the first record is row 2 as in a spreadsheet
+        for row_number, record in enumerate(csv.DictReader(text), start=2):
+            yield row_number, {
+                key.strip(): (value if value not in ("", None) else None)
+                for key, value in record.items() if key
+            }
+    finally:
+        text.detach()
+
+
+def iter_ndjson_rows(stream: BinaryIO) -> Iterator[Row]:
+    """Yield one JSON object per non-blank line; unparseable lines yield an __error__ entry"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    for line_number, raw in enumerate(stream, start=1):
+        line = decoder.decode(raw).strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, {"__error__": f"Invalid JSON: {e.msg}"}
+            continue
+        if not isinstance(record, dict):
+            yield line_number, {"__error__": "Expected a JSON object"}
+            continue
+        yield line_number, record
+
+
+def iter_rows(stream: BinaryIO, file_format: str) -> Iterator[Row]:
+    if file_format == "ndjson":
+        return iter_ndjson_rows(stream)
+    if file_format == "csv":
+        return iter_csv_rows(stream)
+    raise ValueError(f"Unsupported import format: {file_format}")
+
+
+def iter_csv_chunks(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """Encode rows as CSV with a header, flushing every EXPORT_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode()
+
+
+def iter_ndjson_chunks(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """Encode each row as one JSON object per line"""
+    lines: List[str] = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row))))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def iter_columnar_chunks(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """Encode rows as row groups: one line per group holding a value array per column"""
+    group: List[Sequence[Any]] = []
+
+    def encode(rows_in_group: List[Sequence[Any]]) -> bytes:
+        values = {name: [row[index] for row in rows_in_group] for index, name in enumerate(columns)}
+        return (json.dumps({"num_rows": len(rows_in_group), "columns": values}) + "\n").encode()
+
+    for row in rows:
+        group.append(row)
+        if len(group) >= EXPORT_CHUNK_ROWS:
+            yield encode(group)
+            group = []
+    if group:
+        yield encode(group)
+
+
+def iter_export_chunks(file_format: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    if file_format == "csv":
+        return iter_csv_chunks(columns, rows)
+    if file_format == "ndjson":
+        return iter_ndjson_chunks(columns, rows)
+    if file_format == "columnar":
+        return iter_columnar_chunks(columns, rows)
+    raise ValueError(f"Unsupported export format: {file_format}")
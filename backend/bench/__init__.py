@@ -0,0 +1,32 @@
+"""Benchmarks for the QMS backend.
+
+Runs the FastAPI app in-process (or behind a local uvicorn for `endpoints`) against a
+throwaway SQLite database so the checked-in qms.db is never touched. Behaviour the
+scenarios rely on is tested in tests/; these only measure.
+
+Usage (from backend/, with requirements-dev.txt installed):
+    python -m bench ai-contention [--ai-calls 8] [--llm-latency 2.0] [--crud-requests 200]
+    python -m bench query-plans [--rows 5000]
+    python -m bench mixed-load [--rows 5000] [--concurrency 12] [--duration 10] [--json]
+    python -m bench db-concurrency [--rows 5000] [--concurrency 12] [--duration 10]
+    python -m bench read-load [--rows 5000] [--concurrency 12] [--duration 10] [--json]
+    python -m bench read-scaling [--rows 5000] [--duration 10]
+    python -m bench conditional-get [--rows 5000] [--crud-requests 200]
+    python -m bench serialization
+    python -m bench trends [--rows 5000]
+    python -m bench high-risk [--rows 5000]
+    python -m bench ai-stream [--llm-latency 2.0]
+    python -m bench ai-batch [--rows 5000] [--llm-latency 2.0]
+    python -m bench ai-map-reduce [--rows 5000] [--llm-latency 2.0]
+    python -m bench prompt-encoding [--rows 5000]
+    python -m bench ai-load [--concurrency 12] [--duration 10] [--latency lognormal:0.8,0.35]
+                            [--error-rate 0] [--ai-timeout 60] [--json]
+    python -m bench endpoints [--rows 100000] [--target inprocess|uvicorn] [--concurrency 12]
+                              [--crud-requests 200] [--ai-calls 8] [--latency fixed:0] [--endpoints list,detail]
+                              [--output run.json] [--baseline previous.json] [--regression-threshold 10]
+                              [--seed 7] [--types ...] [--statuses ...] [--countries ...] [--auditors ...]
+    python -m bench metrics-overhead [--crud-requests 200]
+
+Modules: common (timing, stub models, data loading), db, api, ai and endpoints hold the
+scenarios; cli maps scenario names to them.
+"""
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# database.py uses a relative sqlite URL, so run from a scratch directory
+# (--output and --baseline paths stay relative to where the benchmark was started)
+invocation_dir = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="qms-bench-"))
+
+from bench import cli  # noqa: E402
+
+cli.main(invocation_dir)
@@ -0,0 +1,358 @@
+"""AI scenarios against offline stub providers: contention, streaming, batching, map-reduce and load"""
+import asyncio
+import itertools
+import json
+import statistics
+import time
+
+import httpx
+from sqlalchemy import event
+
+import ai_service
+import analytics
+import crud
+import llm_providers
+import main
+import models
+import prompt_encoding
+import schemas
+import synthetic
+from database import SessionLocal, engine
+
+from .common import (
+    StreamingSlowModel, asgi_post, clear_ai_caches, describe, insert_random_audits, percentile, seed, stub_model,
+)
+
+
+async def _timed_get(client: httpx.AsyncClient, url: str) -> float:
+    start = time.perf_counter()
+    response = await client.get(url)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def _crud_latencies(client: httpx.AsyncClient, count: int):
+    return [await _timed_get(client, "/audits/") for _ in range(count)]
+
+
+async def ai_contention(args) -> None:
+    """Measure GET /audits/ latency idle and while slow AI calls are in flight"""
+    seed()
+    main.ai_service.model = stub_model(args.llm_latency)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        idle = await _crud_latencies(client, args.crud_requests)
+
+        payload = {"tool": "show_high_risk_events", "query": "benchmark"}
+        ai_tasks = [
+            asyncio.create_task(client.post("/ai/query", json=payload))
+            for _ in range(args.ai_calls)
+        ]
+        await asyncio.sleep(0.05)
+        loaded = await _crud_latencies(client, args.crud_requests)
+
+        ai_start = time.perf_counter()
+        await asyncio.gather(*ai_tasks)
+        ai_elapsed = time.perf_counter() - ai_start
+
+    print(f"AI calls: {args.ai_calls} x {args.llm_latency:g}s, "
+          f"concurrency cap {main.ai_service.max_concurrency}")
+    print(f"GET /audits/ idle:        {describe(idle)}")
+    print(f"GET /audits/ under AI:    {describe(loaded)}")
+    print(f"AI calls drained {ai_elapsed:.2f}s after CRUD run finished")
+    ratio = percentile(loaded, 95) / max(percentile(idle, 95), 1e-9)
+    print(f"p95 ratio under load: {ratio:.2f}x")
+
+
+async def trends(args) -> None:
+    """Time the exact identify_trends aggregates and the size of the prompt built from them"""
+    insert_random_audits(args.rows)
+    main.ai_service.model = stub_model(0)
+    db = SessionLocal()
+    try:
+        cold, warm = [], []
+        for _ in range(10):
+            analytics._memo = (None, None)
+            start = time.perf_counter()
+            stats = analytics.trend_stats(db)
+            cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            analytics.trend_stats(db)
+            warm.append(time.perf_counter() - start)
+        prompt_bytes = len(json.dumps(analytics.prompt_summary(stats), separators=(",", ":")))
+
+        tool = []
+        for _ in range(10):
+            start = time.perf_counter()
+            result = await main.ai_service._run_tool("identify_trends", "benchmark", db)
+            tool.append(time.perf_counter() - start)
+    finally:
+        db.close()
+
+    print(f"identify_trends over {stats['total_audits']} audits (success={result.get('success')})")
+    print(f"  aggregates, cold   {describe(cold)}")
+    print(f"  aggregates, cached {describe(warm)}")
+    print(f"  whole tool, cached {describe(tool)} (LLM latency 0)")
+    print(f"  prompt figures {prompt_bytes} bytes")
+
+
+async def high_risk(args) -> None:
+    """Backfill risk scores for unscored rows, then time the top-N show_high_risk_events path"""
+    main.ai_service.model = stub_model(0)
+    db = SessionLocal()
+    try:
+        # Realistically distributed audits (see synthetic.py), stored unscored so the backfill is timed
+        generator = synthetic.generator_from_args(args)
+        crud.insert_audit_rows(db, (
+            dict(audit, risk_score=0, risk_factors=None, risk_scored_on=None)
+            for audit in generator.audits(args.rows)
+        ))
+        start = time.perf_counter()
+        scored = crud.refresh_risk_scores(db)
+        backfill = time.perf_counter() - start
+
+        query, tool = [], []
+        for _ in range(20):
+            start = time.perf_counter()
+            rows, total = crud.get_high_risk_audits(db)
+            query.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            result = await main.ai_service._run_tool(
+                "show_high_risk_events", "benchmark", db, {"commentary": False}
+            )
+            tool.append(time.perf_counter() - start)
+    finally:
+        db.close()
+
+    print(f"Scored {scored} audits in {backfill:.2f}s ({scored / max(backfill, 1e-9):.0f} rows/s); "
+          f"{total} at or above the high-risk threshold")
+    print(f"  top-N query   {describe(query)}")
+    print(f"  tool (no LLM) {describe(tool)} success={result.get('success')}")
+
+
+async def ai_stream(args) -> None:
+    """Time to first byte and to the full answer, /ai/query against /ai/query/stream, plus disconnects"""
+    seed()
+    model = StreamingSlowModel(args.llm_latency)
+    main.ai_service.model = model
+    # generate_notification is never cached, so every call reaches the model
+    payload = {"tool": "generate_notification", "query": "benchmark"}
+
+    status, chunks = await asgi_post("/ai/query", payload)
+    print(f"/ai/query         status={status} first byte {chunks[0][0] * 1000:.0f}ms, "
+          f"complete {chunks[-1][0] * 1000:.0f}ms")
+
+    status, chunks = await asgi_post("/ai/query/stream", payload)
+    events = [(at, line[7:]) for at, body in chunks for line in body.decode().splitlines()
+              if line.startswith("event: ")]
+    first_token = next(at for at, name in events if name == "token")
+    first_field = next(at for at, name in events if name == "field")
+    result = next(at for at, name in events if name == "result")
+    print(f"/ai/query/stream  status={status} first byte {chunks[0][0] * 1000:.0f}ms, "
+          f"first token {first_token * 1000:.0f}ms, first field {first_field * 1000:.0f}ms, "
+          f"result {result * 1000:.0f}ms")
+    print(f"  events: {', '.join(name for _, name in events)}")
+
+    model.chunks_sent = 0
+    start = time.perf_counter()
+    status, chunks = await asgi_post("/ai/query/stream", payload, disconnect_after_first_token=True)
+    returned = time.perf_counter() - start
+    # Let the worker thread notice the cancellation at its next chunk
+    await asyncio.sleep(args.llm_latency)
+    print(f"Disconnect after first token: handler returned in {returned * 1000:.0f}ms, model produced "
+          f"{model.chunks_sent}/{len(model.CHUNKS)} chunks, "
+          f"{main.ai_service._semaphore._value}/{main.ai_service.max_concurrency} LLM slots free")
+
+
+async def ai_batch(args) -> None:
+    """Summary, trends and high-risk as three /ai/query calls against one /ai/batch call"""
+    insert_random_audits(args.rows)
+    main.ai_service.model = stub_model(args.llm_latency)
+    requests = [
+        {"tool": "summarize_open_events", "query": "Summarize open audits"},
+        {"tool": "identify_trends", "query": "What trends do you see?"},
+        {"tool": "show_high_risk_events", "query": "Show high-risk audits"},
+    ]
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        clear_ai_caches()
+        statements.clear()
+        start = time.perf_counter()
+        for payload in requests:
+            (await client.post("/ai/query", json=payload)).raise_for_status()
+        sequential = time.perf_counter() - start
+        sequential_queries = len(statements)
+
+        clear_ai_caches()
+        statements.clear()
+        start = time.perf_counter()
+        response = await client.post("/ai/batch", json={"requests": requests})
+        response.raise_for_status()
+        batch = time.perf_counter() - start
+        batch_queries = len(statements)
+
+    clear_ai_caches()
+    _, chunks = await asgi_post("/ai/batch", {"requests": requests}, headers=[("Accept", "text/event-stream")])
+    arrivals = [at for at, body in chunks if b"event: result" in body]
+
+    print(f"3 x /ai/query   {sequential * 1000:.0f}ms, {sequential_queries} SQL statements")
+    print(f"1 x /ai/batch   {batch * 1000:.0f}ms, {batch_queries} SQL statements, "
+          f"success={response.json()['success']}")
+    print(f"  streamed results at {', '.join(f'{at * 1000:.0f}ms' for at in arrivals)} "
+          f"(LLM latency {args.llm_latency:g}s, concurrency cap {main.ai_service.max_concurrency})")
+
+
+async def ai_map_reduce(args) -> None:
+    """summarize_open_events over every open audit: cold run, then a rerun after editing one audit"""
+    insert_random_audits(args.rows)
+    provider = stub_model(args.llm_latency)
+    main.ai_service.model = provider
+    db = SessionLocal()
+    try:
+        runs = []
+        for label in ("cold", "after one edit"):
+            calls = provider.calls
+            start = time.perf_counter()
+            result = await main.ai_service.execute_ai_tool("summarize_open_events", "Summarize open audits", db)
+            elapsed = time.perf_counter() - start
+            runs.append((label, elapsed, provider.calls - calls, result))
+            # An edit clears the tool cache; only the chunk holding the edited audit should be redone
+            audit = db.query(models.Audit).filter(models.Audit.status.in_(
+                [models.AuditStatus.PLANNED, models.AuditStatus.IN_PROGRESS])).order_by(models.Audit.id).offset(
+                result["audit_count"] // 2).first()
+            crud.update_audit(db, audit.audit_id, schemas.AuditUpdate(audit_title=audit.audit_title + " (edited)"))
+    finally:
+        db.close()
+
+    for label, elapsed, calls, result in runs:
+        print(f"{label:15s} {elapsed * 1000:7.0f}ms  {calls:3d} LLM calls  {result.get('chunks')} chunks  "
+              f"{result.get('audit_count')} audits covered  success={result.get('success')}")
+    print(f"  chunk budget {ai_service.AI_CHUNK_TOKEN_BUDGET} tokens, LLM latency {args.llm_latency:g}s, "
+          f"{main.ai_service.max_concurrency} LLM slots; previously the prompt carried the first 20 audits")
+
+
+def _token_counts(data, encoded: str) -> dict:
+    """Estimated prompt tokens of data as the old json.dumps embedding and as encoded"""
+    return {
+        "json_tokens": llm_providers.estimate_tokens(json.dumps(data, default=str)),
+        "compact_tokens": llm_providers.estimate_tokens(encoded),
+    }
+
+
+async def prompt_encoding_cost(args) -> None:
+    """Prompt tokens of each tool's audit data as per-row JSON against the compact encoding"""
+    insert_random_audits(args.rows)
+    db = SessionLocal()
+    try:
+        crud.refresh_risk_scores(db)
+        records = [ai_service.open_audit_summary(row) for row in crud.get_open_audits(db)]
+        high_risk = [
+            {"audit_id": row.audit_id, "risk_score": row.risk_score, "risk_factors": row.risk_factors}
+            for row in crud.get_high_risk_audits(db)[0]
+        ]
+        audit = db.query(models.Audit).first()
+        details = {
+            "audit_id": audit.audit_id, "title": audit.audit_title, "type": audit.audit_type.value,
+            "status": audit.status.value, "scope": audit.audit_scope, "auditee": audit.auditee_name,
+            "country": audit.auditee_country, "lead_auditor": audit.lead_auditor,
+            "start_date": audit.confirmed_start_date.isoformat(), "end_date": audit.confirmed_end_date.isoformat(),
+        }
+        figures = analytics.prompt_summary(analytics.trend_stats(db))
+    finally:
+        db.close()
+
+    table = prompt_encoding.AuditTable(ai_service.OPEN_AUDIT_COLUMNS)
+    start = time.perf_counter()
+    encoded = table.encode(records)
+    encode_ms = (time.perf_counter() - start) * 1000
+    cases = [
+        (f"{len(records)} open audits", records, encoded),
+        ("high-risk top 10", high_risk, prompt_encoding.AuditTable(ai_service.HIGH_RISK_COLUMNS).encode(high_risk)),
+        ("one audit", details, prompt_encoding.encode_record(details, date_keys=("start_date", "end_date"))),
+        ("trend figures", figures, prompt_encoding.encode_mapping(figures)),
+    ]
+    for label, data, text in cases:
+        counts = _token_counts(data, text)
+        print(f"{label:18s} json {counts['json_tokens']:7d} tokens  compact {counts['compact_tokens']:7d} tokens  "
+              f"({counts['json_tokens'] / counts['compact_tokens']:.2f}x)")
+
+    budget = ai_service.AI_CHUNK_TOKEN_BUDGET
+    json_lines = [json.dumps(record, separators=(",", ":")) for record in records]
+    compact_lines = table.rows(records)
+    for label, lines in (("json", json_lines), ("compact", compact_lines)):
+        per_row = llm_providers.estimate_tokens("\n".join(lines)) / max(len(lines), 1)
+        print(f"  {label:8s} {per_row:5.1f} tokens/audit, {budget / per_row:5.0f} audits per {budget}-token "
+              f"prompt, {len(ai_service.chunk_spans(lines)):3d} map-reduce chunks")
+    print(f"  encoded {len(records)} audits in {encode_ms:.1f}ms")
+
+
+AI_LOAD_TOOLS = ("summarize_open_events", "identify_trends", "show_high_risk_events", "generate_notification")
+
+
+async def ai_load(args) -> None:
+    """Closed-loop load on /ai/query against the offline stub provider: throughput, latency,
+    LLM queue depth, provider errors and timeouts"""
+    seed()
+    provider = llm_providers.StubProvider(latency=args.latency, error_rate=args.error_rate)
+    service = main.ai_service
+    service.model = provider
+    service.timeout = args.ai_timeout
+    latencies, outcomes = [], {"ok": 0, "error": 0, "timeout": 0}
+    queue_depths = []
+    counter = itertools.count()
+    stop_at = time.perf_counter() + args.duration
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        while time.perf_counter() < stop_at:
+            n = next(counter)
+            # A distinct query per call keeps the response cache out of the measurement
+            payload = {"tool": AI_LOAD_TOOLS[n % len(AI_LOAD_TOOLS)], "query": f"load {n}"}
+            start = time.perf_counter()
+            body = (await client.post("/ai/query", json=payload)).json()
+            latencies.append(time.perf_counter() - start)
+            result = body.get("result") or {}
+            error = str(body.get("error") or result.get("error") or result.get("commentary_error") or "")
+            outcome = "timeout" if "timeout" in error else "error" if error else "ok"
+            outcomes[outcome] += 1
+
+    async def sample_queue() -> None:
+        while time.perf_counter() < stop_at:
+            # Coroutines waiting for one of the max_concurrency LLM slots
+            queue_depths.append(len(service._semaphore._waiters or ()))
+            await asyncio.sleep(0.05)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(sample_queue(), *(client_loop(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    result = {
+        "scenario": "ai-load",
+        "latency_spec": args.latency,
+        "error_rate": args.error_rate,
+        "concurrency": args.concurrency,
+        "llm_slots": service.max_concurrency,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_queue_depth": round(statistics.mean(queue_depths), 2),
+        "max_queue_depth": max(queue_depths),
+        "provider_calls": provider.calls,
+        **outcomes,
+    }
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{result['requests']} AI queries in {elapsed:.1f}s: {result['throughput_rps']} req/s "
+          f"({args.concurrency} clients, {service.max_concurrency} LLM slots, latency {args.latency})")
+    print(f"  latency {describe(latencies)}")
+    print(f"  LLM queue depth mean {result['mean_queue_depth']} max {result['max_queue_depth']}")
+    print(f"  ok={outcomes['ok']} errors={outcomes['error']} timeouts={outcomes['timeout']} "
+          f"provider calls={provider.calls} injected failures={provider.failures}")
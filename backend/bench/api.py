@@ -0,0 +1,163 @@
+"""HTTP layer scenarios: conditional GETs, response encoding and metrics overhead"""
+import asyncio
+import gc
+import time
+from typing import List
+
+import httpx
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import event
+
+import crud
+import database
+import main
+import metrics
+import schemas
+import serialization
+from database import SessionLocal
+
+from .common import describe, insert_random_audits
+
+
+async def conditional_get(args) -> None:
+    """Compare full GET responses with If-None-Match revalidations that come back 304"""
+    insert_random_audits(args.rows)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        first = await client.get("/audits/", params={"limit": 100})
+        audit_id = first.json()[0]["audit_id"]
+        for label, url, params in (
+            ("list", "/audits/", {"limit": 100}),
+            ("detail", f"/audits/{audit_id}", {}),
+        ):
+            etag = (await client.get(url, params=params)).headers["ETag"]
+            for mode, headers in (("full", {}), ("304", {"If-None-Match": etag})):
+                samples, size = [], 0
+                for _ in range(args.crud_requests):
+                    start = time.perf_counter()
+                    response = await client.get(url, params=params, headers=headers)
+                    samples.append(time.perf_counter() - start)
+                    size = len(response.content)
+                print(f"{label:<7} {mode:<5} status={response.status_code} body={size:>6}B  {describe(samples)}")
+
+
+def _legacy_list_dicts(matches) -> list:
+    """The per-row dicts read_audits built before the serialization fast path"""
+    return [
+        {
+            "id": audit.id,
+            "audit_id": audit.audit_id,
+            "audit_title": audit.audit_title,
+            "audit_type": audit.audit_type.value if audit.audit_type else "",
+            "status": audit.status.value if audit.status else "",
+            "auditee_name": audit.auditee_name,
+            "lead_auditor": audit.lead_auditor,
+            "confirmed_end_date": audit.confirmed_end_date.isoformat() if audit.confirmed_end_date else "",
+            "auditee_country": audit.auditee_country,
+            "snippet": snippet,
+        }
+        for audit, snippet in matches
+    ]
+
+
+async def serialization_cost(args) -> None:
+    """Per-request encoding cost of validated stdlib JSON vs the orjson fast path, for 1/100/10k rows"""
+    insert_random_audits(10000)
+    list_field = create_response_field(name="list", type_=List[schemas.AuditListResponse])
+    detail_field = create_response_field(name="detail", type_=List[schemas.AuditResponse])
+    db = SessionLocal()
+    try:
+        list_rows, _, _ = crud.get_audits_page(db, limit=10000)
+        full_rows = crud.get_audits(db, limit=10000, with_narrative=True)
+    finally:
+        db.close()
+
+    # Keep the 20k loaded rows out of the timed region's garbage collections
+    gc.collect()
+    gc.freeze()
+
+    async def validated(field, content) -> bytes:
+        return JSONResponse(await serialize_response(field=field, response_content=content)).body
+
+    print(f"{'payload':<8} {'rows':>6} {'validated+json':>15} {'orjson fast path':>17} {'speedup':>8}")
+    for count in (1, 100, 10000):
+        repeats = max(3, 2000 // count)
+        matches = [(row, None) for row in list_rows[:count]]
+        audits = full_rows[:count]
+        cases = {
+            "list": (
+                lambda: validated(list_field, _legacy_list_dicts(matches)),
+                lambda: serialization.audit_list_json(matches),
+            ),
+            "detail": (
+                lambda: validated(detail_field, [audit.to_dict() for audit in audits]),
+                lambda: b"[" + b",".join(serialization.audit_json(audit) for audit in audits) + b"]",
+            ),
+        }
+        for label, (legacy, fast) in cases.items():
+            timings = []
+            for encode in (legacy, fast):
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    body = encode()
+                    if asyncio.iscoroutine(body):
+                        await body
+                timings.append((time.perf_counter() - start) / repeats)
+            print(f"{label:<8} {count:>6} {timings[0] * 1000:>13.3f}ms {timings[1] * 1000:>15.3f}ms "
+                  f"{timings[0] / timings[1]:>7.1f}x")
+
+
+async def metrics_overhead(args) -> None:
+    """Per-request cost of MetricsMiddleware and per-statement cost of the SQL metrics listeners"""
+    iterations = args.crud_requests * 100
+
+    async def bare_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    async def per_request(app) -> float:
+        scope = {"type": "http", "method": "GET", "path": "/bench", "app": main.app}
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await app(scope, receive, send)
+        return (time.perf_counter() - start) / iterations
+
+    def per_statement(bind) -> float:
+        with bind.connect() as conn:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                conn.exec_driver_sql("SELECT 1")
+            return (time.perf_counter() - start) / iterations
+
+    instrumented_engine = database.create_db_engine("sqlite://")
+    metrics.instrument_engine(instrumented_engine, "bench")
+    plain_engine = database.create_db_engine("sqlite://")
+    # Any cursor listener moves SQLAlchemy onto its event-dispatching path; no-op ones isolate that cost
+    noop_engine = database.create_db_engine("sqlite://")
+    event.listen(noop_engine, "before_cursor_execute", lambda *args: None)
+    event.listen(noop_engine, "after_cursor_execute", lambda *args: None)
+    # Alternate runs and keep the best of each so CPU frequency drift doesn't favour either side
+    bare, wrapped, plain_sql, noop_sql, instrumented_sql = [], [], [], [], []
+    for _ in range(5):
+        bare.append(await per_request(bare_app))
+        wrapped.append(await per_request(metrics.MetricsMiddleware(bare_app)))
+        plain_sql.append(per_statement(plain_engine))
+        noop_sql.append(per_statement(noop_engine))
+        instrumented_sql.append(per_statement(instrumented_engine))
+    metrics.reset()
+
+    print(f"{iterations} iterations, best of 5")
+    print(f"  HTTP middleware: {(min(wrapped) - min(bare)) * 1e6:.2f}us per request "
+          f"({min(bare) * 1e6:.2f}us bare app, {min(wrapped) * 1e6:.2f}us wrapped)")
+    print(f"  SQL listeners:   {(min(instrumented_sql) - min(plain_sql)) * 1e6:.2f}us per statement, "
+          f"{(min(instrumented_sql) - min(noop_sql)) * 1e6:.2f}us of it in the metrics code "
+          f"({min(plain_sql) * 1e6:.2f}us plain SELECT 1, {min(noop_sql) * 1e6:.2f}us with no-op listeners, "
+          f"{min(instrumented_sql) * 1e6:.2f}us instrumented)")
@@ -0,0 +1,62 @@
+"""Command line for the benchmarks: python -m bench <scenario> [options]"""
+import argparse
+import asyncio
+import os
+
+import synthetic
+
+from . import ai, api, db, endpoints
+
+SCENARIOS = {
+    "ai-contention": ai.ai_contention,
+    "query-plans": db.query_plans,
+    "mixed-load": db.mixed_load,
+    "db-concurrency": db.db_concurrency,
+    "read-load": db.read_load,
+    "read-scaling": db.read_scaling,
+    "conditional-get": api.conditional_get,
+    "serialization": api.serialization_cost,
+    "trends": ai.trends,
+    "high-risk": ai.high_risk,
+    "ai-stream": ai.ai_stream,
+    "ai-batch": ai.ai_batch,
+    "ai-map-reduce": ai.ai_map_reduce,
+    "prompt-encoding": ai.prompt_encoding_cost,
+    "ai-load": ai.ai_load,
+    "endpoints": endpoints.endpoints,
+    "metrics-overhead": api.metrics_overhead,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="QMS backend benchmarks")
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--ai-calls", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--crud-requests", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--latency", default="lognormal:0.8,0.35", help="Stub LLM latency: fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub LLM calls that fail")
+    parser.add_argument("--ai-timeout", type=float, default=60.0, help="LLM call timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="Print a single JSON result line")
+    parser.add_argument("--target", choices=("inprocess", "uvicorn"), default="inprocess",
+                        help="Drive the app in-process or through a local uvicorn server")
+    parser.add_argument("--endpoints", help="Comma-separated endpoint names to run; all when omitted")
+    parser.add_argument("--warmup", type=int, default=5, help="Unrecorded requests per endpoint")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the JSON results of an earlier run")
+    parser.add_argument("--regression-threshold", type=float, default=10.0,
+                        help="Exit non-zero when an endpoint's p95 is this many percent above the baseline")
+    synthetic.add_generator_arguments(parser)
+    return parser
+
+
+def main(invocation_dir: str) -> None:
+    """Parse the command line and run the scenario; file paths are relative to invocation_dir"""
+    args = build_parser().parse_args()
+    for name in ("output", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.join(invocation_dir, getattr(args, name)))
+    asyncio.run(SCENARIOS[args.scenario](args))
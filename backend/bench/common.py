@@ -0,0 +1,161 @@
+"""Timing, stub models and data loading shared by the benchmark scenarios"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert, text
+
+import crud
+import llm_providers
+import main
+import models
+from database import SessionLocal, engine
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def stub_model(latency: float) -> llm_providers.StubProvider:
+    """Offline stand-in for Gemini that blocks like a real network round trip"""
+    return llm_providers.StubProvider(latency=f"fixed:{latency}", error_rate=0)
+
+
+class StreamingSlowModel:
+    """Streams a fixed answer in a few chunks, spreading its latency over them and counting what it sent"""
+
+    CHUNKS = ['{"summary": "', "Three regulatory audits ", 'are overdue", ', '"total_high_risk": 3, ',
+              '"high_risk_audits": []', ', "recommendations": ["Escalate"]}']
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.chunks_sent = 0
+
+    def _chunks(self):
+        for text in self.CHUNKS:
+            time.sleep(self.latency / len(self.CHUNKS))
+            self.chunks_sent += 1
+            yield llm_providers.GeneratedText(text)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._chunks()
+        return llm_providers.GeneratedText("".join(chunk.text for chunk in self._chunks()))
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def describe(samples) -> str:
+    ms = [s * 1000 for s in samples]
+    return (
+        f"n={len(ms)} p50={percentile(ms, 50):.2f}ms p95={percentile(ms, 95):.2f}ms "
+        f"p99={percentile(ms, 99):.2f}ms mean={statistics.mean(ms):.2f}ms"
+    )
+
+
+def seed():
+    db = SessionLocal()
+    try:
+        if crud.get_audits_count(db) == 0:
+            crud.seed_sample_data(db)
+    finally:
+        db.close()
+
+
+def insert_random_audits(count: int, seed_value: int = 7) -> None:
+    """Insert simple synthetic audits so the planner has realistic statistics"""
+    rng = random.Random(seed_value)
+    auditors = ["QA Manager", "Supplier Quality", "QA Specialist", "Head of Quality"]
+    countries = ["USA", "India", "Germany", "China", "Ireland", "Brazil"]
+    batch = []
+    with engine.begin() as conn:
+        for index in range(count):
+            start = date(2024, 1, 1) + timedelta(days=rng.randint(0, 700))
+            batch.append(dict(
+                audit_id=f"AUD-{start.year}-{index:08d}",
+                audit_title=f"Synthetic audit {index}",
+                audit_type=rng.choice(list(models.AuditType)),
+                audit_scope="Synthetic scope",
+                audit_objective="Synthetic objective",
+                auditee_name=f"Site {index % 50}",
+                auditee_site_location="Synthetic location",
+                auditee_country=rng.choice(countries),
+                primary_contact_name="Contact",
+                confirmed_start_date=start,
+                confirmed_end_date=start + timedelta(days=rng.randint(1, 10)),
+                lead_auditor=rng.choice(auditors),
+                audit_criteria="Synthetic criteria",
+                status=rng.choice(list(models.AuditStatus))
+            ))
+            if len(batch) == 5000:
+                conn.execute(insert(models.Audit.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.Audit.__table__), batch)
+        conn.execute(text("ANALYZE"))
+
+
+def clear_ai_caches() -> None:
+    main.ai_service.cache.clear()
+    main.ai_service.chunk_cache.clear()
+
+
+async def loop_lag(stop: asyncio.Event, samples: list) -> None:
+    """Record how late a 1ms sleep wakes up, i.e. how long the event loop was blocked"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        samples.append(max(0.0, time.perf_counter() - start - 0.001))
+
+
+async def asgi_post(path: str, payload: dict, disconnect_after_first_token: bool = False, headers=()):
+    """POST straight to the ASGI app, returning (status, [(seconds since send, body chunk)])"""
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                    *((name.lower().encode(), value.encode()) for name, value in headers)],
+        "client": ("bench", 1), "server": ("bench", 80),
+    }
+    disconnected = asyncio.Event()
+    request_sent = False
+    status = None
+    chunks = []
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            chunks.append((time.perf_counter() - start, message["body"]))
+            if disconnect_after_first_token and b"event: token" in message["body"]:
+                disconnected.set()
+
+    await main.app(scope, receive, send)
+    return status, chunks
+
+
+def run_json_scenario(scenario: str, options: list, **env) -> dict:
+    """Run another scenario with --json in a fresh process, so on its own scratch database"""
+    command = [sys.executable, "-m", "bench", scenario, "--json", *map(str, options)]
+    output = subprocess.run(command, cwd=BACKEND_DIR, env=dict(os.environ, **env),
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
@@ -0,0 +1,249 @@
+"""Database scenarios: query plans, mixed HTTP load and concurrent readers"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+from sqlalchemy import event, text
+
+import crud
+import main
+import models
+import schemas
+from database import ReadSessionLocal, SessionLocal, engine
+
+from .common import describe, insert_random_audits, loop_lag, percentile, run_json_scenario
+
+
+def _audit_plan_lines(statement: str, parameters) -> list:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+async def query_plans(args) -> None:
+    """EXPLAIN QUERY PLAN every list filter combination, match mode and sort at --rows scale.
+
+    Reports how each plan reads audits: an index seek ("SEARCH audits"), a walk of the sort
+    index that filters rows until LIMIT, or a bare table scan. tests/test_query_plans.py is
+    the pass/fail gate for which walks are acceptable.
+    """
+    insert_random_audits(args.rows)
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM audits" in statement:
+            captured.append((statement, parameters))
+
+    filters = {
+        "audit_id": "AUD-2025-0000",
+        "audit_type": models.AuditType.REGULATORY.value,
+        "status": models.AuditStatus.PLANNED.value,
+        "lead_auditor": "QA Manager",
+        "site": "India",
+    }
+    counts = {match: {"seek": 0, "walk": 0, "scan": 0} for match in crud.FILTER_MATCH_MODES}
+    event.listen(engine, "before_cursor_execute", capture)
+    db = SessionLocal()
+    try:
+        for size in range(1, len(filters) + 1):
+            for names in itertools.combinations(filters, size):
+                kwargs = {name: filters[name] for name in names}
+                for match in crud.FILTER_MATCH_MODES:
+                    for sort in ["id", *crud.SORTABLE_COLUMNS]:
+                        captured.clear()
+                        if sort == "id":
+                            crud.get_audits(db, match=match, **kwargs)
+                        else:
+                            crud.get_audits_page(db, sort=sort, match=match, **kwargs)
+                        for statement, parameters in captured:
+                            plan = [line.strip() for line in _audit_plan_lines(statement, parameters)]
+                            if any(line.startswith("SEARCH audits") for line in plan):
+                                counts[match]["seek"] += 1
+                            elif "SCAN audits" in plan:
+                                counts[match]["scan"] += 1
+                                # get_audits orders by id, so rowid order is its sort walk
+                                if sort != "id":
+                                    print(f"FULL SCAN filters={names} match={match} sort={sort}: {plan}")
+                            else:
+                                counts[match]["walk"] += 1
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", capture)
+
+    print(f"Query plans over {args.rows} rows:")
+    for match, count in counts.items():
+        print(f"  {match:>8}: {count['seek']} index seeks, {count['walk']} sort-index walks, {count['scan']} table scans")
+
+
+async def mixed_load(args) -> None:
+    """Drive a 70/20/10 list/detail/update mix with N concurrent clients for a fixed duration"""
+    insert_random_audits(args.rows)
+    db = SessionLocal()
+    try:
+        audit_ids = [audit.audit_id for audit in crud.get_audits(db, limit=500)]
+    finally:
+        db.close()
+
+    rng = random.Random(11)
+    latencies = {"list": [], "detail": [], "update": []}
+    errors = 0
+    lag = []
+    stop = asyncio.Event()
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while not stop.is_set():
+            roll = rng.random()
+            audit_id = rng.choice(audit_ids)
+            start = time.perf_counter()
+            if roll < 0.7:
+                kind, response = "list", await client.get("/audits/", params={"limit": 50, "status": "Planned"})
+            elif roll < 0.9:
+                kind, response = "detail", await client.get(f"/audits/{audit_id}")
+            else:
+                kind, response = "update", await client.put(
+                    f"/audits/{audit_id}", json={"audit_team": f"Team {rng.randint(1, 99)}"}
+                )
+            if response.status_code >= 400:
+                errors += 1
+            latencies[kind].append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        lag_task = asyncio.create_task(loop_lag(stop, lag))
+        workers = [asyncio.create_task(worker(client)) for _ in range(args.concurrency)]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*workers, lag_task)
+
+    total = sum(len(samples) for samples in latencies.values())
+    result = {
+        "async_db": os.getenv("QMS_ASYNC_DB", "0") == "1",
+        "concurrency": args.concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": total / args.duration,
+        "loop_lag_p99_ms": percentile(lag, 99) * 1000 if lag else None,
+        "latency_ms": {
+            kind: {"p50": percentile(samples, 50) * 1000, "p95": percentile(samples, 95) * 1000}
+            for kind, samples in latencies.items() if samples
+        },
+    }
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"async_db={result['async_db']} concurrency={args.concurrency} "
+          f"throughput={result['throughput_rps']:.1f} req/s errors={errors} "
+          f"loop lag p99={result['loop_lag_p99_ms']:.2f}ms")
+    for kind, samples in latencies.items():
+        if samples:
+            print(f"  {kind:<7} {describe(samples)}")
+
+
+async def db_concurrency(args) -> None:
+    """Run mixed-load with the sync and the aiosqlite session layer and compare"""
+    options = ["--rows", args.rows, "--concurrency", args.concurrency, "--duration", args.duration]
+    results = [run_json_scenario("mixed-load", options, QMS_ASYNC_DB=async_db) for async_db in ("0", "1")]
+
+    print(f"{'session':<10} {'req/s':>8} {'errors':>7} {'loop lag p99':>13} "
+          f"{'list p95':>10} {'detail p95':>11} {'update p95':>11}")
+    for result in results:
+        latency = result["latency_ms"]
+        print(f"{'async' if result['async_db'] else 'sync':<10} {result['throughput_rps']:>8.1f} "
+              f"{result['errors']:>7} {result['loop_lag_p99_ms']:>11.2f}ms "
+              f"{latency['list']['p95']:>8.2f}ms {latency['detail']['p95']:>9.2f}ms "
+              f"{latency['update']['p95']:>9.2f}ms")
+
+
+async def read_load(args) -> None:
+    """N reader threads page through audits on the read engine while one thread keeps writing"""
+    insert_random_audits(args.rows)
+    db = SessionLocal()
+    try:
+        audit_ids = [audit.audit_id for audit in crud.get_audits(db, limit=500)]
+    finally:
+        db.close()
+
+    stop = threading.Event()
+    reads = []
+    writes = []
+    errors = []
+
+    def reader(index: int) -> None:
+        rng = random.Random(index)
+        db = ReadSessionLocal()
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                crud.get_audits_page(db, limit=50, status=rng.choice(list(models.AuditStatus)))
+                db.rollback()
+                reads.append(time.perf_counter() - start)
+        except Exception as exc:
+            errors.append(repr(exc))
+        finally:
+            db.close()
+
+    def writer() -> None:
+        rng = random.Random(0)
+        db = SessionLocal()
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                crud.update_audit(
+                    db, rng.choice(audit_ids), schemas.AuditUpdate(audit_team=f"Team {rng.randint(1, 99)}")
+                )
+                writes.append(time.perf_counter() - start)
+        except Exception as exc:
+            errors.append(repr(exc))
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.concurrency)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    with engine.connect() as conn:
+        journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+    result = {
+        "journal_mode": journal_mode,
+        "readers": args.concurrency,
+        "reads_per_s": len(reads) / args.duration,
+        "writes_per_s": len(writes) / args.duration,
+        "read_p95_ms": percentile(reads, 95) * 1000 if reads else None,
+        "errors": len(errors),
+    }
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"journal_mode={journal_mode} readers={args.concurrency} "
+          f"reads={result['reads_per_s']:.1f}/s writes={result['writes_per_s']:.1f}/s errors={len(errors)}")
+    print(f"  read  {describe(reads)}")
+    if writes:
+        print(f"  write {describe(writes)}")
+    for error in errors[:5]:
+        print(f"  error {error}")
+
+
+async def read_scaling(args) -> None:
+    """Compare read-load throughput across reader counts for rollback-journal vs WAL"""
+    results = [
+        run_json_scenario("read-load", ["--rows", args.rows, "--concurrency", readers, "--duration", args.duration],
+                          QMS_SQLITE_JOURNAL_MODE=journal_mode)
+        for journal_mode in ("DELETE", "WAL")
+        for readers in (1, 2, 4, 8)
+    ]
+
+    print(f"{'journal':<8} {'readers':>7} {'reads/s':>9} {'writes/s':>9} {'read p95':>10} {'errors':>7}")
+    for result in results:
+        print(f"{result['journal_mode']:<8} {result['readers']:>7} {result['reads_per_s']:>9.1f} "
+              f"{result['writes_per_s']:>9.1f} {result['read_p95_ms']:>8.2f}ms {result['errors']:>7}")
@@ -0,0 +1,237 @@
+"""Per-endpoint latency harness over synthetic data, with saved runs and regression comparison"""
+import asyncio
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from sqlalchemy import text
+
+import llm_providers
+import main
+import models
+import synthetic
+from database import SessionLocal
+
+from .common import BACKEND_DIR, describe, percentile
+
+SEARCH_TERMS = ("data integrity", "supplier", "cleaning validation", "sterile", "capa", "warehouse")
+
+
+def endpoint_requests(audit_ids: list) -> dict:
+    """name -> (is_ai, build(n) returning (method, path, params, json body)) for the endpoints benchmark"""
+    statuses = [status.value for status in models.AuditStatus]
+    types = [audit_type.value for audit_type in models.AuditType]
+    return {
+        "list": (False, lambda n: ("GET", "/audits/", {"limit": 50}, None)),
+        "list-status": (False, lambda n: ("GET", "/audits/", {"limit": 50, "status": statuses[n % len(statuses)]}, None)),
+        "list-sorted": (False, lambda n: ("GET", "/audits/", {
+            "limit": 50, "sort": "confirmed_end_date", "order": "desc", "audit_type": types[n % len(types)],
+        }, None)),
+        "search": (False, lambda n: ("GET", "/audits/", {"limit": 50, "q": SEARCH_TERMS[n % len(SEARCH_TERMS)]}, None)),
+        "detail": (False, lambda n: ("GET", f"/audits/{audit_ids[n % len(audit_ids)]}", {}, None)),
+        "summary": (False, lambda n: ("GET", "/audits-summary", {}, None)),
+        # A distinct query per call keeps the AI response cache out of the measurement
+        "ai-summary": (True, lambda n: ("POST", "/ai/query", {}, {"tool": "summarize_open_events", "query": f"load {n}"})),
+        "ai-trends": (True, lambda n: ("POST", "/ai/query", {}, {"tool": "identify_trends", "query": f"load {n}"})),
+        "ai-high-risk": (True, lambda n: ("POST", "/ai/query", {}, {"tool": "show_high_risk_events", "query": f"load {n}"})),
+    }
+
+
+async def drive_endpoint(client: httpx.AsyncClient, build, count: int, concurrency: int, first: int = 0):
+    """Send count requests from build over concurrency workers; returns (latencies, errors, elapsed)"""
+    latencies, errors = [], 0
+    counter = itertools.count(first)
+
+    async def worker() -> None:
+        nonlocal errors
+        while (n := next(counter)) < first + count:
+            method, path, params, body = build(n)
+            start = time.perf_counter()
+            response = await client.request(method, path, params=params, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400 or (body is not None and not response.json().get("success")):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, count)))))
+    return latencies, errors, time.perf_counter() - start
+
+
+class UvicornServer:
+    """Serves main:app from a uvicorn subprocess on the benchmark's scratch database"""
+
+    def __init__(self, args):
+        import socket
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join(filter(None, (BACKEND_DIR, os.getenv("PYTHONPATH")))),
+            QMS_LLM_PROVIDER="stub",
+            QMS_LLM_STUB_LATENCY=args.latency,
+            QMS_LLM_STUB_ERROR_RATE=str(args.error_rate),
+            QMS_AI_TIMEOUT_SECONDS=str(args.ai_timeout),
+        )
+        self.process = None
+
+    async def __aenter__(self) -> str:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                   "--port", str(self.port), "--log-level", "warning"]
+        self.process = subprocess.Popen(command, cwd=os.getcwd(), env=self.env)
+        deadline = time.perf_counter() + 60
+        async with httpx.AsyncClient(base_url=self.base_url) as client:
+            while time.perf_counter() < deadline:
+                if self.process.poll() is not None:
+                    raise SystemExit(f"uvicorn exited with status {self.process.returncode}")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        return self.base_url
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise SystemExit("uvicorn did not become ready within 60s")
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def git_revision() -> dict:
+    def git(*command):
+        return subprocess.run(["git", *command], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def compare_endpoint_results(baseline: dict, current: dict, threshold_pct: float) -> list:
+    """Print per-endpoint changes against a saved run; returns endpoints whose p95 regressed"""
+    regressions = []
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp')}):")
+    print(f"  {'endpoint':<14} {'p50':>18} {'p95':>18} {'p99':>18} {'req/s':>16}")
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            print(f"  {name:<14} (not in baseline)")
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            change = 100.0 * (now[key] - before[key]) / before[key] if before[key] else 0.0
+            cells.append(f"{now[key]:>9.2f} {change:+6.1f}%")
+        p95_change = 100.0 * (now["p95_ms"] - before["p95_ms"]) / max(before["p95_ms"], 1e-9)
+        flag = ""
+        if p95_change > threshold_pct:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"  {name:<14} " + " ".join(f"{cell:>18}" for cell in cells[:3]) + f" {cells[3]:>16}{flag}")
+    return regressions
+
+
+async def endpoints(args) -> None:
+    """p50/p95/p99 latency and throughput per endpoint over synthetic data, in-process or via uvicorn,
+    optionally saved as JSON and compared with a previous run"""
+    audit_ids = []
+    requests = endpoint_requests(audit_ids)
+    names = args.endpoints.split(",") if args.endpoints else list(requests)
+    unknown = [name for name in names if name not in requests]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)} (choose from {', '.join(requests)})")
+    try:
+        generator = synthetic.generator_from_args(args)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    db = SessionLocal()
+    try:
+        load_start = time.perf_counter()
+        synthetic.load_audits(db, args.rows, generator)
+        load_seconds = time.perf_counter() - load_start
+        audit_ids.extend(row[0] for row in db.execute(
+            text("SELECT audit_id FROM audits ORDER BY random() LIMIT 500")
+        ))
+    finally:
+        db.close()
+
+    if args.target == "uvicorn":
+        server = UvicornServer(args)
+        client_kwargs = {}
+    else:
+        main.ai_service.model = llm_providers.StubProvider(latency=args.latency, error_rate=args.error_rate)
+        main.ai_service.timeout = args.ai_timeout
+        server = None
+        client_kwargs = {"transport": httpx.ASGITransport(app=main.app)}
+
+    results = {}
+    base_url = await server.__aenter__() if server else "http://bench"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None, **client_kwargs) as client:
+            for name in names:
+                is_ai, build = requests[name]
+                count = args.ai_calls if is_ai else args.crud_requests
+                await drive_endpoint(client, build, args.warmup, 1, first=count)
+                latencies, errors, elapsed = await drive_endpoint(client, build, count, args.concurrency)
+                method, path, _, _ = build(0)
+                results[name] = {
+                    "method": method,
+                    "path": "/audits/{audit_id}" if name == "detail" else path,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+                    "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+                    "throughput_rps": round(len(latencies) / elapsed, 2),
+                }
+                print(f"  {name:<14} {describe(latencies)} {results[name]['throughput_rps']:>8.1f} req/s "
+                      f"errors={errors}")
+    finally:
+        if server:
+            await server.__aexit__()
+
+    report = {
+        "scenario": "endpoints",
+        **git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "params": {
+            "target": args.target, "rows": args.rows, "seed": args.seed, "concurrency": args.concurrency,
+            "requests": args.crud_requests, "ai_requests": args.ai_calls, "warmup": args.warmup,
+            "llm_latency": args.latency, "llm_error_rate": args.error_rate,
+            "types": args.types, "statuses": args.statuses, "countries": args.countries, "auditors": args.auditors,
+        },
+        "environment": {"python": sys.version.split()[0], "sqlite": sqlite3.sqlite_version,
+                        "platform": platform.platform()},
+        "load_seconds": round(load_seconds, 2),
+        "endpoints": results,
+    }
+    print(f"{args.rows} synthetic audits loaded in {load_seconds:.1f}s; target {args.target}, "
+          f"{args.concurrency} clients")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("params", {}).get("rows") != args.rows:
+            print(f"Note: baseline was run with {baseline.get('params', {}).get('rows')} rows")
+        regressions = compare_endpoint_results(baseline, report, args.regression_threshold)
+        if regressions:
+            print(f"p95 regressed by more than {args.regression_threshold:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+    if args.json:
+        print(json.dumps(report))
@@ -1,10 +1,70 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from models import Audit, AuditType, AuditStatus
+from sqlalchemy.orm import Session, undefer_group
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy import and_, or_, func, insert, update, bindparam, literal_column, table, column, text, JSON
+from models import Audit, AuditType, AuditStatus, AuditStatusCount, AuditCollectionVersion, AIJob, SEARCH_COLUMNS
 from schemas import AuditCreate, AuditUpdate
+import risk
+import base64
+import json
+import os
+import re
 import uuid
 from datetime import datetime, date
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+
+# Keep audit_status_counts in step with writes so the summary is O(1)
+STATUS_COUNTERS_ENABLED = os.getenv("QMS_STATUS_COUNTERS", "0") == "1"
+
+# Bumped on every audit write; listeners (e.g. AI response cache) are notified
+audit_data_version = 0
+_audit_write_listeners: List[Callable[[], None]] = []
+
+def register_audit_write_listener(listener: Callable[[], None]) -> None:
+    """Register a callback invoked after any audit create/update/delete"""
+    _audit_write_listeners.append(listener)
+
+def _notify_audit_write() -> None:
+    global audit_data_version
+    audit_data_version += 1
+    for listener in _audit_write_listeners:
+        listener()
+
+def _adjust_status_count(db: Session, status: Optional[AuditStatus], delta: int) -> None:
+    """Apply a delta to the counter row for a status within the current transaction"""
+    if not STATUS_COUNTERS_ENABLED or status is None or delta == 0:
+        return
+    updated = db.query(AuditStatusCount).filter(AuditStatusCount.status == status).update(
+        {AuditStatusCount.count: AuditStatusCount.count + delta}, synchronize_session=False
+    )
+    if not updated:
+        db.add(AuditStatusCount(status=status, count=delta))
+        db.flush()
+
+def _bump_collection_version(db: Session) -> None:
+    """Advance the audit collection version within the current transaction"""
+    updated = db.query(AuditCollectionVersion).filter(AuditCollectionVersion.id == 1).update(
+        {AuditCollectionVersion.version: AuditCollectionVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.add(AuditCollectionVersion(id=1, version=1))
+        db.flush()
+
+class AuditVersionConflict(Exception):
+    """Raised when an audit was modified after the version the caller based its update on"""
+
+# Every mapped column, including the deferred narrative group
+AUDIT_COLUMN_NAMES = [attr.key for attr in sa_inspect(Audit).column_attrs]
+
+def _refresh_audit(db: Session, db_audit: Audit) -> None:
+    """Reload a committed audit in one SELECT so serializing it needs no further lazy loads"""
+    db.refresh(db_audit, attribute_names=AUDIT_COLUMN_NAMES)
+
+def _apply_risk(db_audit: Audit) -> None:
+    """Re-score an audit from its current field values (see risk.py)"""
+    for name, value in risk.risk_columns(db_audit).items():
+        setattr(db_audit, name, value)
 
 def generate_audit_id() -> str:
     """Generate a unique audit ID"""
@@ -21,35 +81,179 @@ def create_audit(db: Session, audit: AuditCreate) -> Audit:
         **audit.dict()
     )
     
+    _apply_risk(db_audit)
     db.add(db_audit)
+    _adjust_status_count(db, db_audit.status or AuditStatus.PLANNED, 1)
+    _bump_collection_version(db)
     db.commit()
-    db.refresh(db_audit)
+    _refresh_audit(db, db_audit)
+    _notify_audit_write()
     return db_audit
 
+BULK_BATCH_SIZE = 1000
+BULK_MAX_REPORTED_ERRORS = 1000
+
+def _format_validation_error(error: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}"
+        for item in error.errors()
+    ]
+
+def _insert_audit_batch(db: Session, batch: List[Tuple[int, Dict[str, Any]]]) -> Optional[str]:
+    """Insert one validated batch in a single executemany transaction, returning an error on failure"""
+    try:
+        # Core insert skips ORM unit-of-work bookkeeping for the whole batch
+        db.connection().execute(insert(Audit.__table__), [values for _, values in batch])
+        _adjust_status_count(db, AuditStatus.PLANNED, len(batch))
+        _bump_collection_version(db)
+        db.commit()
+        return None
+    except Exception as e:
+        db.rollback()
+        return f"Insert failed: {str(e)}"
+
+def bulk_create_audits(
+    db: Session,
+    rows: Iterable[Tuple[int, Dict[str, Any]]],
+    batch_size: int = BULK_BATCH_SIZE,
+    max_reported_errors: int = BULK_MAX_REPORTED_ERRORS
+) -> Dict[str, Any]:
+    """Validate and insert audits from a stream of (row_number, fields) pairs.
+
+    Rows are validated against AuditCreate and written batch by batch with
+    executemany, so only one batch is held in memory. Invalid rows are
+    skipped and reported; a batch that fails to insert is retried one row per
+    transaction, so the rows that caused it are reported and the rest still go in.
+    """
+    report = {"total_rows": 0, "inserted": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    def record_error(row_number: int, messages: List[str]) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < max_reported_errors:
+            report["errors"].append({"row": row_number, "errors": messages})
+        else:
+            report["errors_truncated"] = True
+
+    def flush(batch: List[Tuple[int, Dict[str, Any]]]) -> None:
+        if _insert_audit_batch(db, batch) is None:
+            report["inserted"] += len(batch)
+            return
+        for item in batch:
+            error = _insert_audit_batch(db, [item])
+            if error is None:
+                report["inserted"] += 1
+            else:
+                record_error(item[0], [error])
+
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    for row_number, fields in rows:
+        report["total_rows"] += 1
+        if "__error__" in fields:
+            record_error(row_number, [fields["__error__"]])
+            continue
+        try:
+            audit = AuditCreate(**fields)
+        except ValidationError as e:
+            record_error(row_number, _format_validation_error(e))
+            continue
+        values = audit.model_dump()
+        values["audit_id"] = generate_audit_id()
+        values["status"] = AuditStatus.PLANNED
+        values.update(risk.risk_columns(values))
+        batch.append((row_number, values))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    if report["inserted"]:
+        _notify_audit_write()
+    return report
+
+def insert_audit_rows(db: Session, rows: Iterable[Dict[str, Any]], batch_size: int = BULK_BATCH_SIZE) -> int:
+    """Insert complete, trusted audit column dicts (e.g. generated data) batch by batch.
+
+    Unlike bulk_create_audits nothing is validated or defaulted: rows carry their own
+    audit_id, status, timestamps and risk columns. Returns the number inserted.
+    """
+    inserted = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        db.connection().execute(insert(Audit.__table__), batch)
+        statuses: Dict[AuditStatus, int] = {}
+        for values in batch:
+            statuses[values["status"]] = statuses.get(values["status"], 0) + 1
+        for status, count in statuses.items():
+            _adjust_status_count(db, status, count)
+        _bump_collection_version(db)
+        db.commit()
+
+    try:
+        for values in rows:
+            batch.append(values)
+            if len(batch) >= batch_size:
+                flush()
+                inserted += len(batch)
+                batch = []
+        if batch:
+            flush()
+            inserted += len(batch)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if inserted:
+            _notify_audit_write()
+    return inserted
+
 def get_audit(db: Session, audit_id: str) -> Optional[Audit]:
-    """Get audit by audit_id"""
-    return db.query(Audit).filter(Audit.audit_id == audit_id).first()
+    """Get audit by audit_id, including its narrative text"""
+    return db.query(Audit).options(undefer_group("narrative")).filter(Audit.audit_id == audit_id).first()
 
 def get_audit_by_id(db: Session, id: int) -> Optional[Audit]:
     """Get audit by database id"""
     return db.query(Audit).filter(Audit.id == id).first()
 
-def get_audits(
-    db: Session, 
-    skip: int = 0, 
-    limit: int = 100,
+# How free-text filters (audit_id, lead_auditor, site) are matched. "exact" and
+# "prefix" are case-sensitive and served by indexes; "contains" is a LIKE scan.
+FILTER_MATCH_MODES = ("contains", "prefix", "exact")
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with prefix"""
+    last = ord(prefix[-1])
+    if last >= 0x10FFFF:
+        return None
+    return prefix[:-1] + chr(last + 1)
+
+def _match_text(column, value: str, match: str):
+    if match == "exact":
+        return column == value
+    if match == "prefix":
+        # A range predicate can seek the index, unlike LIKE 'x%' on a BINARY column
+        upper = _prefix_upper_bound(value)
+        return column >= value if upper is None else and_(column >= value, column < upper)
+    return column.contains(value)
+
+def _filter_audits(
+    query,
     audit_id: Optional[str] = None,
     audit_type: Optional[str] = None,
     status: Optional[str] = None,
     lead_auditor: Optional[str] = None,
-    site: Optional[str] = None
-) -> List[Audit]:
-    """Get audits with optional filtering"""
-    query = db.query(Audit)
-    
-    # Apply filters
+    site: Optional[str] = None,
+    match: str = "contains",
+    audit_id_match: Optional[str] = None
+):
+    """Apply the list filters shared by every audit listing; audit_id_match overrides match for audit_id"""
+    audit_id_match = audit_id_match or match
+    for mode in (match, audit_id_match):
+        if mode not in FILTER_MATCH_MODES:
+            raise ValueError(f"Unsupported match mode: {mode}")
+
     if audit_id:
-        query = query.filter(Audit.audit_id.contains(audit_id))
+        query = query.filter(_match_text(Audit.audit_id, audit_id, audit_id_match))
     
     if audit_type and audit_type != "All":
         try:
@@ -66,25 +270,332 @@ def get_audits(
             pass
     
     if lead_auditor and lead_auditor != "All":
-        query = query.filter(Audit.lead_auditor.contains(lead_auditor))
+        query = query.filter(_match_text(Audit.lead_auditor, lead_auditor, match))
     
     if site and site != "All":
-        query = query.filter(Audit.auditee_country.contains(site))
+        query = query.filter(_match_text(Audit.auditee_country, site, match))
     
-    return query.offset(skip).limit(limit).all()
+    return query
+
+def get_audits(
+    db: Session, 
+    skip: int = 0, 
+    limit: int = 100,
+    audit_id: Optional[str] = None,
+    audit_type: Optional[str] = None,
+    status: Optional[str] = None,
+    lead_auditor: Optional[str] = None,
+    site: Optional[str] = None,
+    match: str = "contains",
+    audit_id_match: Optional[str] = None,
+    with_narrative: bool = False
+) -> List[Audit]:
+    """Get audits with optional filtering; narrative text columns stay deferred unless requested"""
+    query = db.query(Audit)
+    if with_narrative:
+        query = query.options(undefer_group("narrative"))
+    query = _filter_audits(
+        query,
+        audit_id=audit_id,
+        audit_type=audit_type,
+        status=status,
+        lead_auditor=lead_auditor,
+        site=site,
+        match=match,
+        audit_id_match=audit_id_match
+    )
+    return query.order_by(Audit.id).offset(skip).limit(limit).all()
+
+# Columns GET /audits/ returns (schemas.AuditListResponse); list queries select only these
+LIST_COLUMNS = [
+    "id", "audit_id", "audit_title", "audit_type", "status", "auditee_name",
+    "lead_auditor", "confirmed_end_date", "auditee_country",
+]
+
+def _list_query(db: Session, extra_columns: Iterable[str] = ()):
+    """Query for lightweight row tuples of the list columns instead of full Audit entities"""
+    names = LIST_COLUMNS + [name for name in extra_columns if name not in LIST_COLUMNS]
+    return db.query(*[getattr(Audit, name) for name in names])
+
+# Columns GET /audits/ can sort on; each has a matching (column, id) index
+SORTABLE_COLUMNS = {
+    "confirmed_end_date": Audit.confirmed_end_date,
+    "created_at": Audit.created_at,
+    "status": Audit.status,
+    "audit_id": Audit.audit_id,
+}
+
+def _encode_cursor(sort: str, order: str, audit, direction: str) -> str:
+    """Build an opaque cursor pointing just past (or before) the given row"""
+    value = getattr(audit, sort)
+    if isinstance(value, AuditStatus):
+        value = value.name
+    elif isinstance(value, date):
+        value = value.isoformat()
+    payload = {"s": sort, "o": order, "v": value, "i": audit.id, "d": direction}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> Dict:
+    """Decode a cursor, rejecting tampered tokens or ones issued for another sort"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = payload["v"]
+        if value is not None:
+            if payload["s"] == "status":
+                value = AuditStatus[value]
+            elif payload["s"] == "confirmed_end_date":
+                value = date.fromisoformat(value)
+            elif payload["s"] == "created_at":
+                # Compared as a DateTime bind, so it is rendered in the column's own storage format
+                value = datetime.fromisoformat(value)
+        payload["v"] = value
+        int(payload["i"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+    if payload["s"] != sort or payload["o"] != order or payload["d"] not in ("next", "prev"):
+        raise ValueError("Cursor does not match the requested sort order")
+    return payload
+
+def get_audits_page(
+    db: Session,
+    limit: int = 100,
+    sort: str = "created_at",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    audit_id: Optional[str] = None,
+    audit_type: Optional[str] = None,
+    status: Optional[str] = None,
+    lead_auditor: Optional[str] = None,
+    site: Optional[str] = None,
+    match: str = "contains",
+    audit_id_match: Optional[str] = None
+) -> Tuple[List, Optional[str], Optional[str]]:
+    """Get one page of audits using keyset pagination.
+
+    Returns (rows, next_cursor, prev_cursor) where rows are Row tuples of
+    LIST_COLUMNS plus the sort column. Rows are ordered by the sort column
+    with id as tie-breaker, so seeking to any page costs an index lookup
+    instead of an OFFSET scan. `skip` is only honoured without a cursor.
+    """
+    if sort not in SORTABLE_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unsupported sort order: {order}")
+
+    column = SORTABLE_COLUMNS[sort]
+    query = _filter_audits(
+        _list_query(db, [sort]),
+        audit_id=audit_id,
+        audit_type=audit_type,
+        status=status,
+        lead_auditor=lead_auditor,
+        site=site,
+        match=match,
+        audit_id_match=audit_id_match
+    )
+
+    direction = "next"
+    if cursor:
+        anchor = _decode_cursor(cursor, sort, order)
+        direction = anchor["d"]
+        # Walking backwards is the same seek with the comparison flipped
+        ascending = (order == "asc") == (direction == "next")
+        value, last_id = anchor["v"], anchor["i"]
+        if ascending:
+            query = query.filter(or_(column > value, and_(column == value, Audit.id > last_id)))
+        else:
+            query = query.filter(or_(column < value, and_(column == value, Audit.id < last_id)))
+    else:
+        ascending = order == "asc"
+
+    if ascending:
+        query = query.order_by(column.asc(), Audit.id.asc())
+    else:
+        query = query.order_by(column.desc(), Audit.id.desc())
+    if not cursor:
+        query = query.offset(skip)
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == "prev":
+        rows.reverse()
 
-def update_audit(db: Session, audit_id: str, audit_update: AuditUpdate) -> Optional[Audit]:
-    """Update an existing audit"""
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == "next":
+            if has_more:
+                next_cursor = _encode_cursor(sort, order, rows[-1], "next")
+            if cursor or skip:
+                prev_cursor = _encode_cursor(sort, order, rows[0], "prev")
+        else:
+            next_cursor = _encode_cursor(sort, order, rows[-1], "next")
+            if has_more:
+                prev_cursor = _encode_cursor(sort, order, rows[0], "prev")
+    return rows, next_cursor, prev_cursor
+
+# Columns available to the export endpoint, in to_dict() order
+EXPORT_COLUMNS = [
+    "id", "audit_id", "audit_title", "audit_type", "audit_scope", "audit_objective",
+    "auditee_name", "auditee_site_location", "auditee_country", "primary_contact_name",
+    "primary_contact_email", "proposed_start_date", "proposed_end_date",
+    "confirmed_start_date", "confirmed_end_date", "lead_auditor", "audit_team",
+    "audit_criteria", "audit_agenda", "status", "created_at", "updated_at",
+]
+EXPORT_YIELD_PER = 1000
+
+def _export_value(value):
+    if isinstance(value, (AuditType, AuditStatus)):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def iter_audits_for_export(
+    db: Session,
+    columns: List[str],
+    audit_id: Optional[str] = None,
+    audit_type: Optional[str] = None,
+    status: Optional[str] = None,
+    lead_auditor: Optional[str] = None,
+    site: Optional[str] = None,
+    match: str = "contains",
+    audit_id_match: Optional[str] = None,
+    yield_per: int = EXPORT_YIELD_PER
+) -> Iterator[Tuple]:
+    """Stream the selected audit columns as plain tuples, ordered by id.
+
+    Only the requested columns are selected and rows are fetched from the
+    cursor yield_per at a time, so memory use does not grow with the export.
+    """
+    unknown = [name for name in columns if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+
+    query = _filter_audits(
+        db.query(*[getattr(Audit, name) for name in columns]),
+        audit_id=audit_id,
+        audit_type=audit_type,
+        status=status,
+        lead_auditor=lead_auditor,
+        site=site,
+        match=match,
+        audit_id_match=audit_id_match
+    )
+    for row in query.order_by(Audit.id).execution_options(stream_results=True).yield_per(yield_per):
+        yield tuple(_export_value(value) for value in row)
+
+# FTS5 table kept in sync with audits by triggers (see models.create_search_index)
+_audits_fts = table("audits_fts", column("rowid"))
+SEARCH_SNIPPET_TOKENS = 12
+
+def _fts_match_expression(q: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 query: every term must match, the last one as a prefix"""
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _like_search_filter(q: str):
+    """The FTS5 query's fallback for other databases: every term appears in some narrative column"""
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    return and_(*[
+        or_(*[getattr(Audit, name).ilike(f"%{term.replace('_', '/_')}%", escape="/") for name in SEARCH_COLUMNS])
+        for term in terms
+    ])
+
+def search_audits(
+    db: Session,
+    q: str,
+    skip: int = 0,
+    limit: int = 100,
+    audit_id: Optional[str] = None,
+    audit_type: Optional[str] = None,
+    status: Optional[str] = None,
+    lead_auditor: Optional[str] = None,
+    site: Optional[str] = None,
+    match: str = "contains",
+    audit_id_match: Optional[str] = None
+) -> List[Tuple[Any, Optional[str]]]:
+    """Full-text search over audit narrative fields, best matches first.
+
+    Returns (row, snippet) pairs where rows carry LIST_COLUMNS. On SQLite
+    this is an FTS5 index lookup ranked by bm25; other databases fall back
+    to unranked LIKE matching.
+    """
+    query = _filter_audits(
+        _list_query(db),
+        audit_id=audit_id,
+        audit_type=audit_type,
+        status=status,
+        lead_auditor=lead_auditor,
+        site=site,
+        match=match,
+        audit_id_match=audit_id_match
+    )
+
+    if db.get_bind().dialect.name != "sqlite":
+        condition = _like_search_filter(q)
+        if condition is None:
+            return []
+        rows = query.filter(condition).order_by(Audit.id).offset(skip).limit(limit).all()
+        return [(row, None) for row in rows]
+
+    fts_query = _fts_match_expression(q)
+    if fts_query is None:
+        return []
+
+    fts = literal_column("audits_fts")
+    snippet = func.snippet(fts, -1, "[", "]", "...", SEARCH_SNIPPET_TOKENS).label("snippet")
+    rows = (
+        query.add_columns(snippet)
+        .join(_audits_fts, _audits_fts.c.rowid == Audit.id)
+        .filter(text("audits_fts MATCH :fts_query").bindparams(fts_query=fts_query))
+        .order_by(func.bm25(fts), Audit.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [(row, row.snippet) for row in rows]
+
+def update_audit(
+    db: Session,
+    audit_id: str,
+    audit_update: AuditUpdate,
+    expected_version: Optional[int] = None
+) -> Optional[Audit]:
+    """Update an existing audit, optionally only if it is still at expected_version"""
     db_audit = get_audit(db, audit_id)
     if not db_audit:
         return None
+    if expected_version is not None and db_audit.row_version != expected_version:
+        raise AuditVersionConflict(audit_id)
     
+    previous_status = db_audit.status
     update_data = audit_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_audit, field, value)
+    _apply_risk(db_audit)
     
-    db.commit()
-    db.refresh(db_audit)
+    if db_audit.status != previous_status:
+        _adjust_status_count(db, previous_status, -1)
+        _adjust_status_count(db, db_audit.status, 1)
+    _bump_collection_version(db)
+    try:
+        db.commit()
+    except StaleDataError:
+        # Another writer committed between our read and this UPDATE
+        db.rollback()
+        raise AuditVersionConflict(audit_id)
+    _refresh_audit(db, db_audit)
+    _notify_audit_write()
     return db_audit
 
 def delete_audit(db: Session, audit_id: str) -> bool:
@@ -94,13 +605,237 @@ def delete_audit(db: Session, audit_id: str) -> bool:
         return False
     
     db.delete(db_audit)
+    _adjust_status_count(db, db_audit.status, -1)
+    _bump_collection_version(db)
     db.commit()
+    _notify_audit_write()
     return True
 
+def get_audit_version(db: Session, audit_id: str) -> Optional[Tuple[int, int]]:
+    """(id, row_version) of an audit without loading the row, or None if it does not exist"""
+    row = db.query(Audit.id, Audit.row_version).filter(Audit.audit_id == audit_id).first()
+    return tuple(row) if row else None
+
+def get_audits_collection_version(db: Session) -> int:
+    """Version of the audit collection as a whole; changes on every create, update and delete"""
+    version = db.query(AuditCollectionVersion.version).filter(AuditCollectionVersion.id == 1).scalar()
+    return version or 0
+
+RISK_REFRESH_BATCH_SIZE = 1000
+
+# Date refresh_risk_scores last brought every score up to date in this process
+_risk_scores_current_on: Optional[date] = None
+
+def refresh_risk_scores(db: Session, today: Optional[date] = None) -> int:
+    """Re-score audits never scored or scored under older rules, and open overdue audits whose score
+    moves with the date"""
+    global _risk_scores_current_on
+    today = today or date.today()
+    stale = or_(
+        Audit.risk_scored_on.is_(None),
+        Audit.risk_rules_version < risk.RULES_VERSION,
+        and_(
+            Audit.status.in_(risk.OPEN_STATUSES),
+            Audit.confirmed_end_date < today,
+            Audit.risk_scored_on < today
+        )
+    )
+    inputs = [Audit.id] + [getattr(Audit, name) for name in risk.RISK_INPUT_FIELDS]
+    # Setting updated_at to itself keeps its onupdate from firing: re-scoring is not an edit
+    statement = (
+        update(Audit.__table__)
+        .where(Audit.__table__.c.id == bindparam("audit_pk"))
+        .values(
+            risk_score=bindparam("risk_score"),
+            risk_factors=bindparam("risk_factors", type_=JSON),
+            risk_scored_on=bindparam("risk_scored_on"),
+            risk_rules_version=bindparam("risk_rules_version"),
+            updated_at=Audit.__table__.c.updated_at
+        )
+    )
+    refreshed = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(*inputs)
+            .filter(stale, Audit.id > last_id)
+            .order_by(Audit.id)
+            .limit(RISK_REFRESH_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        db.connection().execute(
+            statement,
+            [dict(risk.risk_columns(row._mapping, today), audit_pk=row.id) for row in rows]
+        )
+        db.commit()
+        refreshed += len(rows)
+        last_id = rows[-1].id
+    _risk_scores_current_on = today
+    if refreshed:
+        _notify_audit_write()
+    return refreshed
+
+def ensure_risk_scores_current(db: Session) -> None:
+    """Run refresh_risk_scores at most once per day per process"""
+    if _risk_scores_current_on != date.today():
+        refresh_risk_scores(db)
+
+def get_high_risk_audits(
+    db: Session,
+    limit: int = 10,
+    min_score: int = risk.HIGH_RISK_MIN_SCORE
+) -> Tuple[List[Any], int]:
+    """Top audits by stored risk score (list columns plus risk fields) and how many reach min_score"""
+    rows = (
+        _list_query(db, extra_columns=("risk_score", "risk_factors"))
+        .filter(Audit.risk_score >= min_score)
+        .order_by(Audit.risk_score.desc(), Audit.id.desc())
+        .limit(limit)
+        .all()
+    )
+    total = db.query(func.count(Audit.id)).filter(Audit.risk_score >= min_score).scalar()
+    return rows, total
+
+def get_open_audits(db: Session, created_since: Optional[date] = None) -> List[Any]:
+    """Every planned or in-progress audit (list columns plus start date), optionally only those
+    created on or after created_since, in id order"""
+    query = _list_query(db, extra_columns=("confirmed_start_date",)).filter(Audit.status.in_(risk.OPEN_STATUSES))
+    if created_since is not None:
+        query = query.filter(Audit.created_at >= datetime.combine(created_since, datetime.min.time()))
+    return query.order_by(Audit.id).all()
+
 def get_audits_count(db: Session) -> int:
     """Get total count of audits"""
     return db.query(Audit).count()
 
+def get_audit_status_counts(db: Session) -> Dict[Optional[str], int]:
+    """Get audit counts per status value, from the counter table when enabled or one GROUP BY otherwise"""
+    if STATUS_COUNTERS_ENABLED:
+        rows = db.query(AuditStatusCount.status, AuditStatusCount.count).all()
+    else:
+        rows = db.query(Audit.status, func.count(Audit.id)).group_by(Audit.status).all()
+    return {status.value if status else None: count for status, count in rows}
+
+def rebuild_status_counters(db: Session) -> None:
+    """Recompute audit_status_counts from the audits table"""
+    db.query(AuditStatusCount).delete(synchronize_session=False)
+    for status, count in db.query(Audit.status, func.count(Audit.id)).group_by(Audit.status).all():
+        if status is not None:
+            db.add(AuditStatusCount(status=status, count=count))
+    db.commit()
+
+def get_audits_fingerprint(db: Session) -> Tuple:
+    """Cheap fingerprint of the audit table, changes whenever rows are added, removed or edited"""
+    row = db.query(
+        func.count(Audit.id),
+        func.max(Audit.id),
+        func.max(Audit.created_at),
+        func.max(Audit.updated_at)
+    ).one()
+    return (audit_data_version,) + tuple(str(value) if value is not None else None for value in row)
+
+AI_JOB_UNFINISHED_STATUSES = ("queued", "running")
+
+def create_ai_job(db: Session, job: Dict[str, Any], owner: str, lease_until: datetime) -> None:
+    """Persist a newly queued AI job (a dict in AIJob.to_dict() form) leased to `owner`"""
+    db.add(AIJob(
+        id=job["job_id"], tool=job["tool"], query=job["query"], context=job["context"],
+        priority=job["priority"], status=job["status"], created_at=job["created_at"],
+        owner=owner, lease_expires_at=lease_until
+    ))
+    db.commit()
+
+def update_ai_job(db: Session, job_id: str, owned_by: Optional[str] = None, **fields) -> bool:
+    """Write status, result, error or timestamp changes of an AI job.
+
+    With `owned_by`, only while that process still holds the job; returns whether a row changed.
+    """
+    query = db.query(AIJob).filter(AIJob.id == job_id)
+    if owned_by is not None:
+        query = query.filter(AIJob.owner == owned_by)
+    updated = query.update(fields, synchronize_session=False)
+    db.commit()
+    return updated > 0
+
+def get_ai_job(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    job = db.query(AIJob).filter(AIJob.id == job_id).first()
+    return job.to_dict() if job else None
+
+def claim_ai_job(db: Session, job_id: str, owner: str, started_at: datetime) -> bool:
+    """Mark a job running if `owner` still holds it queued; False if it was cancelled or taken over"""
+    claimed = db.query(AIJob).filter(
+        AIJob.id == job_id, AIJob.owner == owner, AIJob.status == "queued"
+    ).update({AIJob.status: "running", AIJob.started_at: started_at}, synchronize_session=False)
+    db.commit()
+    return claimed > 0
+
+def cancel_queued_ai_job(db: Session, job_id: str, finished_at: datetime) -> bool:
+    """Cancel a job that is still queued, whichever process holds it"""
+    cancelled = db.query(AIJob).filter(AIJob.id == job_id, AIJob.status == "queued").update(
+        {AIJob.status: "cancelled", AIJob.finished_at: finished_at}, synchronize_session=False
+    )
+    db.commit()
+    return cancelled > 0
+
+def request_ai_job_cancel(db: Session, job_id: str, requested_at: datetime) -> bool:
+    """Ask whichever process holds an unfinished job to cancel it; False if it has already finished"""
+    requested = db.query(AIJob).filter(
+        AIJob.id == job_id, AIJob.status.in_(AI_JOB_UNFINISHED_STATUSES), AIJob.cancel_requested_at.is_(None)
+    ).update({AIJob.cancel_requested_at: requested_at}, synchronize_session=False)
+    db.commit()
+    return requested > 0
+
+def renew_ai_job_leases(db: Session, owner: str, job_ids: List[str], lease_until: datetime) -> List[str]:
+    """Extend the leases `owner` holds on these unfinished jobs; returns those it should cancel"""
+    if not job_ids:
+        return []
+    held = and_(AIJob.id.in_(job_ids), AIJob.owner == owner, AIJob.status.in_(AI_JOB_UNFINISHED_STATUSES))
+    db.query(AIJob).filter(held).update({AIJob.lease_expires_at: lease_until}, synchronize_session=False)
+    db.commit()
+    return [job_id for (job_id,) in db.query(AIJob.id).filter(held, AIJob.cancel_requested_at.isnot(None))]
+
+def release_ai_jobs(db: Session, owner: str) -> int:
+    """Give up the unfinished jobs `owner` holds so any process can adopt them straight away"""
+    released = db.query(AIJob).filter(
+        AIJob.owner == owner, AIJob.status.in_(AI_JOB_UNFINISHED_STATUSES)
+    ).update({AIJob.owner: None, AIJob.lease_expires_at: None}, synchronize_session=False)
+    db.commit()
+    return released
+
+def adopt_expired_ai_jobs(db: Session, owner: str, now: datetime, lease_until: datetime) -> List[Dict[str, Any]]:
+    """Take over unfinished jobs whose holder stopped renewing their lease, re-queued, oldest first.
+
+    Each job is claimed with its own conditional UPDATE, so two processes never adopt the same one.
+    """
+    expired = and_(
+        AIJob.status.in_(AI_JOB_UNFINISHED_STATUSES),
+        or_(AIJob.lease_expires_at.is_(None), AIJob.lease_expires_at < now),
+        or_(AIJob.owner.is_(None), AIJob.owner != owner),
+    )
+    candidates = [job_id for (job_id,) in db.query(AIJob.id).filter(expired).order_by(AIJob.created_at)]
+    adopted = []
+    for job_id in candidates:
+        claimed = db.query(AIJob).filter(AIJob.id == job_id, expired).update({
+            AIJob.status: "queued", AIJob.started_at: None, AIJob.owner: owner, AIJob.lease_expires_at: lease_until,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            adopted.append(job_id)
+    if not adopted:
+        return []
+    jobs = db.query(AIJob).filter(AIJob.id.in_(adopted)).order_by(AIJob.created_at).all()
+    return [job.to_dict() for job in jobs]
+
+def delete_finished_ai_jobs(db: Session, finished_before: datetime) -> int:
+    """Drop finished jobs older than the retention window; returns how many were removed"""
+    deleted = db.query(AIJob).filter(
+        AIJob.status.notin_(AI_JOB_UNFINISHED_STATUSES), AIJob.finished_at < finished_before
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
 def seed_sample_data(db: Session):
     """Seed database with sample data for testing"""
     sample_audits = [
@@ -165,6 +900,10 @@ def seed_sample_data(db: Session):
         if not existing:
             audit_id = generate_audit_id()
             db_audit = Audit(audit_id=audit_id, **audit_data)
+            _apply_risk(db_audit)
             db.add(db_audit)
+            _adjust_status_count(db, db_audit.status, 1)
     
-    db.commit()
\ No newline at end of file
+    _bump_collection_version(db)
+    db.commit()
+    _notify_audit_write()
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Async entry points for the crud module.
+
+Every function accepts either a Session or an AsyncSession. With an
+AsyncSession (QMS_ASYNC_DB=1) the matching crud function runs through
+AsyncSession.run_sync on the aiosqlite connection, so the query never blocks
+the event loop. With a plain Session it is called directly, as before.
+Functions that return audits hand back fully loaded objects, so serializing
+them afterwards does no lazy IO.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from models import Audit
+from schemas import AuditCreate, AuditUpdate
+
+
+async def _run(db, fn, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return fn(db, *args, **kwargs)
+
+
+async def create_audit(db, audit: AuditCreate) -> Audit:
+    return await _run(db, crud.create_audit, audit)
+
+
+async def get_audit(db, audit_id: str) -> Optional[Audit]:
+    return await _run(db, crud.get_audit, audit_id)
+
+
+async def get_audits_page(db, **kwargs) -> Tuple[List, Optional[str], Optional[str]]:
+    return await _run(db, crud.get_audits_page, **kwargs)
+
+
+async def search_audits(db, q: str, **kwargs) -> List[Tuple[Any, Optional[str]]]:
+    return await _run(db, crud.search_audits, q, **kwargs)
+
+
+async def update_audit(
+    db, audit_id: str, audit_update: AuditUpdate, expected_version: Optional[int] = None
+) -> Optional[Audit]:
+    return await _run(db, crud.update_audit, audit_id, audit_update, expected_version)
+
+
+async def delete_audit(db, audit_id: str) -> bool:
+    return await _run(db, crud.delete_audit, audit_id)
+
+
+async def get_audit_version(db, audit_id: str) -> Optional[Tuple[int, int]]:
+    return await _run(db, crud.get_audit_version, audit_id)
+
+
+async def get_audits_collection_version(db) -> int:
+    return await _run(db, crud.get_audits_collection_version)
+
+
+async def get_audits_count(db) -> int:
+    return await _run(db, crud.get_audits_count)
+
+
+async def get_audit_status_counts(db) -> Dict[Optional[str], int]:
+    return await _run(db, crud.get_audit_status_counts)
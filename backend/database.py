@@ -1,14 +1,109 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./qms.db"
+# Any SQLAlchemy URL works here; sqlite gets the tuned profile below
+SQLALCHEMY_DATABASE_URL = os.getenv("QMS_DATABASE_URL", "sqlite:///./qms.db")
+# Optional replica for read-only traffic; defaults to the primary database
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("QMS_READ_DATABASE_URL", SQLALCHEMY_DATABASE_URL)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Serve route handlers from an async session (aiosqlite / asyncpg must be installed)
+USE_ASYNC_DB = os.getenv("QMS_ASYNC_DB", "0") == "1"
+
+# Connection pool sizing per engine
+WRITE_POOL_SIZE = int(os.getenv("QMS_DB_WRITE_POOL_SIZE", "5"))
+READ_POOL_SIZE = int(os.getenv("QMS_DB_READ_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("QMS_DB_POOL_MAX_OVERFLOW", "10"))
+
+# SQLite connection profile: WAL lets readers run alongside the single writer
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("QMS_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("QMS_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("QMS_SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": int(os.getenv("QMS_SQLITE_CACHE_SIZE", "-64000")),
+    "mmap_size": int(os.getenv("QMS_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _install_sqlite_pragmas(engine, read_only: bool) -> None:
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _engine_options(url: str, read_only: bool) -> dict:
+    if _is_sqlite(url) and make_url(url).database in (None, "", ":memory:"):
+        # In-memory databases live in a single connection; keep SQLAlchemy's default pool
+        return {"connect_args": {"check_same_thread": False}}
+    options = {
+        "pool_size": READ_POOL_SIZE if read_only else WRITE_POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_pre_ping": not _is_sqlite(url),
+    }
+    if _is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def create_db_engine(url: str, read_only: bool = False):
+    """Create a pooled engine; sqlite connections get the WAL/pragmas profile"""
+    engine = create_engine(url, **_engine_options(url, read_only))
+    if _is_sqlite(url):
+        _install_sqlite_pragmas(engine, read_only)
+    return engine
+
+
+def create_async_db_engine(url: str, read_only: bool = False):
+    """Async counterpart of create_db_engine, deriving the async driver from the URL"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in _ASYNC_DRIVERS and parsed.get_driver_name() != _ASYNC_DRIVERS[backend]:
+        parsed = parsed.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}")
+    options = _engine_options(url, read_only)
+    if backend == "sqlite":
+        # aiosqlite keeps its NullPool: each connection owns a thread, and opening one is cheap
+        options.pop("pool_size", None)
+        options.pop("max_overflow", None)
+    engine = create_async_engine(parsed, **options)
+    if backend == "sqlite":
+        _install_sqlite_pragmas(engine.sync_engine, read_only)
+    return engine
+
+
+# `engine` is the read-write primary; read-only routes use read_engine
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+read_engine = create_db_engine(SQLALCHEMY_READ_DATABASE_URL, read_only=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+if USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL)
+    async_read_engine = create_async_db_engine(SQLALCHEMY_READ_DATABASE_URL, read_only=True)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False)
 
 Base = declarative_base()
 
@@ -17,4 +112,23 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+# Dependencies for CRUD routes: AsyncSession when QMS_ASYNC_DB=1, Session otherwise
+get_session = get_async_db if USE_ASYNC_DB else get_db
+get_read_session = get_async_read_db if USE_ASYNC_DB else get_read_db
@@ -0,0 +1,46 @@
+"""ETag helpers for conditional audit requests.
+
+An audit's ETag comes from its primary key and row_version, which every
+update increments. List ETags combine the audit collection version (bumped by
+every write) with the query parameters, so a list response can be validated
+without running the list query.
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+# Clients may cache audit responses but must revalidate them on every use
+CACHE_CONTROL = "no-cache"
+
+
+def audit_etag(pk: int, row_version: int) -> str:
+    return f'"a{pk}-{row_version}"'
+
+
+def collection_etag(version: int, params: Dict[str, Any]) -> str:
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f'"c{version}-{digest}"'
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def _parse(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header matches etag (weak comparison, RFC 9110 13.1.2)"""
+    if not header:
+        return False
+    tags = _parse(header)
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def if_match(header: Optional[str], etag: str) -> bool:
+    """True if an If-Match header matches etag (strong comparison, RFC 9110 13.1.1)"""
+    if not header:
+        return True
+    tags = _parse(header)
+    return "*" in tags or etag in tags
@@ -0,0 +1,279 @@
+"""LLM providers behind QMSAIService.model.
+
+A provider exposes the slice of the google.generativeai model interface the AI
+tools use: generate_content(prompt) returns an object with the generated
+`.text`, and generate_content(prompt, stream=True) an iterable of such chunks.
+Responses also carry Gemini-style `usage_metadata` token counts.
+
+QMS_LLM_PROVIDER picks the provider: "gemini" (the default) calls the Gemini
+API; "stub" answers locally with deterministic, schema-valid JSON for each AI
+tool after a simulated delay, so the AI endpoints can be load-tested offline.
+"""
+import abc
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+PROVIDER = os.getenv("QMS_LLM_PROVIDER", "gemini")
+GEMINI_MODEL = os.getenv("QMS_GEMINI_MODEL", "gemini-2.5-flash")
+
+# Stub behaviour: latency spec (see parse_latency), share of calls that fail,
+# output size in tokens (0 keeps each answer's natural size) and RNG seed
+STUB_LATENCY = os.getenv("QMS_LLM_STUB_LATENCY", "lognormal:0.8,0.35")
+STUB_ERROR_RATE = float(os.getenv("QMS_LLM_STUB_ERROR_RATE", "0"))
+STUB_OUTPUT_TOKENS = int(os.getenv("QMS_LLM_STUB_OUTPUT_TOKENS", "0"))
+STUB_SEED = os.getenv("QMS_LLM_STUB_SEED", "0")
+
+# Rough size of a token in characters, for prompt token counts and stream chunking
+CHARS_PER_TOKEN = 4
+STREAM_TOKENS_PER_CHUNK = 8
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+class UsageMetadata:
+    """Token counts in the shape of google.generativeai's usage_metadata"""
+
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class GeneratedText:
+    """A whole response, or one chunk of a streamed one"""
+
+    def __init__(self, text: str, usage_metadata: Optional[UsageMetadata] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class LLMProvider(abc.ABC):
+    name = "base"
+
+    @abc.abstractmethod
+    def generate_content(self, prompt: str, stream: bool = False):
+        """A response with `.text`, or an iterable of such chunks when streaming"""
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through google.generativeai; the key comes from GOOGLE_API_KEY"""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._model.generate_content(prompt, stream=True)
+        return self._model.generate_content(prompt)
+
+
+class StubProviderError(RuntimeError):
+    """A failure injected by StubProvider's error rate"""
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Seconds-per-call sampler for "fixed:S", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA" """
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(value) for value in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"Invalid LLM stub latency: {spec}")
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2 and values[0] > 0:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Invalid LLM stub latency: {spec}")
+
+
+_AUDIT_ID = re.compile(r"AUD-\d{4}-[A-Z0-9]+")
+_TOTAL_OPEN = re.compile(r'"total_open":\s*(\d+)')
+_FILLER = "Further review of supporting records is recommended before closure.".split()
+
+
+def _stub_high_risk(prompt: str, digest: str) -> Dict:
+    audit_ids = list(dict.fromkeys(_AUDIT_ID.findall(prompt)))
+    return {
+        "summary": f"{len(audit_ids)} high-risk audit(s) need attention; regulatory and overdue work first.",
+        "recommendations": {audit_id: ["Immediate review required", "Confirm CAPA owners"] for audit_id in audit_ids},
+    }
+
+
+def _stub_summary(prompt: str, digest: str) -> Dict:
+    match = _TOTAL_OPEN.search(prompt)
+    return {
+        "executive_summary": "Open audits are progressing; a few are close to their planned end dates.",
+        "breakdown": {"by_type": {"Internal": 2, "Supplier/Vendor": 1}, "by_status": {"Planned": 2, "In Progress": 1}},
+        "upcoming_deadlines": [f"Audit {audit_id} due soon" for audit_id in _AUDIT_ID.findall(prompt)[:3]],
+        "resource_insights": "Lead auditor workload is balanced across the team.",
+        "key_concerns": ["Overdue report approvals", "Supplier response times"],
+        "total_open": int(match.group(1)) if match else 0,
+    }
+
+
+def _stub_summary_notes(prompt: str, digest: str) -> Dict:
+    return {
+        "upcoming_deadlines": [f"Audit {audit_id} due soon" for audit_id in _AUDIT_ID.findall(prompt)[:3]],
+        "resource_insights": "Workload in this part is spread across several lead auditors.",
+        "key_concerns": ["Audits nearing their end date without a report"],
+    }
+
+
+def _stub_next_steps(prompt: str, digest: str) -> Dict:
+    return {
+        "immediate_actions": ["Confirm the audit agenda with the auditee", "Assign finding owners"],
+        "medium_term_actions": ["Track CAPA implementation", "Schedule the closing meeting"],
+        "long_term_considerations": ["Add the auditee to the annual audit programme"],
+        "risk_mitigation": ["Escalate open critical findings to QA management"],
+        "resource_requirements": ["One additional subject matter expert"],
+        "key_stakeholders": ["Lead auditor", "Site quality head"],
+        "timeline_recommendations": "Close findings within 30 days of the final report.",
+    }
+
+
+def _stub_trends(prompt: str, digest: str) -> Dict:
+    return {
+        "frequency_trends": "Audit volume is steady month to month with a rise in supplier audits.",
+        "seasonal_patterns": "Fieldwork clusters in the second and fourth quarters.",
+        "risk_areas": ["Supplier qualification", "Overdue open audits"],
+        "recommendations": ["Level-load the audit schedule", "Review supplier audit frequency"],
+    }
+
+
+def _stub_notification(prompt: str, digest: str) -> Dict:
+    kinds = {
+        "commencement": ("Audit Commencement Notice", "primary.contact@company.com"),
+        "completion": ("Audit Completion Notice", "primary.contact@company.com"),
+        "follow_up": ("Action Items Follow-up", "primary.contact@company.com"),
+        "closure": ("Audit Closure Notification", "primary.contact@company.com"),
+        "escalation": ("Audit Escalation Required", "manager@company.com"),
+    }
+    return {
+        "notifications": {
+            kind: {"subject": subject, "body": f"{subject}. Please see the audit record for details.",
+                   "recipients": [recipient]}
+            for kind, (subject, recipient) in kinds.items()
+        },
+        "recommended_type": "completion",
+    }
+
+
+def _stub_generic(prompt: str, digest: str) -> Dict:
+    return {"summary": f"Stub response {digest[:8]}"}
+
+
+# (marker in the tool's prompt template, answer builder, path of the text padded to reach the output size)
+_STUB_ANSWERS = (
+    ('"recommendations": {"<audit_id>"', _stub_high_risk, ("summary",)),
+    ('"executive_summary"', _stub_summary, ("executive_summary",)),
+    ('"key_concerns"', _stub_summary_notes, ("resource_insights",)),
+    ('"immediate_actions"', _stub_next_steps, ("timeline_recommendations",)),
+    ('"frequency_trends"', _stub_trends, ("frequency_trends",)),
+    ('"notifications"', _stub_notification, ("notifications", "completion", "body")),
+)
+
+
+class StubProvider(LLMProvider):
+    """Deterministic local provider: the answer depends only on the prompt, and latency and
+    failures are drawn from a RNG seeded by (seed, prompt, how often that prompt was seen)"""
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency: str = STUB_LATENCY,
+        error_rate: float = STUB_ERROR_RATE,
+        output_tokens: int = STUB_OUTPUT_TOKENS,
+        seed: str = STUB_SEED,
+    ):
+        self.latency = latency
+        self._sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.output_tokens = output_tokens
+        self.seed = seed
+        self.calls = 0
+        self.failures = 0
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def answer(self, prompt: str) -> str:
+        """The JSON text this provider returns for prompt"""
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        build, padded = _stub_generic, ("summary",)
+        for marker, builder, path in _STUB_ANSWERS:
+            if marker in prompt:
+                build, padded = builder, path
+                break
+        answer = build(prompt, digest)
+        text = json.dumps(answer)
+        missing = (self.output_tokens - estimate_tokens(text)) * CHARS_PER_TOKEN
+        if missing > 0:
+            parent = answer
+            for key in padded[:-1]:
+                parent = parent[key]
+            filler = " ".join(itertools.islice(itertools.cycle(_FILLER), missing))[:missing - 1]
+            parent[padded[-1]] = f"{parent[padded[-1]]} {filler}"
+            text = json.dumps(answer)
+        return text
+
+    def _draw(self, prompt: str):
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        with self._lock:
+            self.calls += 1
+            occurrence = self._seen.get(digest, 0)
+            self._seen[digest] = occurrence + 1
+        rng = random.Random(f"{self.seed}:{digest}:{occurrence}")
+        delay = max(0.0, self._sample_latency(rng))
+        fails = rng.random() < self.error_rate
+        if fails:
+            with self._lock:
+                self.failures += 1
+        return delay, fails
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        delay, fails = self._draw(prompt)
+        text = self.answer(prompt)
+        usage = UsageMetadata(estimate_tokens(prompt), estimate_tokens(text))
+        if stream:
+            return self._stream(text, delay, fails, usage)
+        time.sleep(delay)
+        if fails:
+            raise StubProviderError("Simulated LLM provider error")
+        return GeneratedText(text, usage)
+
+    def _stream(self, text: str, delay: float, fails: bool, usage: UsageMetadata) -> Iterator[GeneratedText]:
+        step = CHARS_PER_TOKEN * STREAM_TOKENS_PER_CHUNK
+        chunks = [text[start:start + step] for start in range(0, len(text), step)]
+        for index, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            if fails and index >= len(chunks) // 2:
+                raise StubProviderError("Simulated LLM provider error")
+            yield GeneratedText(chunk, usage if index == len(chunks) - 1 else None)
+
+
+PROVIDERS = {"gemini": GeminiProvider, "stub": StubProvider}
+
+
+def create_provider(name: Optional[str] = None) -> LLMProvider:
+    """Instantiate the provider named by QMS_LLM_PROVIDER (or name)"""
+    name = name or PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}")
+    return PROVIDERS[name]()
@@ -1,20 +1,35 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Response, UploadFile, File
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import csv
 import crud
 import models
 import schemas
-from database import SessionLocal, engine, get_db
+import migrate
+import ai_jobs
+import audit_io
+import crud_async
+import etags
+import metrics
+import profiling
+import serialization
+import slow_queries
+import sse
+import database
+from database import SessionLocal, ReadSessionLocal, engine, get_db, get_session, get_read_session
 from pydantic import ValidationError
-from ai_service import QMSAIService
+from ai_service import QMSAIService, AI_BATCH_MAX_ITEMS, AI_STREAM_HEARTBEAT_SECONDS
 from pydantic import BaseModel
-from models import AIResponse, AIQueryRequest
+from models import AIResponse, AIQueryRequest, AIBatchRequest, AIBatchResponse, AIJobRequest, AIJobResponse
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Create database tables and bring existing databases up to date
+migrate.upgrade(engine)
 
 ai_service = QMSAIService()
+ai_job_queue = ai_jobs.AIJobQueue(ai_service, SessionLocal)
 
 app = FastAPI(
     title="QMS Audit Management API",
@@ -29,8 +44,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "ETag", "X-Profile-Id"],
 )
 
+# Request latency per route, plus SQL statement counts and timings, for GET /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(database.engine, "primary")
+metrics.instrument_engine(database.read_engine, "read")
+if database.async_engine is not None:
+    metrics.instrument_engine(database.async_engine.sync_engine, "primary")
+    metrics.instrument_engine(database.async_read_engine.sync_engine, "read")
+
+# Statements over QMS_SLOW_QUERY_MS, with their query plans, for GET /admin/slow-queries
+slow_queries.instrument_engine(database.engine, "primary")
+slow_queries.instrument_engine(database.read_engine, "read")
+if database.async_engine is not None:
+    slow_queries.instrument_engine(database.async_engine.sync_engine, "primary")
+    slow_queries.instrument_engine(database.async_read_engine.sync_engine, "read")
+
+# Opt-in per-request profiles (X-Profile: 1 or ?profile=1), listed under /admin/profiles
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilerMiddleware)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database with sample data"""
@@ -41,8 +76,17 @@ async def startup_event():
         if count == 0:
             crud.seed_sample_data(db)
             print("Database seeded with sample data")
+        if crud.STATUS_COUNTERS_ENABLED:
+            crud.rebuild_status_counters(db)
+        # Score audits written before risk scoring existed and roll overdue scores forward
+        crud.refresh_risk_scores(db)
     finally:
         db.close()
+    await ai_job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ai_job_queue.stop()
 
 @app.get("/")
 async def root():
@@ -52,107 +96,277 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/admin/slow-queries", include_in_schema=False)
+async def list_slow_queries(
+    limit: int = Query(100, ge=1, le=1000),
+    full_scan: Optional[bool] = Query(None, description="Only statements that did (or did not) scan all of audits"),
+):
+    """Most recent statements over the slow-query threshold, newest first"""
+    if not slow_queries.SLOW_QUERY_ENABLED:
+        raise HTTPException(status_code=404, detail="Slow-query log is disabled")
+    return slow_queries.recent(limit, full_scan)
+
+def _require_profiling():
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+@app.get("/admin/profiles", include_in_schema=False, dependencies=[Depends(_require_profiling)])
+async def list_profiles():
+    """Most recent request profiles, newest first"""
+    return await run_in_threadpool(profiling.list_profiles)
+
+@app.get("/admin/profiles/{profile_id}", include_in_schema=False, dependencies=[Depends(_require_profiling)])
+async def get_profile(profile_id: str):
+    """A profile's metadata and top functions by self and total time"""
+    summary = await run_in_threadpool(profiling.load_summary, profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+@app.get("/admin/profiles/{profile_id}/speedscope", include_in_schema=False, dependencies=[Depends(_require_profiling)])
+async def get_profile_speedscope(profile_id: str):
+    """A profile in speedscope's file format, for https://www.speedscope.app"""
+    path = profiling.speedscope_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=f"{profile_id}.speedscope.json")
+
 @app.post("/audits/", response_model=schemas.AuditResponse)
-async def create_audit(audit: schemas.AuditCreate, db: Session = Depends(get_db)):
+async def create_audit(audit: schemas.AuditCreate, db: Session = Depends(get_session)):
     """Create a new audit"""
     try:
-        db_audit = crud.create_audit(db=db, audit=audit)
-        return db_audit.to_dict()
+        db_audit = await crud_async.create_audit(db, audit=audit)
+        return serialization.json_response(serialization.audit_json(db_audit))
     except ValidationError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/audits/bulk")
+async def bulk_create_audits(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON with one audit object per line"),
+    format: Optional[str] = Query(None, description="csv or ndjson; detected from the filename when omitted"),
+    batch_size: int = Query(crud.BULK_BATCH_SIZE, ge=1, le=50000, description="Rows per insert transaction")
+):
+    """Bulk-create audits from a streamed CSV or NDJSON upload"""
+    file_format = format or audit_io.detect_format(file.filename, file.content_type)
+    if file_format not in audit_io.IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format: {file_format}")
+
+    def run_import():
+        # Parsing and inserting are blocking; run them on a worker thread with their own session
+        db = SessionLocal()
+        try:
+            return crud.bulk_create_audits(db, audit_io.iter_rows(file.file, file_format), batch_size)
+        finally:
+            db.close()
+
+    try:
+        report = await run_in_threadpool(run_import)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Upload must be UTF-8 encoded")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"Malformed CSV: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        await file.close()
+    
+    return {"format": file_format, **report}
+
+@app.get("/audits/export")
+async def export_audits(
+    format: str = Query("csv", description="csv, ndjson or columnar (NDJSON row groups of per-column arrays)"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns to include; all columns when omitted"),
+    audit_id: Optional[str] = Query(None, description="Filter by audit ID"),
+    audit_type: Optional[str] = Query(None, description="Filter by audit type"),
+    status: Optional[str] = Query(None, description="Filter by status"),
+    lead_auditor: Optional[str] = Query(None, description="Filter by lead auditor"),
+    site: Optional[str] = Query(None, description="Filter by site/country"),
+    match: str = Query("contains", description="Match mode for audit_id, lead_auditor and site: contains, prefix or exact"),
+    audit_id_match: Optional[str] = Query(None, description="Match mode for audit_id alone; defaults to match")
+):
+    """Stream the audit register without materializing it"""
+    if format not in audit_io.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    for mode in (match, audit_id_match or match):
+        if mode not in crud.FILTER_MATCH_MODES:
+            raise HTTPException(status_code=400, detail=f"Unsupported match mode: {mode}")
+    selected = [name.strip() for name in columns.split(",") if name.strip()] if columns else list(crud.EXPORT_COLUMNS)
+    unknown = [name for name in selected if name not in crud.EXPORT_COLUMNS]
+    if not selected or unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown export columns: {', '.join(unknown)}")
+
+    def generate():
+        # The stream outlives the request scope, so it owns its session
+        db = ReadSessionLocal()
+        try:
+            rows = crud.iter_audits_for_export(
+                db,
+                selected,
+                audit_id=audit_id,
+                audit_type=audit_type,
+                status=status,
+                lead_auditor=lead_auditor,
+                site=site,
+                match=match,
+                audit_id_match=audit_id_match
+            )
+            yield from audit_io.iter_export_chunks(format, selected, rows)
+        finally:
+            db.close()
+
+    extension = "csv" if format == "csv" else "ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=audit_io.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="audits.{extension}"'}
+    )
+
 @app.get("/audits/", response_model=List[schemas.AuditListResponse])
 async def read_audits(
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor / X-Prev-Cursor"),
+    sort: str = Query("created_at", description="Sort by confirmed_end_date, created_at, status or audit_id"),
+    order: str = Query("asc", description="Sort order: asc or desc"),
+    q: Optional[str] = Query(None, description="Full-text search over title, scope, objective, criteria and agenda"),
+    match: str = Query("contains", description="Match mode for audit_id, lead_auditor and site: contains, prefix or exact"),
+    audit_id_match: Optional[str] = Query(None, description="Match mode for audit_id alone; defaults to match"),
     audit_id: Optional[str] = Query(None, description="Filter by audit ID"),
     audit_type: Optional[str] = Query(None, description="Filter by audit type"),
     status: Optional[str] = Query(None, description="Filter by status"),
     lead_auditor: Optional[str] = Query(None, description="Filter by lead auditor"),
     site: Optional[str] = Query(None, description="Filter by site/country"),
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_session)
 ):
-    """Retrieve audits with optional filtering"""
+    """Retrieve audits with optional filtering, sorting and cursor pagination"""
     try:
-        audits = crud.get_audits(
-            db=db,
-            skip=skip,
-            limit=limit,
+        filters = dict(
             audit_id=audit_id,
             audit_type=audit_type,
             status=status,
             lead_auditor=lead_auditor,
-            site=site
+            site=site,
+            match=match,
+            audit_id_match=audit_id_match
         )
+        # Read the version before the rows: a write in between only makes the ETag older, never newer
+        version = await crud_async.get_audits_collection_version(db)
+        etag = etags.collection_etag(
+            version,
+            dict(filters, skip=skip, limit=limit, cursor=cursor, sort=sort, order=order, q=q)
+        )
+        if etags.if_none_match(if_none_match, etag):
+            return Response(status_code=304, headers=etags.cache_headers(etag))
+        if q and q.strip():
+            # Search results are ranked by relevance and paged with skip/limit
+            matches = await crud_async.search_audits(db, q, skip=skip, limit=limit, **filters)
+            next_cursor = prev_cursor = None
+        else:
+            audits, next_cursor, prev_cursor = await crud_async.get_audits_page(
+                db,
+                limit=limit,
+                sort=sort,
+                order=order,
+                cursor=cursor,
+                skip=skip,
+                **filters
+            )
+            matches = [(row, None) for row in audits]
         
-        # Convert to list response format
-        result = []
-        for audit in audits:
-            result.append({
-                "id": audit.id,
-                "audit_id": audit.audit_id,
-                "audit_title": audit.audit_title,
-                "audit_type": audit.audit_type.value if audit.audit_type else "",
-                "status": audit.status.value if audit.status else "",
-                "auditee_name": audit.auditee_name,
-                "lead_auditor": audit.lead_auditor,
-                "confirmed_end_date": audit.confirmed_end_date.isoformat() if audit.confirmed_end_date else "",
-                "auditee_country": audit.auditee_country
-            })
-        
-        return result
+        headers = etags.cache_headers(etag)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        if prev_cursor:
+            headers["X-Prev-Cursor"] = prev_cursor
+        return serialization.json_response(serialization.audit_list_json(matches), headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.get("/audits/{audit_id}", response_model=schemas.AuditResponse)
-async def read_audit(audit_id: str, db: Session = Depends(get_db)):
+async def read_audit(
+    audit_id: str,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_session)
+):
     """Get a specific audit by audit_id"""
-    db_audit = crud.get_audit(db, audit_id=audit_id)
+    if if_none_match:
+        # Validate against the row version alone before loading the full audit
+        version = await crud_async.get_audit_version(db, audit_id)
+        etag = etags.audit_etag(*version) if version else None
+        if etag and etags.if_none_match(if_none_match, etag):
+            return Response(status_code=304, headers=etags.cache_headers(etag))
+    db_audit = await crud_async.get_audit(db, audit_id=audit_id)
     if db_audit is None:
         raise HTTPException(status_code=404, detail="Audit not found")
-    return db_audit.to_dict()
+    etag = etags.audit_etag(db_audit.id, db_audit.row_version)
+    return serialization.json_response(serialization.audit_json(db_audit), etags.cache_headers(etag))
 
 @app.put("/audits/{audit_id}", response_model=schemas.AuditResponse)
 async def update_audit(
     audit_id: str, 
     audit_update: schemas.AuditUpdate, 
-    db: Session = Depends(get_db)
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_session)
 ):
-    """Update an existing audit"""
+    """Update an existing audit; with If-Match, only if it is unchanged since that ETag"""
     try:
-        db_audit = crud.update_audit(db=db, audit_id=audit_id, audit_update=audit_update)
+        expected_version = None
+        if if_match:
+            version = await crud_async.get_audit_version(db, audit_id)
+            if version is None:
+                # A failed If-Match is 412 even when the audit is gone (RFC 9110 13.1.1)
+                raise HTTPException(status_code=412, detail="Audit not found")
+            if not etags.if_match(if_match, etags.audit_etag(*version)):
+                raise HTTPException(status_code=412, detail="Audit has been modified since it was fetched")
+            expected_version = version[1]
+        db_audit = await crud_async.update_audit(
+            db, audit_id=audit_id, audit_update=audit_update, expected_version=expected_version
+        )
         if db_audit is None:
+            if if_match:
+                # Deleted after the precondition was checked
+                raise HTTPException(status_code=412, detail="Audit not found")
             raise HTTPException(status_code=404, detail="Audit not found")
-        return db_audit.to_dict()
+        etag = etags.audit_etag(db_audit.id, db_audit.row_version)
+        return serialization.json_response(serialization.audit_json(db_audit), etags.cache_headers(etag))
+    except HTTPException:
+        raise
+    except crud.AuditVersionConflict:
+        raise HTTPException(status_code=412, detail="Audit has been modified since it was fetched")
     except ValidationError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.delete("/audits/{audit_id}")
-async def delete_audit(audit_id: str, db: Session = Depends(get_db)):
+async def delete_audit(audit_id: str, db: Session = Depends(get_session)):
     """Delete an audit"""
-    success = crud.delete_audit(db=db, audit_id=audit_id)
+    success = await crud_async.delete_audit(db, audit_id=audit_id)
     if not success:
         raise HTTPException(status_code=404, detail="Audit not found")
     return {"message": "Audit deleted successfully"}
 
 @app.get("/audits-summary")
-async def get_audits_summary(db: Session = Depends(get_db)):
+async def get_audits_summary(db: Session = Depends(get_read_session)):
     """Get summary statistics for audits"""
     try:
-        total_audits = crud.get_audits_count(db)
-        planned_audits = len(crud.get_audits(db, status="Planned"))
-        in_progress_audits = len(crud.get_audits(db, status="In Progress"))
-        closed_audits = len(crud.get_audits(db, status="Closed"))
+        status_counts = await crud_async.get_audit_status_counts(db)
         
         return {
-            "total": total_audits,
-            "planned": planned_audits,
-            "in_progress": in_progress_audits,
-            "closed": closed_audits
+            "total": sum(status_counts.values()),
+            "planned": status_counts.get(models.AuditStatus.PLANNED.value, 0),
+            "in_progress": status_counts.get(models.AuditStatus.IN_PROGRESS.value, 0),
+            "closed": status_counts.get(models.AuditStatus.CLOSED.value, 0)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -167,6 +381,25 @@ async def get_ai_tools():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get AI tools: {str(e)}")
 
+def _ai_query_response(request: AIQueryRequest, result: dict) -> AIResponse:
+    # Check if result contains error
+    if "error" in result and result["error"]:
+        return AIResponse(
+            success=False,
+            tool=request.tool,
+            query=request.query,
+            result=result,  # Include the full result with error details
+            error=result["error"]
+        )
+
+    return AIResponse(
+        success=result.get("success", True),  # Use the success from result
+        tool=request.tool,
+        query=request.query,
+        result=result,
+        error=None
+    )
+
 @app.post("/ai/query", response_model=AIResponse)
 async def execute_ai_query(request: AIQueryRequest, db: Session = Depends(get_db)):
     """Execute AI query using specified tool"""
@@ -177,24 +410,7 @@ async def execute_ai_query(request: AIQueryRequest, db: Session = Depends(get_db
             db=db,
             context=request.context
         )
-        
-        # Check if result contains error
-        if "error" in result and result["error"]:
-            return AIResponse(
-                success=False,
-                tool=request.tool,
-                query=request.query,
-                result=result,  # Include the full result with error details
-                error=result["error"]
-            )
-        
-        return AIResponse(
-            success=result.get("success", True),  # Use the success from result
-            tool=request.tool,
-            query=request.query,
-            result=result,
-            error=None
-        )
+        return _ai_query_response(request, result)
         
     except Exception as e:
         return AIResponse(
@@ -205,6 +421,76 @@ async def execute_ai_query(request: AIQueryRequest, db: Session = Depends(get_db
             error=f"AI query execution failed: {str(e)}"
         )
 
+def _batch_items(request: AIBatchRequest) -> list:
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="At least one request is required")
+    if len(request.requests) > AI_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch may hold at most {AI_BATCH_MAX_ITEMS} requests")
+    return [(item.tool, item.query, item.context) for item in request.requests]
+
+@app.post("/ai/batch", response_model=AIBatchResponse)
+async def execute_ai_batch(
+    request: AIBatchRequest,
+    accept: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Run several AI queries concurrently over one audit snapshot.
+
+    With Accept: text/event-stream each result is sent as an SSE event as soon as it completes.
+    """
+    items = _batch_items(request)
+    if accept and "text/event-stream" in accept:
+        return _stream_ai_batch(request, items)
+
+    results: List[Optional[AIResponse]] = [None] * len(items)
+    async for index, result in ai_service.iter_ai_batch(items, db):
+        results[index] = _ai_query_response(request.requests[index], result)
+    return AIBatchResponse(success=all(result.success for result in results), results=results)
+
+def _stream_ai_batch(request: AIBatchRequest, items: list) -> StreamingResponse:
+    async def generate():
+        yield sse.format_event("start", {"count": len(items)})
+        # The stream outlives the request scope, so it owns its session
+        db = SessionLocal()
+        success = True
+        try:
+            async for index, result in ai_service.iter_ai_batch(items, db):
+                response = _ai_query_response(request.requests[index], result)
+                success = success and response.success
+                yield sse.format_event("result", {"index": index, **response.model_dump(mode="json")})
+            yield sse.format_event("done", {"success": success})
+        except Exception as e:
+            yield sse.format_event("error", {"error": f"AI batch failed: {str(e)}"})
+        finally:
+            # Also reached when the client disconnects: closing iter_ai_batch cancels pending tools
+            db.close()
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=sse.HEADERS)
+
+# Simple query routing based on keywords
+CHAT_TOOL_ROUTING = {
+    "high-risk": "show_high_risk_events",
+    "high risk": "show_high_risk_events", 
+    "risk": "show_high_risk_events",
+    "summary": "summarize_open_events",
+    "summarize": "summarize_open_events",
+    "next steps": "suggest_next_steps",
+    "suggest": "suggest_next_steps",
+    "recommend": "suggest_next_steps",
+    "trends": "identify_trends",
+    "pattern": "identify_trends",
+    "notification": "generate_notification",
+    "notify": "generate_notification",
+    "draft": "generate_notification"
+}
+
+def _route_chat_tool(query: str) -> str:
+    """Determine tool based on query content"""
+    for keyword, tool in CHAT_TOOL_ROUTING.items():
+        if keyword.lower() in query.lower():
+            return tool
+    return "summarize_open_events"  # default
+
 @app.post("/ai/chat")
 async def ai_chat(request: dict, db: Session = Depends(get_db)):
     """General AI chat interface"""
@@ -213,30 +499,7 @@ async def ai_chat(request: dict, db: Session = Depends(get_db)):
         if not query:
             raise HTTPException(status_code=400, detail="Message is required")
         
-        # Simple query routing based on keywords
-        tool_routing = {
-            "high-risk": "show_high_risk_events",
-            "high risk": "show_high_risk_events", 
-            "risk": "show_high_risk_events",
-            "summary": "summarize_open_events",
-            "summarize": "summarize_open_events",
-            "next steps": "suggest_next_steps",
-            "suggest": "suggest_next_steps",
-            "recommend": "suggest_next_steps",
-            "trends": "identify_trends",
-            "pattern": "identify_trends",
-            "notification": "generate_notification",
-            "notify": "generate_notification",
-            "draft": "generate_notification"
-        }
-        
-        # Determine tool based on query content
-        selected_tool = "summarize_open_events"  # default
-        for keyword, tool in tool_routing.items():
-            if keyword.lower() in query.lower():
-                selected_tool = tool
-                break
-        
+        selected_tool = _route_chat_tool(query)
         result = await ai_service.execute_ai_tool(
             tool_name=selected_tool,
             query=query,
@@ -257,6 +520,135 @@ async def ai_chat(request: dict, db: Session = Depends(get_db)):
             "error": f"Chat processing failed: {str(e)}"
         }
 
+def _stream_ai_events(tool: str, query: str, context: Optional[dict], final):
+    """SSE stream of an AI tool run; final(result) builds the payload of the closing result event"""
+
+    async def generate():
+        yield sse.format_event("start", {"tool": tool, "query": query})
+        # The stream outlives the request scope, so it owns its session
+        db = SessionLocal()
+        fields = sse.PartialJSONFields()
+        try:
+            async for kind, payload in ai_service.stream_ai_tool(tool, query, db, context):
+                if kind == "token":
+                    yield sse.format_event("token", {"text": payload})
+                    for key, value in fields.feed(payload):
+                        yield sse.format_event("field", {"key": key, "value": value})
+                elif kind == "heartbeat":
+                    yield sse.comment("keep-alive")
+                else:
+                    yield sse.format_event("result", final(payload))
+            yield sse.format_event("done", {})
+        except Exception as e:
+            yield sse.format_event("error", {"error": f"AI streaming failed: {str(e)}"})
+        finally:
+            # Also reached when the client disconnects: closing stream_ai_tool cancels the tool
+            db.close()
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=sse.HEADERS)
+
+@app.post("/ai/query/stream")
+async def stream_ai_query(request: AIQueryRequest):
+    """Execute AI query as Server-Sent Events: start, token/field while the model writes, then result"""
+    return _stream_ai_events(
+        request.tool,
+        request.query,
+        request.context,
+        lambda result: _ai_query_response(request, result).model_dump(mode="json")
+    )
+
+@app.post("/ai/chat/stream")
+async def stream_ai_chat(request: dict):
+    """Streaming variant of /ai/chat; the result event carries the /ai/chat response"""
+    query = request.get("message", "")
+    if not query:
+        raise HTTPException(status_code=400, detail="Message is required")
+    selected_tool = _route_chat_tool(query)
+    return _stream_ai_events(
+        selected_tool,
+        query,
+        request.get("context"),
+        lambda result: {"success": True, "message": query, "tool_used": selected_tool, "response": result}
+    )
+
+def _ai_job_response(job: dict, deduplicated: bool = False) -> AIJobResponse:
+    response = None
+    if job["result"] is not None:
+        request = AIQueryRequest(tool=job["tool"], query=job["query"], context=job["context"])
+        response = _ai_query_response(request, job["result"])
+    return AIJobResponse(
+        job_id=job["job_id"],
+        status=job["status"],
+        tool=job["tool"],
+        query=job["query"],
+        priority=job["priority"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        deduplicated=deduplicated,
+        cancel_requested_at=job["cancel_requested_at"],
+        response=response,
+        error=job["error"]
+    )
+
+@app.post("/ai/jobs", response_model=AIJobResponse, status_code=202)
+async def submit_ai_job(request: AIJobRequest):
+    """Queue an AI query and return its job straight away; poll GET /ai/jobs/{job_id} or subscribe to its events"""
+    try:
+        job, deduplicated = await ai_job_queue.submit(request.tool, request.query, request.context, request.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ai_jobs.JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return _ai_job_response(job, deduplicated)
+
+@app.get("/ai/jobs/{job_id}", response_model=AIJobResponse)
+async def get_ai_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the job to finish before answering")
+):
+    """Get an AI job and, once it has finished, its response"""
+    job = await (ai_job_queue.wait(job_id, wait) if wait else ai_job_queue.get(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _ai_job_response(job)
+
+@app.get("/ai/jobs/{job_id}/events")
+async def stream_ai_job(job_id: str):
+    """Server-Sent Events for an AI job: a status event now and on every change, then result and done"""
+    if await ai_job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def generate():
+        async for job in ai_job_queue.watch(job_id, heartbeat=AI_STREAM_HEARTBEAT_SECONDS):
+            if job is None:
+                yield sse.comment("keep-alive")
+                continue
+            payload = _ai_job_response(job).model_dump(mode="json")
+            if job["status"] in ai_jobs.FINISHED_STATUSES:
+                yield sse.format_event("result", payload)
+                yield sse.format_event("done", {})
+            else:
+                yield sse.format_event("status", payload)
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=sse.HEADERS)
+
+@app.delete("/ai/jobs/{job_id}", response_model=AIJobResponse)
+async def cancel_ai_job(job_id: str, response: Response):
+    """Cancel a queued or running AI job.
+
+    Answers 202 while the cancellation is pending, e.g. for a job another process is running,
+    which cancels it when it next renews its lease; follow the job to see it finish as cancelled.
+    """
+    job = await ai_job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in ("completed", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    if job["status"] != "cancelled":
+        response.status_code = 202
+    return _ai_job_response(job)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""Prometheus metrics for the QMS API, served by GET /metrics.
+
+Three sources feed the registry: MetricsMiddleware times every HTTP request
+by route template, SQLAlchemy cursor events on the database engines count
+and time SQL statements, and QMSAIService records AI tool runs and each LLM
+call. Counters and histograms are plain dicts of label tuples, and each
+request or statement costs a single histogram update (its _count doubles as
+the request / statement counter), taken without a lock for HTTP requests,
+which are only recorded on the event loop thread. The text exposition format
+is only built when /metrics is scraped. QMS_METRICS=0 turns all recording
+off; `python -m bench metrics-overhead` measures the cost.
+"""
+import abc
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("QMS_METRICS", "1") == "1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Exposition lines for every label combination recorded so far"""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Drop every recorded value"""
+
+
+class Counter(_Metric):
+    """Monotonic count per label combination; labels are passed positionally"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            yield f"{self.name}{self._label_text(labels)} {_format_value(value)}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label combination; cumulative buckets are built at scrape time"""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS,
+        threadsafe: bool = True,
+    ):
+        """threadsafe=False skips the lock on observe(); only for metrics observed from one thread"""
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._observe_lock = self._lock if threadsafe else None
+        # labels -> [per-bucket counts with a final +Inf slot, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        lock = self._observe_lock
+        if lock is None:
+            self._record(labels, index, value)
+        else:
+            with lock:
+                self._record(labels, index, value)
+
+    def _record(self, labels: Tuple, index: int, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][index] += 1
+        series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}"
+            yield f"{self.name}_sum{self._label_text(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{self._label_text(labels)} {cumulative}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    """Drop every recorded sample (benchmarks use this between runs)"""
+    for metric in _registry:
+        metric.clear()
+
+
+# Request and statement counts are the _count series of these histograms
+HTTP_REQUEST_SECONDS = Histogram(
+    "qms_http_request_duration_seconds",
+    "Time from receiving a request to the end of its response body, by method, route template and status",
+    ("method", "route", "status"), HTTP_BUCKETS, threadsafe=False,
+)
+SQL_STATEMENT_SECONDS = Histogram(
+    "qms_db_statement_duration_seconds", "SQL statement execution time by engine and statement kind",
+    ("engine", "operation"), SQL_BUCKETS,
+)
+SQL_ERRORS = Counter("qms_db_statement_errors_total", "SQL statements that raised", ("engine", "operation"))
+SQL_SLOW_STATEMENTS = Counter(
+    "qms_db_slow_statements_total", "Statements recorded by the slow-query log, by whether they scanned all of audits",
+    ("engine", "full_scan"),
+)
+AI_TOOL_RUNS = Counter(
+    "qms_ai_tool_requests_total", "AI tool executions by outcome (ok, error or cancelled), including cache hits",
+    ("tool", "outcome"),
+)
+AI_TOOL_SECONDS = Histogram(
+    "qms_ai_tool_duration_seconds", "AI tool execution time, including cache hits and LLM slot waits",
+    ("tool",), LLM_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    "qms_llm_call_duration_seconds", "LLM call time once an LLM slot is held", ("tool",), LLM_BUCKETS,
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "qms_llm_prompt_tokens", "Estimated prompt size of each LLM call in tokens", ("tool",), TOKEN_BUCKETS,
+)
+LLM_FAILURES = Counter("qms_llm_call_failures_total", "LLM calls that failed, by reason (timeout or error)", ("tool", "reason"))
+
+_SQL_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA")
+
+
+# statement -> operation; SQLAlchemy reuses the compiled statement strings, so hits are the norm
+_operation_cache: Dict[str, str] = {}
+_OPERATION_CACHE_SIZE = 2048
+
+
+def _operation(statement: str) -> str:
+    operation = _operation_cache.get(statement)
+    if operation is None:
+        head = statement.lstrip()[:6].upper()
+        operation = next((name for name in _SQL_OPERATIONS if head.startswith(name)), "OTHER")
+        if len(_operation_cache) < _OPERATION_CACHE_SIZE:
+            _operation_cache[statement] = operation
+    return operation
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Count and time every statement a (sync) SQLAlchemy engine executes"""
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    # The start time rides on the statement's execution context, which both events receive
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._qms_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        SQL_STATEMENT_SECONDS.observe(time.perf_counter() - context._qms_started, name, _operation(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        SQL_ERRORS.inc(name, _operation(exception_context.statement or ""))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts and latency per route template.
+
+    Routes are labelled by their path template ("/audits/{audit_id}"), looked up from the
+    endpoint the router stored in the scope, so label cardinality stays bounded; requests
+    that match no route are labelled "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            for route in getattr(scope.get("app"), "routes", ()):
+                if getattr(route, "endpoint", None) is not None:
+                    self._route_paths[route.endpoint] = route.path
+            path = self._route_paths.setdefault(endpoint, "unmatched")
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], self._route(scope), status)
@@ -0,0 +1,33 @@
+"""Schema upgrades for existing QMS databases.
+
+create_all() only adds missing tables, so columns, indexes and the search
+table that were introduced after a qms.db was first created are applied here. Every step
+is idempotent and runs on API startup; it can also be run by hand:
+
+    python migrate.py
+"""
+from sqlalchemy import text
+
+import models
+from database import engine
+
+
+def upgrade(bind) -> None:
+    """Create missing tables, columns, indexes and the full-text search table"""
+    models.Base.metadata.create_all(bind=bind)
+    models.add_missing_columns(bind)
+    models.create_missing_indexes(bind)
+    models.normalize_created_at(bind)
+    models.create_search_index(bind)
+    if bind.dialect.name == "sqlite":
+        # Cheap at startup: only re-analyzes tables whose stats look stale
+        with bind.begin() as conn:
+            conn.execute(text("PRAGMA optimize"))
+
+
+if __name__ == "__main__":
+    upgrade(engine)
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    print("Database schema is up to date")
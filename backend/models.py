@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Enum, Index, JSON, text
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from database import Base
 import enum
-from typing import Optional, Dict, Any
-from datetime import date
-from pydantic import BaseModel
+from typing import Optional, Dict, Any, List
+from datetime import date, datetime, timezone
+from pydantic import BaseModel, Field
 
 
 class AuditType(enum.Enum):
@@ -31,8 +33,8 @@ class Audit(Base):
     # Step 1: Initialization
     audit_title = Column(String, nullable=False)
     audit_type = Column(Enum(AuditType), nullable=False)
-    audit_scope = Column(Text, nullable=False)
-    audit_objective = Column(Text, nullable=False)
+    audit_scope = deferred(Column(Text, nullable=False), group="narrative")
+    audit_objective = deferred(Column(Text, nullable=False), group="narrative")
     
     # Step 2: Auditee Details
     auditee_name = Column(String, nullable=False)
@@ -50,13 +52,47 @@ class Audit(Base):
     audit_team = Column(String)
     
     # Step 4: Audit Plan
-    audit_criteria = Column(Text, nullable=False)
-    audit_agenda = Column(Text)
+    # Large narrative columns load only when asked for (see crud.get_audit)
+    audit_criteria = deferred(Column(Text, nullable=False), group="narrative")
+    audit_agenda = deferred(Column(Text), group="narrative")
     
     # Meta fields
     status = Column(Enum(AuditStatus), default=AuditStatus.PLANNED)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set from Python so every row stores SQLAlchemy's "YYYY-MM-DD HH:MM:SS.ffffff" text, which
+    # keyset cursors compare against; the server default only covers raw SQL inserts
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Rule-based risk (see risk.py), kept current by crud writes and refresh_risk_scores()
+    risk_score = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    risk_factors = Column(JSON)
+    risk_scored_on = Column(Date)
+    # risk.RULES_VERSION the score was computed under; rows that predate the column count as version 1
+    risk_rules_version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    # Incremented by every ORM update; source of the audit's ETag
+    row_version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+
+    # UPDATEs carry "WHERE row_version = ?", so a concurrent edit raises StaleDataError
+    __mapper_args__ = {"version_id_col": row_version}
+
+    # Composite (column, id) indexes backing keyset pagination and list filters
+    __table_args__ = (
+        Index("ix_audits_confirmed_end_date_id", "confirmed_end_date", "id"),
+        Index("ix_audits_created_at_id", "created_at", "id"),
+        Index("ix_audits_status_id", "status", "id"),
+        Index("ix_audits_audit_id_id", "audit_id", "id"),
+        Index("ix_audits_audit_type_id", "audit_type", "id"),
+        Index("ix_audits_lead_auditor_id", "lead_auditor", "id"),
+        Index("ix_audits_auditee_country_id", "auditee_country", "id"),
+        # Equality filters under the default created_at sort seek these and stop at LIMIT
+        Index("ix_audits_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_audits_audit_type_created_at_id", "audit_type", "created_at", "id"),
+        Index("ix_audits_lead_auditor_created_at_id", "lead_auditor", "created_at", "id"),
+        Index("ix_audits_auditee_country_created_at_id", "auditee_country", "created_at", "id"),
+        # Covering indexes for the identify_trends aggregates (see analytics.trend_stats)
+        Index("ix_audits_trend_dates", "confirmed_start_date", "status", "confirmed_end_date"),
+        Index("ix_audits_lead_auditor_status", "lead_auditor", "status"),
+        Index("ix_audits_risk_score_id", "risk_score", "id"),
+    )
     
     def to_dict(self):
         return {
@@ -83,6 +119,132 @@ class Audit(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
+
+def add_missing_columns(bind) -> None:
+    """Add model columns that an existing database table predates, filled from their server defaults"""
+    inspector = sa_inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg.text}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+
+def normalize_created_at(bind) -> None:
+    """Rewrite CURRENT_TIMESTAMP-style created_at text (no fraction) in SQLAlchemy's format (SQLite only).
+
+    Rows written by the old server default sort and compare before Python-written rows of the
+    same second, which breaks keyset pagination and created_at range filters.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        conn.execute(text("UPDATE audits SET created_at = created_at || '.000000' WHERE length(created_at) = 19"))
+
+def create_missing_indexes(bind) -> None:
+    """Create model indexes that an existing database file predates"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+# Narrative columns indexed by the audits_fts full-text table
+SEARCH_COLUMNS = ["audit_title", "audit_scope", "audit_objective", "audit_criteria", "audit_agenda"]
+
+def create_search_index(bind) -> bool:
+    """Create the FTS5 index over audit narrative fields and its sync triggers (SQLite only)"""
+    if bind.dialect.name != "sqlite":
+        return False
+
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{name}" for name in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{name}" for name in SEARCH_COLUMNS)
+    with bind.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'audits_fts'")
+        ).first()
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS audits_fts USING fts5("
+            f"{columns}, content='audits', content_rowid='id', tokenize='porter unicode61')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS audits_fts_ai AFTER INSERT ON audits BEGIN "
+            f"INSERT INTO audits_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS audits_fts_ad AFTER DELETE ON audits BEGIN "
+            f"INSERT INTO audits_fts(audits_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS audits_fts_au AFTER UPDATE OF {columns} ON audits BEGIN "
+            f"INSERT INTO audits_fts(audits_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO audits_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        ))
+        if not exists:
+            # Index rows written before the search table existed
+            conn.execute(text("INSERT INTO audits_fts(audits_fts) VALUES ('rebuild')"))
+    return True
+
+class AuditStatusCount(Base):
+    """Per-status audit counts, maintained incrementally by crud writes when enabled"""
+    __tablename__ = "audit_status_counts"
+
+    status = Column(Enum(AuditStatus), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class AuditCollectionVersion(Base):
+    """Single-row counter bumped by every audit write; list ETags are derived from it"""
+    __tablename__ = "audit_collection_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """SQLite hands DateTime(timezone=True) values back naive; they are stored in UTC"""
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+class AIJob(Base):
+    """A background AI tool run submitted through /ai/jobs, kept for polling after it finishes"""
+    __tablename__ = "ai_jobs"
+
+    id = Column(String, primary_key=True)
+    tool = Column(String, nullable=False)
+    query = Column(Text, nullable=False)
+    context = Column(JSON)
+    priority = Column(Integer, nullable=False, default=0)
+    # queued, running, completed, failed or cancelled
+    status = Column(String, nullable=False, index=True)
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    # The process holding an unfinished job renews its lease; any process may take over once it lapses
+    owner = Column(String)
+    lease_expires_at = Column(DateTime(timezone=True))
+    # Set by DELETE /ai/jobs/{id} in any process; the holder cancels the job when it next renews its lease
+    cancel_requested_at = Column(DateTime(timezone=True))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "tool": self.tool,
+            "query": self.query,
+            "context": self.context,
+            "priority": self.priority,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": _as_utc(self.created_at),
+            "started_at": _as_utc(self.started_at),
+            "finished_at": _as_utc(self.finished_at),
+            "cancel_requested_at": _as_utc(self.cancel_requested_at),
+        }
     
 class AIQueryRequest(BaseModel):
     query: str
@@ -95,3 +257,30 @@ class AIResponse(BaseModel):
     query: str
     result: Dict[str, Any]
     error: Optional[str] = None
+
+class AIBatchRequest(BaseModel):
+    requests: List[AIQueryRequest]
+
+class AIBatchResponse(BaseModel):
+    success: bool
+    results: List[AIResponse]
+
+class AIJobRequest(AIQueryRequest):
+    # Higher runs first; equal priorities run in submission order
+    priority: int = Field(0, ge=-10, le=10)
+
+class AIJobResponse(BaseModel):
+    job_id: str
+    status: str
+    tool: str
+    query: str
+    priority: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # True when an identical job was already queued or running and this is that job
+    deduplicated: bool = False
+    # Set while a cancellation waits for the process running the job to act on it
+    cancel_requested_at: Optional[datetime] = None
+    response: Optional[AIResponse] = None
+    error: Optional[str] = None
@@ -0,0 +1,318 @@
+"""Opt-in sampling profiler for single requests.
+
+With QMS_PROFILING=1, a request carrying an `X-Profile: 1` header or a
+`profile=1` query parameter is profiled on its own: a sampler thread
+records, every QMS_PROFILE_INTERVAL_MS, the stack of the request's asyncio
+task and of every task it created (the AI tools, map-reduce chunks and cache
+computations run in child tasks). A task running on the event loop
+contributes its real Python stack, down into the ORM, serialization or JSON
+parsing; a suspended one contributes the chain of coroutines it is awaiting
+in, ending in an "[await]" frame, so time spent waiting for the LLM or a
+worker thread shows up too. Other requests' tasks are never sampled.
+
+Each profile is written to QMS_PROFILE_DIR as a speedscope file (one sampled
+profile per task, open it at https://www.speedscope.app) plus a JSON
+summary of the top functions by self and total time. Only the newest
+QMS_PROFILE_MAX_FILES profiles are kept. The response carries the profile
+id in X-Profile-Id; the /admin/profiles endpoints list and fetch them.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+PROFILING_ENABLED = os.getenv("QMS_PROFILING", "0") == "1"
+PROFILE_DIR = os.getenv("QMS_PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("QMS_PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("QMS_PROFILE_INTERVAL_MS", "1")) / 1000
+PROFILE_TOP_N = int(os.getenv("QMS_PROFILE_TOP_N", "25"))
+# Sampling stops after this long; the rest of a very slow request is not recorded
+PROFILE_MAX_SECONDS = float(os.getenv("QMS_PROFILE_MAX_SECONDS", "120"))
+
+PROFILE_HEADER = b"x-profile"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+AWAIT_FRAME = ("[await]", "", 0)
+
+# The profile collecting tasks created by the current request, if it is being profiled
+_active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "qms_active_profile", default=None
+)
+
+Frame = Tuple[str, str, int]
+
+
+def _frame_key(frame) -> Frame:
+    code = frame.f_code
+    # co_qualname (Class.method) is new in Python 3.11; older versions get the bare name
+    return (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+
+
+def _await_chain(coro, root) -> List[Frame]:
+    """Frames of a suspended coroutine and of whatever it is awaiting, from `root` down"""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        if frame is root:
+            frames.clear()
+        frames.append(_frame_key(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    frames.append(AWAIT_FRAME)
+    return frames
+
+
+class RequestProfile:
+    """Samples the stacks of one request's asyncio tasks from a background thread"""
+
+    def __init__(self, method: str, path: str, interval: float = PROFILE_INTERVAL_SECONDS):
+        now = datetime.now(timezone.utc)
+        self.id = f"{now.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started_at = now
+        self.status: Optional[int] = None
+        self.duration = 0.0
+        self.tasks: List[asyncio.Task] = []
+        # task -> [(stack, weight in seconds, waiting)]
+        self.samples: Dict[asyncio.Task, List[Tuple[Tuple[Frame, ...], float, bool]]] = {}
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"qms-profiler-{self.id}", daemon=True)
+
+    def start(self, root) -> None:
+        """Start sampling; the request task's stacks begin at `root`, the middleware's frame"""
+        self._request_task = asyncio.current_task()
+        self._request_root = root
+        self.tasks.append(self._request_task)
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self._started
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        deadline = last + PROFILE_MAX_SECONDS
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            if now > deadline:
+                break
+            self._sample(now - last)
+            last = now
+
+    def _sample(self, weight: float) -> None:
+        leaf = sys._current_frames().get(self._loop_thread)
+        loop_stack = []
+        while leaf is not None:
+            loop_stack.append(leaf)
+            leaf = leaf.f_back
+        positions = {id(frame): index for index, frame in enumerate(loop_stack)}
+        for task in list(self.tasks):
+            if task.done():
+                continue
+            coro = task.get_coro()
+            root = self._request_root if task is self._request_task else getattr(coro, "cr_frame", None)
+            if root is None:
+                continue
+            index = positions.get(id(root))
+            if index is not None:
+                # Running on the event loop right now: its real stack, from the task's root frame down
+                stack = tuple(_frame_key(frame) for frame in reversed(loop_stack[:index + 1]))
+                waiting = False
+            else:
+                stack = tuple(_await_chain(coro, root))
+                waiting = True
+            self.samples.setdefault(task, []).append((stack, weight, waiting))
+
+    def speedscope(self) -> Dict[str, Any]:
+        """The samples in speedscope's file format, one sampled profile per task"""
+        frame_index: Dict[Frame, int] = {}
+        profiles = []
+        for task, samples in self.samples.items():
+            stacks, weights = [], []
+            for stack, weight, _ in samples:
+                stacks.append([frame_index.setdefault(frame, len(frame_index)) for frame in stack])
+                weights.append(round(weight * 1000, 3))
+            coro = task.get_coro()
+            profiles.append({
+                "type": "sampled",
+                "name": f"{task.get_name()} {getattr(coro, '__qualname__', '')}".strip(),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": stacks,
+                "weights": weights,
+            })
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": f"{self.method} {self.path}",
+            "exporter": "qms-profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": name, "file": file, "line": line} for name, file, line in frame_index]},
+            "profiles": profiles,
+        }
+
+    def summary(self, top_n: int = PROFILE_TOP_N) -> Dict[str, Any]:
+        """Metadata plus the top functions by self and total sampled time across the request's tasks"""
+        self_time, total_time = Counter(), Counter()
+        sampled = waiting = 0.0
+        for samples in self.samples.values():
+            for stack, weight, is_waiting in samples:
+                sampled += weight
+                waiting += weight if is_waiting else 0.0
+                self_time[stack[-1]] += weight
+                for frame in set(stack):
+                    total_time[frame] += weight
+
+        def top(counter: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"function": name, "file": file, "line": line, "ms": round(seconds * 1000, 2),
+                 "percent": round(100.0 * seconds / sampled, 1) if sampled else 0.0}
+                for (name, file, line), seconds in counter.most_common(top_n)
+            ]
+
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 2),
+            "interval_ms": self.interval * 1000,
+            "tasks": len(self.samples),
+            "samples": sum(len(samples) for samples in self.samples.values()),
+            "sampled_ms": round(sampled * 1000, 2),
+            "waiting_ms": round(waiting * 1000, 2),
+            "top_self": top(self_time),
+            "top_total": top(total_time),
+        }
+
+
+def _paths(profile_id: str) -> Tuple[str, str]:
+    return (os.path.join(PROFILE_DIR, f"{profile_id}.json"),
+            os.path.join(PROFILE_DIR, f"{profile_id}.speedscope.json"))
+
+
+def save_profile(profile: RequestProfile) -> None:
+    """Write a profile's summary and speedscope files, then drop the oldest beyond PROFILE_MAX_FILES"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    summary_path, speedscope_path = _paths(profile.id)
+    with open(speedscope_path, "w") as f:
+        json.dump(profile.speedscope(), f, separators=(",", ":"))
+    # The summary is written last; list_profiles only reports profiles that have one
+    with open(summary_path, "w") as f:
+        json.dump(profile.summary(), f)
+    for stale in _profile_ids()[:-PROFILE_MAX_FILES or None] if PROFILE_MAX_FILES > 0 else []:
+        for path in _paths(stale):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _profile_ids() -> List[str]:
+    """Stored profile ids, oldest first (ids start with their UTC timestamp)"""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-5] for name in names if name.endswith(".json") and not name.endswith(".speedscope.json"))
+
+
+def _valid_id(profile_id: str) -> bool:
+    return bool(profile_id) and all(ch.isalnum() or ch == "-" for ch in profile_id)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Summaries of stored profiles without their top-N tables, newest first"""
+    profiles = []
+    for profile_id in reversed(_profile_ids()):
+        summary = load_summary(profile_id)
+        if summary:
+            profiles.append({key: value for key, value in summary.items() if not key.startswith("top_")})
+    return profiles
+
+
+def load_summary(profile_id: str) -> Optional[Dict[str, Any]]:
+    if not _valid_id(profile_id):
+        return None
+    try:
+        with open(_paths(profile_id)[0]) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def speedscope_path(profile_id: str) -> Optional[str]:
+    """Path of a stored profile's speedscope file, or None"""
+    if not _valid_id(profile_id):
+        return None
+    path = _paths(profile_id)[1]
+    return path if os.path.exists(path) else None
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    """Make tasks created while a request is profiled join its profile"""
+    previous = loop.get_task_factory()
+    if getattr(previous, "_qms_profiler", False):
+        return
+
+    def factory(loop, coro, **kwargs):
+        task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+        profile = _active_profile.get()
+        if profile is not None:
+            profile.tasks.append(task)
+        return task
+
+    factory._qms_profiler = True
+    loop.set_task_factory(factory)
+
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope.get("headers", ()):
+        if name == PROFILE_HEADER:
+            return value.strip() not in (b"", b"0", b"false")
+    return any(part == b"profile=1" for part in scope.get("query_string", b"").split(b"&"))
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware profiling the requests that ask for it (see module docstring)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        loop = asyncio.get_running_loop()
+        _install_task_factory(loop)
+        profile = RequestProfile(scope["method"], scope["path"])
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile.id.encode()),
+                ])
+            await send(message)
+
+        token = _active_profile.set(profile)
+        profile.start(sys._getframe())
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            _active_profile.reset(token)
+            await loop.run_in_executor(None, save_profile, profile)
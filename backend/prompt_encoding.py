@@ -0,0 +1,161 @@
+"""Compact, token-efficient encodings of audit data for LLM prompts.
+
+Prompts used to embed json.dumps of one dict per audit, repeating every key,
+quote and full ISO date on each row. Here a list of audits becomes a
+pipe-separated table with a single header line; audit types and statuses
+become fixed short codes and repeated names (lead auditors, countries) codes
+from a per-table dictionary, each explained once in a legend; and dates are
+written as days relative to today. A single record becomes "key: value"
+lines and nested figures "key: name=value, ..." lines.
+"""
+import re
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from models import AuditStatus, AuditType
+
+TYPE_CODES = {
+    AuditType.INTERNAL.value: "INT",
+    AuditType.SUPPLIER_VENDOR.value: "SUP",
+    AuditType.REGULATORY.value: "REG",
+    AuditType.CRO.value: "CRO",
+    AuditType.FOR_CAUSE.value: "FC",
+    AuditType.PAI.value: "PAI",
+    AuditType.SURVEILLANCE.value: "SRV",
+}
+STATUS_CODES = {
+    AuditStatus.PLANNED.value: "P",
+    AuditStatus.IN_PROGRESS.value: "IP",
+    AuditStatus.CLOSED.value: "C",
+    AuditStatus.CANCELLED.value: "X",
+}
+ENUM_CODES = {"type": TYPE_CODES, "status": STATUS_CODES}
+
+
+def _as_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def relative_days(value, today: date) -> str:
+    """A date as signed days from today ("+5", "-12"); unparseable values pass through"""
+    day = _as_date(value)
+    return f"{(day - today).days:+d}" if day else _clean(value)
+
+
+def _clean(value) -> str:
+    # Table cells and record lines must stay on one line and free of the column separator
+    return " ".join(str(value).replace("|", "/").split())
+
+
+def _initials(name: str) -> str:
+    words = re.findall(r"[A-Za-z0-9]+", name)
+    if not words:
+        return "?"
+    return "".join(word[0] for word in words).upper() if len(words) > 1 else words[0][:3].upper()
+
+
+class AuditTable:
+    """Encodes records as a pipe-separated table with a legend for coded columns.
+
+    columns are (key, kind) pairs; kind is "text", "list" (items joined by "; "),
+    "date" (days from today), "type" / "status" (fixed enum codes) or "name"
+    (codes from a dictionary built over the encoded records).
+    """
+
+    def __init__(self, columns: Sequence[Tuple[str, str]], today: Optional[date] = None):
+        self.columns = list(columns)
+        self.today = today or date.today()
+
+    def _name_codes(self, records: Sequence[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+        codes = {}
+        for key, kind in self.columns:
+            if kind != "name":
+                continue
+            mapping, seen = {}, Counter()
+            for value in sorted({str(record.get(key)) for record in records if record.get(key)}):
+                base = _initials(value)
+                seen[base] += 1
+                mapping[value] = base if seen[base] == 1 else f"{base}{seen[base]}"
+            codes[key] = mapping
+        return codes
+
+    def _row(self, record: Dict[str, Any], codes: Dict[str, Dict[str, str]]) -> str:
+        cells = []
+        for key, kind in self.columns:
+            value = record.get(key)
+            if value is None or value == "" or value == []:
+                cells.append("")
+            elif kind == "date":
+                cells.append(relative_days(value, self.today))
+            elif kind in ENUM_CODES:
+                cells.append(ENUM_CODES[kind].get(value, _clean(value)))
+            elif kind == "name":
+                cells.append(codes[key][str(value)])
+            elif kind == "list":
+                cells.append("; ".join(_clean(item) for item in value))
+            else:
+                cells.append(_clean(value))
+        return "|".join(cells)
+
+    def rows(self, records: Sequence[Dict[str, Any]]) -> List[str]:
+        """One encoded line per record, coded against a dictionary over all of records"""
+        codes = self._name_codes(records)
+        return [self._row(record, codes) for record in records]
+
+    def encode(self, records: Sequence[Dict[str, Any]]) -> str:
+        codes = self._name_codes(records)
+        legend = []
+        for key, kind in self.columns:
+            if kind == "date":
+                legend.append(f"Dates are days from today ({self.today.isoformat()}): -3 is 3 days ago, +3 in 3 days")
+                break
+        for key, kind in self.columns:
+            if kind in ENUM_CODES:
+                present = {record.get(key) for record in records}
+                pairs = [f"{code}={value}" for value, code in ENUM_CODES[kind].items() if value in present]
+                if pairs:
+                    legend.append(f"{key}: {', '.join(pairs)}")
+            elif kind == "name" and codes[key]:
+                legend.append(f"{key}: {', '.join(f'{code}={value}' for value, code in codes[key].items())}")
+        header = "|".join(key for key, _ in self.columns)
+        return "\n".join(legend + [header] + [self._row(record, codes) for record in records])
+
+
+def encode_record(record: Dict[str, Any], today: Optional[date] = None, date_keys: Sequence[str] = ()) -> str:
+    """One "key: value" line per non-empty field; date_keys are written as days from today"""
+    today = today or date.today()
+    lines = [f"today: {today.isoformat()}"] if date_keys else []
+    for key, value in record.items():
+        if value is None or value == "" or value == [] or value == {}:
+            continue
+        if key in date_keys:
+            lines.append(f"{key}: {relative_days(value, today)} days")
+        elif isinstance(value, (list, tuple)):
+            lines.append(f"{key}: {'; '.join(_clean(item) for item in value)}")
+        else:
+            lines.append(f"{key}: {_clean(value)}")
+    return "\n".join(lines)
+
+
+def encode_mapping(data: Dict[str, Any], indent: str = "") -> str:
+    """Nested figures as "key: value" lines, flat dicts as "key: name=value, ..." """
+    lines = []
+    for key, value in data.items():
+        if isinstance(value, dict) and not any(isinstance(item, (dict, list)) for item in value.values()):
+            lines.append(f"{indent}{key}: {', '.join(f'{name}={item}' for name, item in value.items())}")
+        elif isinstance(value, dict):
+            lines.append(f"{indent}{key}:")
+            lines.append(encode_mapping(value, indent + "  "))
+        elif isinstance(value, (list, tuple)):
+            lines.append(f"{indent}{key}: {'; '.join(_clean(item) for item in value)}")
+        else:
+            lines.append(f"{indent}{key}: {value}")
+    return "\n".join(line for line in lines if line)
@@ -0,0 +1,115 @@
+"""Deterministic, rule-based audit risk scoring.
+
+Implements the high-risk criteria the show_high_risk_events prompt used to
+hand to the LLM, so every audit gets a score without an LLM call. crud stores
+the result in Audit.risk_score / risk_factors on every write; scores that
+depend on the date (overdue audits) are refreshed once a day by
+crud.refresh_risk_scores().
+
+Each matching rule contributes a score; an audit's score is the highest of
+them plus one for every additional factor that reaches HIGH_RISK_MIN_SCORE
+on its own, capped at 10. Milder factors (a plain supplier or international
+audit) are still listed but never add up to a high-risk score.
+"""
+import os
+from datetime import date
+from typing import Any, List, Mapping, Optional, Tuple
+
+from models import AuditStatus, AuditType
+
+MAX_SCORE = 10
+
+# Stored with every score; bump it when the rules change so crud.refresh_risk_scores re-scores old rows
+RULES_VERSION = 2
+
+# Audits scoring at least this are reported by show_high_risk_events
+HIGH_RISK_MIN_SCORE = int(os.getenv("QMS_HIGH_RISK_MIN_SCORE", "6"))
+
+# Audits outside this country count as international
+HOME_COUNTRY = os.getenv("QMS_HOME_COUNTRY", "USA")
+
+REGULATORY_TYPES = (AuditType.REGULATORY, AuditType.PAI)
+OPEN_STATUSES = (AuditStatus.PLANNED, AuditStatus.IN_PROGRESS)
+
+# Not "api"/"excipient"/"raw material": they match supplier names ("API Inc.") and routine sampling scopes
+CRITICAL_MATERIAL_TERMS = ("critical", "active pharmaceutical ingredient", "sterile")
+# Explicit phrasings only: a bare "sites" matches any scope that mentions the auditee's sites
+MULTI_SITE_TERMS = ("multi-site", "multisite", "multiple sites", "several sites")
+BROAD_SCOPE_WORDS = 25
+VERY_BROAD_SCOPE_WORDS = 50
+
+# Attributes score_audit reads
+RISK_INPUT_FIELDS = (
+    "audit_type", "status", "audit_title", "audit_scope", "audit_objective", "auditee_site_location",
+    "auditee_country", "proposed_start_date", "confirmed_start_date", "confirmed_end_date",
+)
+
+
+def _get(audit: Any, name: str):
+    return audit.get(name) if isinstance(audit, Mapping) else getattr(audit, name, None)
+
+
+def _mentions(text: str, terms) -> bool:
+    return any(term in text for term in terms)
+
+
+def score_audit(audit: Any, today: Optional[date] = None) -> Tuple[int, List[str]]:
+    """Score an Audit (or a dict of its columns) from 0 to 10 and name the factors behind it"""
+    today = today or date.today()
+    audit_type = _get(audit, "audit_type")
+    status = _get(audit, "status") or AuditStatus.PLANNED
+    text = " ".join(
+        filter(None, (_get(audit, "audit_title"), _get(audit, "audit_scope"), _get(audit, "audit_objective")))
+    ).lower() + " "
+    factors: List[Tuple[int, str]] = []
+
+    if audit_type in REGULATORY_TYPES:
+        factors.append((9, "Regulatory audit"))
+    elif audit_type == AuditType.SUPPLIER_VENDOR:
+        # What is being supplied is named in the title or objective; scope lists name routine areas
+        subject = f"{_get(audit, 'audit_title') or ''} {_get(audit, 'audit_objective') or ''}".lower()
+        if _mentions(subject, CRITICAL_MATERIAL_TERMS):
+            factors.append((8, "Supplier audit of critical materials"))
+        else:
+            # Below HIGH_RISK_MIN_SCORE on its own; the criteria only rate critical-material suppliers 7-8
+            factors.append((4, "Supplier/Vendor audit"))
+
+    if status in OPEN_STATUSES:
+        end = _get(audit, "confirmed_end_date")
+        proposed = _get(audit, "proposed_start_date")
+        start = _get(audit, "confirmed_start_date")
+        if end and end < today:
+            days = (today - end).days
+            factors.append((8 if days > 90 else 7 if days > 30 else 6, f"Overdue by {days} days"))
+        elif proposed and start and start > proposed:
+            factors.append((6, "Delayed start"))
+
+    scope_words = len((_get(audit, "audit_scope") or "").split())
+    if scope_words >= VERY_BROAD_SCOPE_WORDS:
+        factors.append((7, "Broad scope"))
+    elif scope_words >= BROAD_SCOPE_WORDS:
+        factors.append((6, "Broad scope"))
+
+    location = f"{_get(audit, 'auditee_site_location') or ''} {text}".lower()
+    international = (_get(audit, "auditee_country") or HOME_COUNTRY) != HOME_COUNTRY
+    multi_site = _mentions(location, MULTI_SITE_TERMS)
+    if international and multi_site:
+        factors.append((7, "International multi-site audit"))
+    elif multi_site:
+        factors.append((6, "Multi-site audit"))
+    elif international:
+        factors.append((5, "International audit"))
+
+    if not factors:
+        return 0, []
+    factors.sort(reverse=True)
+    compounding = sum(1 for points, _ in factors[1:] if points >= HIGH_RISK_MIN_SCORE)
+    score = min(MAX_SCORE, factors[0][0] + compounding)
+    return score, [label for _, label in factors]
+
+
+def risk_columns(audit: Any, today: Optional[date] = None) -> dict:
+    """Column values to store for an audit's current risk"""
+    today = today or date.today()
+    score, factors = score_audit(audit, today)
+    return {"risk_score": score, "risk_factors": factors, "risk_scored_on": today, "risk_rules_version": RULES_VERSION}
@@ -106,6 +106,7 @@ class AuditListResponse(BaseModel):
     lead_auditor: str
     confirmed_end_date: str
     auditee_country: str
+    snippet: Optional[str] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""Slow-query log for the database engines.
+
+SQL statements slower than QMS_SLOW_QUERY_MS are recorded with their
+parameters, duration and, on SQLite, their EXPLAIN QUERY PLAN. Plans with a
+bare "SCAN audits" (every row read, no index) are flagged as full scans; the
+dynamic filter chains in crud.get_audits produce very different SQL
+depending on which filters are set, and this shows which combinations miss
+an index. Entries go to the "qms.slow_queries" logger as one JSON line each
+and into a bounded in-memory buffer served by GET /admin/slow-queries.
+
+QMS_SLOW_QUERY_LOG picks the mode: "off" (the default), "all", which times
+every statement, or "sampled", which times a random QMS_SLOW_QUERY_SAMPLE_RATE
+share of them and is cheap enough to leave on in production. Plans are cached
+per statement text, so a recurring slow query is only explained once.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+SLOW_QUERY_MODE = os.getenv("QMS_SLOW_QUERY_LOG", "off")
+SLOW_QUERY_ENABLED = SLOW_QUERY_MODE in ("all", "sampled")
+SLOW_QUERY_SECONDS = float(os.getenv("QMS_SLOW_QUERY_MS", "200")) / 1000
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("QMS_SLOW_QUERY_SAMPLE_RATE", "0.05")) if SLOW_QUERY_MODE == "sampled" else 1.0
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("QMS_SLOW_QUERY_BUFFER", "200"))
+# Longer statements and string parameters are truncated in the log
+MAX_STATEMENT_CHARS = 4000
+MAX_PARAMETER_CHARS = 200
+
+FULL_SCAN_DETAILS = ("SCAN audits", "SCAN TABLE audits")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+logger = logging.getLogger("qms.slow_queries")
+
+_entries: deque = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+_lock = threading.Lock()
+# statement -> plan lines; plans rarely depend on the parameter values
+_plan_cache: Dict[str, List[str]] = {}
+_PLAN_CACHE_SIZE = 512
+
+
+def _parameter(value: Any) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= MAX_PARAMETER_CHARS else value[:MAX_PARAMETER_CHARS] + "..."
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, float, bool)):
+        return value
+    return _parameter(str(value))
+
+
+def _parameters(parameters: Any) -> Any:
+    if isinstance(parameters, dict):
+        return {key: _parameter(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_parameter(value) for value in parameters]
+    return _parameter(parameters)
+
+
+def _format_plan(rows) -> List[str]:
+    """EXPLAIN QUERY PLAN rows (id, parent, notused, detail) as lines indented by depth"""
+    depths = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth = depths.get(parent, -1) + 1
+        depths[node_id] = depth
+        lines.append("  " * depth + detail)
+    return lines
+
+
+def explain(conn, statement: str, parameters) -> Optional[List[str]]:
+    """EXPLAIN QUERY PLAN for a statement on the connection that ran it; None when unavailable"""
+    if conn.dialect.name != "sqlite" or not statement.lstrip()[:6].upper().startswith(_EXPLAINABLE):
+        return None
+    plan = _plan_cache.get(statement)
+    if plan is None:
+        # A fresh DBAPI cursor leaves the statement's own cursor and results alone and fires no events
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+            plan = _format_plan(cursor.fetchall())
+        except Exception as exc:
+            return [f"EXPLAIN QUERY PLAN failed: {exc}"]
+        finally:
+            cursor.close()
+        if len(_plan_cache) < _PLAN_CACHE_SIZE:
+            _plan_cache[statement] = plan
+    return plan
+
+
+def is_full_scan(plan: Optional[List[str]]) -> bool:
+    return bool(plan) and any(line.strip() in FULL_SCAN_DETAILS for line in plan)
+
+
+def record(engine_name: str, statement: str, parameters, executemany: bool, duration: float, plan) -> Dict[str, Any]:
+    """Log a slow statement and keep it in the recent-entries buffer"""
+    full_scan = is_full_scan(plan)
+    entry = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "engine": engine_name,
+        "duration_ms": round(duration * 1000, 2),
+        "statement": statement if len(statement) <= MAX_STATEMENT_CHARS else statement[:MAX_STATEMENT_CHARS] + "...",
+        # executemany passes a list of parameter sets; keep the first and the count
+        "parameters": _parameters(parameters[0] if executemany and parameters else parameters),
+        "executemany": len(parameters) if executemany else None,
+        "plan": plan,
+        "full_scan": full_scan,
+        "sampled": SLOW_QUERY_MODE == "sampled",
+    }
+    with _lock:
+        _entries.append(entry)
+    metrics.SQL_SLOW_STATEMENTS.inc(engine_name, "true" if full_scan else "false")
+    logger.warning("slow query %s", json.dumps(entry, default=str))
+    return entry
+
+
+def recent(limit: int = 100, full_scan: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """Most recent slow statements, newest first"""
+    with _lock:
+        entries = list(_entries)
+    entries.reverse()
+    if full_scan is not None:
+        entries = [entry for entry in entries if entry["full_scan"] == full_scan]
+    return entries[:limit]
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+    _plan_cache.clear()
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Record statements on a (sync) SQLAlchemy engine that run longer than the threshold"""
+    if not SLOW_QUERY_ENABLED:
+        return
+    from sqlalchemy import event
+
+    sample_rate = SLOW_QUERY_SAMPLE_RATE
+    threshold = SLOW_QUERY_SECONDS
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if sample_rate >= 1.0 or random.random() < sample_rate:
+            context._qms_slow_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_qms_slow_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        if duration < threshold:
+            return
+        plan = None if executemany else explain(conn, statement, parameters)
+        record(name, statement, parameters, executemany, duration, plan)
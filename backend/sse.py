@@ -0,0 +1,110 @@
+"""Server-Sent Events helpers for the streaming AI endpoints.
+
+The /ai/*/stream routes send a `start` event as soon as the request is
+accepted, then `token` events with LLM output as it arrives and `field`
+events whenever a top-level field of the JSON the model is writing is
+complete, and finish with the same payload the non-streaming route returns
+(`result`) followed by `done`.
+"""
+import json
+from typing import Any, List, Tuple
+
+# Proxies (nginx in particular) must not buffer or cache the stream
+HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def comment(text: str) -> str:
+    """An SSE comment line; clients ignore it, but it keeps idle connections open"""
+    return f": {text}\n\n"
+
+
+class PartialJSONFields:
+    """Yields the top-level fields of a JSON object, fed in chunks, as each value completes.
+
+    Text before the opening brace (a ```json fence, say) is skipped; a field whose
+    value does not parse is dropped rather than reported.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.expect = "key"  # key, colon or value
+        self.capturing = False
+        self.key = None
+        self.buf: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        fields: List[Tuple[str, Any]] = []
+        for ch in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self.depth = 1
+                continue
+            if self.capturing:
+                self.buf.append(ch)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self._string_closed(fields)
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                if self.depth == 1 and not self.capturing and self.expect in ("key", "value"):
+                    self._capture(ch)
+            elif ch in "{[":
+                if self.depth == 1 and self.expect == "value" and not self.capturing:
+                    self._capture(ch)
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.capturing:
+                    self._emit(fields, "".join(self.buf))
+                elif self.depth == 0:
+                    if self.capturing:
+                        self._emit(fields, "".join(self.buf[:-1]))
+                    self.finished = True
+            elif self.depth == 1:
+                if ch == ":" and self.expect == "colon":
+                    self.expect = "value"
+                elif ch == "," and self.capturing:
+                    self._emit(fields, "".join(self.buf[:-1]))
+                elif self.expect == "value" and not self.capturing and not ch.isspace():
+                    self._capture(ch)
+        return fields
+
+    def _capture(self, ch: str) -> None:
+        self.capturing = True
+        self.buf = [ch]
+
+    def _string_closed(self, fields: List[Tuple[str, Any]]) -> None:
+        if self.expect == "key":
+            self.key = json.loads("".join(self.buf))
+            self.capturing = False
+            self.expect = "colon"
+        else:
+            self._emit(fields, "".join(self.buf))
+
+    def _emit(self, fields: List[Tuple[str, Any]], raw: str) -> None:
+        self.capturing = False
+        self.expect = "key"
+        try:
+            fields.append((self.key, json.loads(raw)))
+        except ValueError:
+            pass
@@ -0,0 +1,333 @@
+"""Synthetic audit data for load tests and benchmarks.
+
+crud.seed_sample_data only writes three hand-made audits. AuditGenerator
+yields any number of realistic ones instead: types, statuses, countries and
+lead auditors follow configurable weights, dates agree with the status
+(closed audits lie in the past, some open ones are overdue or started late),
+titles, scopes and contacts vary, and risk columns are scored as crud would.
+Output depends only on the seed and today's date. load_audits() bulk-inserts
+them through crud.insert_audit_rows.
+
+    python synthetic.py --rows 100000 [--seed 7] [--types "Internal=50,Regulatory=10"]
+                        [--statuses ...] [--countries ...] [--auditors ...] [--history-days 1095]
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import crud
+import risk
+from models import AuditStatus, AuditType
+
+DEFAULT_TYPE_WEIGHTS = {
+    AuditType.INTERNAL.value: 35,
+    AuditType.SUPPLIER_VENDOR.value: 30,
+    AuditType.REGULATORY.value: 8,
+    AuditType.CRO.value: 8,
+    AuditType.FOR_CAUSE.value: 5,
+    AuditType.PAI.value: 4,
+    AuditType.SURVEILLANCE.value: 10,
+}
+DEFAULT_STATUS_WEIGHTS = {
+    AuditStatus.PLANNED.value: 25,
+    AuditStatus.IN_PROGRESS.value: 10,
+    AuditStatus.CLOSED.value: 58,
+    AuditStatus.CANCELLED.value: 7,
+}
+DEFAULT_COUNTRY_WEIGHTS = {
+    "USA": 40, "India": 14, "Germany": 9, "China": 9, "Ireland": 8,
+    "United Kingdom": 7, "Switzerland": 5, "Brazil": 4, "Japan": 4,
+}
+DEFAULT_AUDITOR_WEIGHTS = {
+    "QA Manager": 22, "Supplier Quality": 20, "QA Specialist": 20, "Head of Quality": 8,
+    "Compliance Lead": 10, "Validation Lead": 8, "GCP Auditor": 7, "Regulatory Affairs": 5,
+}
+
+# Share of open audits that are overdue, and of audits whose start slipped past the proposed date
+OVERDUE_SHARE = 0.15
+DELAYED_SHARE = 0.2
+MULTI_SITE_SHARE = 0.05
+
+# (city, region / postcode) per country; other countries get a generic address
+CITIES = {
+    "USA": [("Boston", "MA 02101"), ("Research Triangle", "NC 27709"), ("San Diego", "CA 92121"),
+            ("Indianapolis", "IN 46225"), ("Princeton", "NJ 08540")],
+    "India": [("Mumbai", "Maharashtra 400001"), ("Hyderabad", "Telangana 500032"), ("Ahmedabad", "Gujarat 380015")],
+    "Germany": [("Frankfurt", "60311"), ("Ludwigshafen", "67056"), ("Berlin", "10115")],
+    "China": [("Shanghai", "201203"), ("Suzhou", "215123"), ("Hangzhou", "310000")],
+    "Ireland": [("Cork", "T12 X8N6"), ("Dublin", "D24 YX80"), ("Limerick", "V94 T9PX")],
+    "United Kingdom": [("Cambridge", "CB2 0QQ"), ("Macclesfield", "SK10 2NA")],
+    "Switzerland": [("Basel", "4056"), ("Visp", "3930")],
+    "Brazil": [("Sao Paulo", "04543-011"), ("Campinas", "13069-380")],
+    "Japan": [("Osaka", "541-0045"), ("Tokyo", "103-8411")],
+}
+STREETS = ["Pharma Way", "Industrial Park", "Science Drive", "Innovation Boulevard", "Technology Road", "Harbour Road"]
+
+INTERNAL_UNITS = ["Manufacturing Line A", "Manufacturing Line B", "QC Laboratory", "Microbiology Laboratory",
+                  "Sterile Filling Suite", "Packaging Hall", "Central Warehouse", "Engineering & Maintenance",
+                  "Document Control", "Stability Unit"]
+COMPANY_PREFIXES = ["Apex", "Nova", "Helix", "Meridian", "Crest", "Vertex", "Orion", "Summit", "Keystone", "Sinova"]
+SUPPLIER_SUFFIXES = ["API Inc.", "Chemicals Ltd.", "Excipients GmbH", "Biologics", "Packaging Co.", "Fine Chemicals"]
+CRO_SUFFIXES = ["Clinical Research", "Trials Ltd.", "Bioanalytical Labs", "CRO Services"]
+
+TITLES = {
+    AuditType.INTERNAL: ["Annual GMP Compliance for {auditee}", "Data Integrity Review of {auditee}",
+                         "Self-Inspection of {auditee}", "Cleaning Validation Review for {auditee}"],
+    AuditType.SUPPLIER_VENDOR: ["Qualification Audit for {auditee}", "Requalification Audit for {auditee}",
+                                "Critical Raw Material Audit of {auditee}"],
+    AuditType.REGULATORY: ["FDA Routine Inspection at {auditee}", "EMA GMP Inspection at {auditee}",
+                           "Health Authority Inspection at {auditee}"],
+    AuditType.CRO: ["GCP Audit of {auditee}", "Clinical Data Management Audit of {auditee}"],
+    AuditType.FOR_CAUSE: ["For-Cause Audit after Deviation DEV-{number} at {auditee}",
+                          "Complaint Investigation Audit at {auditee}"],
+    AuditType.PAI: ["Pre-Approval Inspection for NDA {number} at {auditee}"],
+    AuditType.SURVEILLANCE: ["Surveillance Audit of {auditee}", "ISO 13485 Surveillance Audit at {auditee}"],
+}
+SCOPE_AREAS = [
+    "manufacturing processes", "batch record review", "documentation practices", "quality control testing",
+    "change control", "deviation and CAPA management", "supplier management", "training records",
+    "equipment qualification", "cleaning validation", "environmental monitoring", "data integrity controls",
+    "warehouse and distribution", "complaint handling", "computerized system validation", "stability testing",
+    "sterile processing", "raw material sampling",
+]
+OBJECTIVES = {
+    AuditType.INTERNAL: "To verify compliance with current Good Manufacturing Practice regulations and internal quality standards.",
+    AuditType.SUPPLIER_VENDOR: "To qualify {auditee} as an approved supplier and assess their quality management system.",
+    AuditType.REGULATORY: "To demonstrate inspection readiness and compliance with applicable regulations.",
+    AuditType.CRO: "To confirm {auditee} conducts studies in line with ICH E6 Good Clinical Practice.",
+    AuditType.FOR_CAUSE: "To establish the root cause of the reported issue and verify corrective actions.",
+    AuditType.PAI: "To confirm the site is ready for the pre-approval inspection of the submitted application.",
+    AuditType.SURVEILLANCE: "To confirm continued conformity of the certified quality management system.",
+}
+CRITERIA = {
+    AuditType.INTERNAL: "FDA 21 CFR Parts 210/211, ICH Q7, Company SOPs QA-001 through QA-015",
+    AuditType.SUPPLIER_VENDOR: "ISO 9001:2015, ICH Q7, Quality Agreement",
+    AuditType.REGULATORY: "FDA 21 CFR Parts 210/211, EU GMP Guidelines",
+    AuditType.CRO: "ICH E6(R2), 21 CFR Parts 50/56/312",
+    AuditType.FOR_CAUSE: "Company SOPs QA-020 (Deviations) and QA-021 (CAPA)",
+    AuditType.PAI: "FDA Compliance Program 7346.832, 21 CFR Part 314",
+    AuditType.SURVEILLANCE: "ISO 13485:2016, Company Quality Manual",
+}
+AGENDA_ITEMS = ["Opening meeting and facility tour", "Documentation review", "Production process review",
+                "Laboratory and testing procedures", "Quality systems and CAPA review", "Training records review"]
+FIRST_NAMES = ["John", "Priya", "Emily", "David", "Lisa", "Michael", "Sarah", "Wei", "Anna", "Carlos",
+               "Fatima", "Hiroshi", "Sean", "Lukas", "Amanda", "Robert"]
+LAST_NAMES = ["Smith", "Patel", "Rodriguez", "Wilson", "Chen", "Brown", "Johnson", "Zhang", "Muller", "Silva",
+              "Khan", "Tanaka", "Murphy", "Schmidt", "White", "Garcia"]
+# Weights of audit durations of 1 to 10 days
+DURATION_WEIGHTS = [3, 8, 10, 10, 8, 5, 3, 2, 1, 1]
+
+
+def parse_weights(spec: str, allowed: Optional[Sequence[str]] = None) -> Dict[str, float]:
+    """Parse "Internal=40,Regulatory=10" into weights, checking names against allowed"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, value = item.rpartition("=")
+        try:
+            weight = float(value)
+        except ValueError:
+            weight = -1
+        if not sep or not name.strip() or weight < 0:
+            raise ValueError(f"Invalid weight '{item}', expected NAME=WEIGHT")
+        name = name.strip()
+        if allowed is not None and name not in allowed:
+            raise ValueError(f"Unknown value '{name}', expected one of: {', '.join(allowed)}")
+        weights[name] = weight
+    if not weights or not any(weights.values()):
+        raise ValueError(f"No positive weights in '{spec}'")
+    return weights
+
+
+class _Picker:
+    """Weighted choice with precomputed cumulative weights"""
+
+    def __init__(self, weights: Dict[Any, float]):
+        self.values = list(weights)
+        total = 0.0
+        self.cum_weights = []
+        for weight in weights.values():
+            total += weight
+            self.cum_weights.append(total)
+
+    def __call__(self, rng: random.Random):
+        return rng.choices(self.values, cum_weights=self.cum_weights)[0]
+
+
+class AuditGenerator:
+    """Seeded source of realistic audit rows, ready for crud.insert_audit_rows"""
+
+    def __init__(
+        self,
+        seed: int = 7,
+        type_weights: Optional[Dict[str, float]] = None,
+        status_weights: Optional[Dict[str, float]] = None,
+        country_weights: Optional[Dict[str, float]] = None,
+        auditor_weights: Optional[Dict[str, float]] = None,
+        history_days: int = 3 * 365,
+        today: Optional[date] = None,
+    ):
+        self.seed = seed
+        self.today = today or date.today()
+        self.history_days = max(history_days, 30)
+        self._type = _Picker({AuditType(name): w for name, w in (type_weights or DEFAULT_TYPE_WEIGHTS).items()})
+        self._status = _Picker({AuditStatus(name): w for name, w in (status_weights or DEFAULT_STATUS_WEIGHTS).items()})
+        self._country = _Picker(country_weights or DEFAULT_COUNTRY_WEIGHTS)
+        self._auditor = _Picker(auditor_weights or DEFAULT_AUDITOR_WEIGHTS)
+        self._duration = _Picker(dict(zip(range(1, len(DURATION_WEIGHTS) + 1), DURATION_WEIGHTS)))
+
+    def _auditee(self, rng: random.Random, audit_type: AuditType, city: str) -> str:
+        if audit_type in (AuditType.SUPPLIER_VENDOR, AuditType.CRO) or (
+            audit_type == AuditType.FOR_CAUSE and rng.random() < 0.5
+        ):
+            suffixes = CRO_SUFFIXES if audit_type == AuditType.CRO else SUPPLIER_SUFFIXES
+            return f"{rng.choice(COMPANY_PREFIXES)} {rng.choice(suffixes)}"
+        if audit_type in (AuditType.REGULATORY, AuditType.PAI):
+            return f"{city} Manufacturing Site"
+        return rng.choice(INTERNAL_UNITS)
+
+    def _dates(self, rng: random.Random, status: AuditStatus, days: int) -> Tuple[date, date]:
+        today = self.today
+        if status == AuditStatus.CLOSED:
+            start = today - timedelta(days=rng.randint(days + 7, self.history_days))
+        elif status == AuditStatus.CANCELLED:
+            start = today + timedelta(days=rng.randint(-self.history_days, 180))
+        elif rng.random() < OVERDUE_SHARE:
+            # Still open although the confirmed end date has passed
+            start = today - timedelta(days=rng.randint(days + 1, days + 120))
+        elif status == AuditStatus.IN_PROGRESS:
+            start = today - timedelta(days=rng.randint(0, days))
+        else:
+            start = today + timedelta(days=rng.randint(1, 365))
+        return start, start + timedelta(days=days)
+
+    def audit(self, index: int) -> Dict[str, Any]:
+        """The audit row for index; the same seed and index always give the same row"""
+        rng = random.Random(self.seed * 1_000_003 + index)
+        audit_type = self._type(rng)
+        status = self._status(rng)
+        country = self._country(rng)
+        city, postcode = rng.choice(CITIES.get(country) or [(f"{country} City", "")])
+        auditee = self._auditee(rng, audit_type, city)
+        days = self._duration(rng)
+        start, end = self._dates(rng, status, days)
+
+        proposed_start = start
+        if rng.random() < DELAYED_SHARE:
+            proposed_start = start - timedelta(days=rng.randint(1, 45))
+        created_day = min(proposed_start - timedelta(days=rng.randint(7, 120)), self.today)
+        created_at = datetime.combine(created_day, datetime.min.time()) + timedelta(seconds=rng.randint(0, 86399))
+        updated_at = None
+        if status != AuditStatus.PLANNED:
+            updated_day = min(max(end, created_day), self.today)
+            updated_at = max(created_at, datetime.combine(updated_day, datetime.min.time()) + timedelta(hours=17))
+
+        areas = rng.sample(SCOPE_AREAS, rng.choices(range(2, 11), weights=[6, 10, 10, 8, 6, 4, 3, 2, 1])[0])
+        scope = f"{auditee} review covering {', '.join(areas[:-1])} and {areas[-1]}."
+        location = ", ".join(filter(None, (f"{rng.randint(1, 999)} {rng.choice(STREETS)}", city, postcode, country)))
+        if rng.random() < MULTI_SITE_SHARE:
+            scope += " The audit spans all manufacturing sites of the auditee."
+            location = f"Multi-site: {location}"
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        domain = auditee.split(" ")[0].lower() if audit_type in (AuditType.SUPPLIER_VENDOR, AuditType.CRO) else "company"
+        team = ", ".join(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rng.randint(1, 3)))
+        agenda = "\n".join(
+            f"Day {day}: {item}"
+            for day, item in enumerate(AGENDA_ITEMS[:max(1, min(days - 1, len(AGENDA_ITEMS)))] + ["Closing meeting"], 1)
+        )
+
+        values = {
+            "audit_id": f"AUD-{created_day.year}-{index:08X}",
+            "audit_title": rng.choice(TITLES[audit_type]).format(auditee=auditee, number=rng.randint(1000, 99999)),
+            "audit_type": audit_type,
+            "audit_scope": scope,
+            "audit_objective": OBJECTIVES[audit_type].format(auditee=auditee),
+            "auditee_name": auditee,
+            "auditee_site_location": location,
+            "auditee_country": country,
+            "primary_contact_name": f"{first} {last}",
+            "primary_contact_email": f"{first}.{last}@{domain}.com".lower(),
+            "proposed_start_date": proposed_start,
+            "proposed_end_date": proposed_start + timedelta(days=days),
+            "confirmed_start_date": start,
+            "confirmed_end_date": end,
+            "lead_auditor": self._auditor(rng),
+            "audit_team": team,
+            "audit_criteria": CRITERIA[audit_type],
+            "audit_agenda": agenda,
+            "status": status,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "row_version": 1,
+        }
+        values.update(risk.risk_columns(values, self.today))
+        return values
+
+    def audits(self, count: int, start_index: int = 0) -> Iterator[Dict[str, Any]]:
+        for index in range(start_index, start_index + count):
+            yield self.audit(index)
+
+
+def load_audits(
+    db: Session, count: int, generator: Optional[AuditGenerator] = None, batch_size: int = 5000
+) -> int:
+    """Bulk-insert count generated audits after any existing ones and refresh planner statistics"""
+    generator = generator or AuditGenerator()
+    start_index = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM audits")).scalar()
+    inserted = crud.insert_audit_rows(db, generator.audits(count, start_index), batch_size=batch_size)
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(text("ANALYZE"))
+        db.commit()
+    return inserted
+
+
+def generator_from_args(args: argparse.Namespace) -> AuditGenerator:
+    """An AuditGenerator configured by the flags add_generator_arguments defines"""
+    types = [t.value for t in AuditType]
+    statuses = [s.value for s in AuditStatus]
+    return AuditGenerator(
+        seed=args.seed,
+        type_weights=parse_weights(args.types, types) if args.types else None,
+        status_weights=parse_weights(args.statuses, statuses) if args.statuses else None,
+        country_weights=parse_weights(args.countries) if args.countries else None,
+        auditor_weights=parse_weights(args.auditors) if args.auditors else None,
+        history_days=args.history_days,
+    )
+
+
+def add_generator_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--seed", type=int, default=7, help="Seed for the generated data")
+    parser.add_argument("--types", help='Audit type weights, e.g. "Internal=40,Supplier/Vendor=30,Regulatory=10"')
+    parser.add_argument("--statuses", help='Status weights, e.g. "Planned=30,In Progress=10,Closed=55,Cancelled=5"')
+    parser.add_argument("--countries", help='Auditee country weights, e.g. "USA=50,India=30,Germany=20"')
+    parser.add_argument("--auditors", help='Lead auditor weights, e.g. "QA Manager=3,Supplier Quality=1"')
+    parser.add_argument("--history-days", type=int, default=3 * 365, help="How far back closed audits go")
+
+
+if __name__ == "__main__":
+    import migrate
+    from database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic audits into the QMS database")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    add_generator_arguments(parser)
+    arguments = parser.parse_args()
+    try:
+        audit_generator = generator_from_args(arguments)
+    except ValueError as e:
+        parser.error(str(e))
+
+    migrate.upgrade(engine)
+    session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        total = load_audits(session, arguments.rows, audit_generator, arguments.batch_size)
+        elapsed = time.perf_counter() - started
+    finally:
+        session.close()
+    print(f"Inserted {total} synthetic audits in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)")
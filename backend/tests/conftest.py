@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# database.py builds its engines at import time; keep them off the checked-in qms.db
+os.environ.setdefault("QMS_DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='qms-tests-')}/qms.db")
+# main builds its QMSAIService at import; keep it offline and fast
+os.environ.setdefault("QMS_LLM_PROVIDER", "stub")
+os.environ.setdefault("QMS_LLM_STUB_LATENCY", "fixed:0")
+
+import database  # noqa: E402
+import migrate  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A fresh, fully migrated SQLite database per test"""
+    bind = database.create_db_engine(f"sqlite:///{tmp_path}/qms.db")
+    migrate.upgrade(bind)
+    yield bind
+    bind.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client():
+    """TestClient on the app, with its startup (sample data, AI job queue) run.
+
+    The app uses the module-level engines on QMS_DATABASE_URL, shared by every test using it.
+    """
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import event
+
+import database
+
+REQUESTS = [
+    {"tool": "summarize_open_events", "query": "Summarize open audits"},
+    {"tool": "identify_trends", "query": "What trends do you see?"},
+    {"tool": "show_high_risk_events", "query": "Show high-risk audits"},
+]
+
+
+@pytest.fixture
+def service(client):
+    import main
+
+    main.ai_service.cache.clear()
+    main.ai_service.chunk_cache.clear()
+    return main.ai_service
+
+
+@pytest.fixture
+def statements():
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    for bind in (database.engine, database.read_engine):
+        event.listen(bind, "before_cursor_execute", capture)
+    yield captured
+    for bind in (database.engine, database.read_engine):
+        event.remove(bind, "before_cursor_execute", capture)
+
+
+def test_a_batch_reads_one_snapshot_for_every_tool(client, service, statements):
+    for request in REQUESTS:
+        assert client.post("/ai/query", json=request).json()["success"]
+    separate = len(statements)
+
+    service.cache.clear()
+    service.chunk_cache.clear()
+    statements.clear()
+    response = client.post("/ai/batch", json={"requests": REQUESTS})
+    body = response.json()
+    assert response.status_code == 200
+    assert body["success"]
+    assert [result["tool"] for result in body["results"]] == [request["tool"] for request in REQUESTS]
+    assert len(statements) < separate
+
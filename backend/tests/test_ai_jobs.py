@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import ai_jobs
+import crud
+import database
+
+
+class FakeService:
+    """Stands in for QMSAIService: counts runs and holds each one until `release` is set"""
+
+    tools = {"identify_trends": None}
+
+    def __init__(self):
+        self.runs = []
+        self.release = asyncio.Event()
+
+    async def execute_ai_tool(self, tool, query, db, context=None):
+        self.runs.append(query)
+        await self.release.wait()
+        return {"success": True, "tool": tool, "query": query, "result": {}}
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _insert_job(session_factory, job_id, status, owner, lease_until):
+    db = session_factory()
+    try:
+        job = {"job_id": job_id, "tool": "identify_trends", "query": job_id, "context": None,
+               "priority": 0, "status": status, "created_at": datetime.now(timezone.utc)}
+        crud.create_ai_job(db, job, owner, lease_until)
+    finally:
+        db.close()
+
+
+def test_job_timestamps_read_back_as_utc(db):
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    crud.create_ai_job(db, {"job_id": "j1", "tool": "identify_trends", "query": "q", "context": None,
+                            "priority": 0, "status": "queued", "created_at": created_at},
+                       "owner", created_at)
+    job = crud.get_ai_job(db, "j1")
+    assert job["created_at"] == created_at
+    assert job["created_at"].tzinfo is not None
+
+
+def test_a_live_owners_running_job_is_not_rerun(session_factory):
+    async def run():
+        service = FakeService()
+        first = ai_jobs.AIJobQueue(service, session_factory, workers=1, lease_seconds=30)
+        second = ai_jobs.AIJobQueue(service, session_factory, workers=1, lease_seconds=30)
+        await first.start()
+        job, _ = await first.submit("identify_trends", "long")
+        while not service.runs:
+            await asyncio.sleep(0.01)
+        await second.start()
+        await asyncio.sleep(0.1)
+        service.release.set()
+        done = await second.wait(job["job_id"], 5)
+        await first.stop()
+        await second.stop()
+        return service.runs, done
+
+    runs, done = asyncio.run(run())
+    assert runs == ["long"]
+    assert done["status"] == "completed"
+
+
+def test_jobs_with_a_lapsed_lease_are_adopted(session_factory):
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+    _insert_job(session_factory, "orphan", "running", "crashed-process", expired)
+    _insert_job(session_factory, "held", "queued", "live-process", datetime.now(timezone.utc) + timedelta(hours=1))
+
+    async def run():
+        service = FakeService()
+        service.release.set()
+        queue = ai_jobs.AIJobQueue(service, session_factory, workers=1)
+        await queue.start()
+        orphan = await queue.wait("orphan", 5)
+        held = await queue.get("held")
+        await queue.stop()
+        return service.runs, orphan, held
+
+    runs, orphan, held = asyncio.run(run())
+    assert runs == ["orphan"]
+    assert orphan["status"] == "completed"
+    assert held["status"] == "queued"
+
+
+def test_a_job_queued_in_another_process_can_be_cancelled(session_factory):
+    _insert_job(session_factory, "remote", "queued", "live-process", datetime.now(timezone.utc) + timedelta(hours=1))
+
+    async def run():
+        queue = ai_jobs.AIJobQueue(FakeService(), session_factory, workers=1)
+        await queue.start()
+        job = await queue.cancel("remote")
+        await queue.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job["status"] == "cancelled"
+    assert job["finished_at"].tzinfo is not None
+
+
+def test_a_job_running_in_another_process_is_cancelled_when_its_lease_is_renewed(session_factory):
+    async def run():
+        service = FakeService()
+        holder = ai_jobs.AIJobQueue(service, session_factory, workers=1, lease_seconds=0.6)
+        other = ai_jobs.AIJobQueue(service, session_factory, workers=1, lease_seconds=0.6)
+        await holder.start()
+        await other.start()
+        job, _ = await holder.submit("identify_trends", "long")
+        while not service.runs:
+            await asyncio.sleep(0.01)
+        pending = await other.cancel(job["job_id"])
+        done = await other.wait(job["job_id"], 5)
+        await holder.stop()
+        await other.stop()
+        return pending, done
+
+    pending, done = asyncio.run(run())
+    assert pending["status"] == "running"
+    assert pending["cancel_requested_at"] is not None
+    # The tool never finished: the holder cancelled it at its next renewal
+    assert done["status"] == "cancelled"
+
+
+def test_an_adopted_job_with_a_cancel_request_is_cancelled_not_run(session_factory):
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+    _insert_job(session_factory, "abandoned", "running", "crashed-process", expired)
+    db = session_factory()
+    try:
+        crud.request_ai_job_cancel(db, "abandoned", expired)
+    finally:
+        db.close()
+
+    async def run():
+        service = FakeService()
+        service.release.set()
+        queue = ai_jobs.AIJobQueue(service, session_factory, workers=1)
+        await queue.start()
+        job = await queue.get("abandoned")
+        await queue.stop()
+        return service.runs, job
+
+    runs, job = asyncio.run(run())
+    assert runs == []
+    assert job["status"] == "cancelled"
+
+
+def test_deleting_a_job_running_elsewhere_answers_202_with_the_pending_request(client):
+    _insert_job(database.SessionLocal, "elsewhere", "running", "live-process",
+                datetime.now(timezone.utc) + timedelta(hours=1))
+    response = client.delete("/ai/jobs/elsewhere")
+    assert response.status_code == 202
+    body = response.json()
+    assert body["status"] == "running"
+    assert body["cancel_requested_at"] is not None
+    assert client.get("/ai/jobs/elsewhere").json()["cancel_requested_at"] == body["cancel_requested_at"]
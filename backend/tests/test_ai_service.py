@@ -0,0 +1,254 @@
+import asyncio
+import functools
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import ai_service
+import crud
+import llm_providers
+import metrics
+import models
+import schemas
+import synthetic
+
+
+class HangingProvider(llm_providers.LLMProvider):
+    """Blocks the first call until `release` is set; later calls answer straight away"""
+
+    name = "hanging"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if self.calls == 1:
+            self.release.wait(10)
+        return llm_providers.GeneratedText("{}")
+
+
+def test_a_hung_call_keeps_its_slot_until_its_thread_finishes():
+    provider = HangingProvider()
+    service = ai_service.QMSAIService(max_concurrency=1, timeout=0.1, provider=provider)
+
+    async def run():
+        with pytest.raises(TimeoutError):
+            await service._generate("first", stream=False)
+        # The hung thread still holds the only executor worker, so the slot stays taken
+        assert service._semaphore.locked()
+        second = asyncio.ensure_future(service._generate("second", stream=False))
+        await asyncio.sleep(0.3)
+        assert not second.done()
+        provider.release.set()
+        # Once the thread returns the second call gets the worker and its full timeout
+        response = await second
+        await asyncio.sleep(0)
+        return response
+
+    response = asyncio.run(run())
+    assert response.text == "{}"
+    assert provider.calls == 2
+    assert not service._semaphore.locked()
+
+
+class CountingProvider(llm_providers.StubProvider):
+    """The stub provider, counting generate_content calls"""
+
+    def __init__(self):
+        super().__init__(latency="fixed:0.05")
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        return super().generate_content(prompt, stream=stream)
+
+
+def test_concurrent_identical_calls_share_one_llm_call(db):
+    crud.seed_sample_data(db)
+    provider = CountingProvider()
+    service = ai_service.QMSAIService(provider=provider)
+
+    async def run():
+        return await asyncio.gather(*(
+            service.execute_ai_tool("summarize_open_events", "What is open?", db) for _ in range(5)
+        ))
+
+    results = asyncio.run(run())
+    assert all(result == results[0] for result in results)
+    assert results[0].get("success")
+
+    # Exactly what a single run of the tool costs
+    alone = CountingProvider()
+    asyncio.run(ai_service.QMSAIService(provider=alone).execute_ai_tool("summarize_open_events", "What is open?", db))
+    assert provider.calls == alone.calls
+
+
+def test_an_audit_write_drops_cached_results(db):
+    crud.seed_sample_data(db)
+    provider = CountingProvider()
+    service = ai_service.QMSAIService(provider=provider)
+
+    def ask():
+        return asyncio.run(service.execute_ai_tool("summarize_open_events", "What is open?", db))
+
+    ask()
+    per_run = provider.calls
+    ask()
+    assert provider.calls == per_run
+    assert len(service.cache._entries) == 1
+
+    audit = crud.get_audits(db, limit=1)[0]
+    crud.update_audit(db, audit.audit_id, schemas.AuditUpdate(audit_title="Renamed"))
+    assert len(service.cache._entries) == 0
+    ask()
+    assert provider.calls == 2 * per_run
+
+
+def test_cancelling_one_waiter_leaves_the_others_running():
+    cache = ai_service.AIResponseCache()
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        return {"success": True, "value": 42}
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_compute(("key",), compute))
+        second = asyncio.ensure_future(cache.get_or_compute(("key",), compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+        return first, result
+
+    first, result = asyncio.run(run())
+    assert first.cancelled()
+    assert result == {"success": True, "value": 42}
+    assert runs == [1]
+    assert cache.get(("key",)) == result
+
+
+def test_the_work_stops_when_every_waiter_is_cancelled():
+    cache = ai_service.AIResponseCache()
+    finished = []
+
+    async def compute():
+        await asyncio.sleep(0.2)
+        finished.append(1)
+        return {"success": True}
+
+    async def run():
+        waiters = [asyncio.ensure_future(cache.get_or_compute(("key",), compute)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert finished == []
+    assert cache.get(("key",)) is None
+    assert not cache._inflight
+
+
+def test_an_edit_redoes_only_the_chunk_holding_the_audit(db, monkeypatch):
+    budget = 1000
+    monkeypatch.setattr(ai_service, "AI_CHUNK_TOKEN_BUDGET", budget)
+    monkeypatch.setattr(ai_service, "chunk_spans", functools.partial(ai_service.chunk_spans, budget=budget))
+    # Open and created just now, so every row is in summarize_open_events' window
+    crud.insert_audit_rows(db, (
+        dict(audit, status=models.AuditStatus.PLANNED, created_at=datetime.now())
+        for audit in synthetic.AuditGenerator(seed=4).audits(200)
+    ))
+    # Unpadded answers, so the partial results fit one prompt without a combine round
+    provider = llm_providers.StubProvider(latency="fixed:0", output_tokens=0)
+    service = ai_service.QMSAIService(provider=provider)
+
+    def summarize():
+        calls = provider.calls
+        result = asyncio.run(service.execute_ai_tool("summarize_open_events", "What is open?", db))
+        return result, provider.calls - calls
+
+    cold, cold_calls = summarize()
+    assert cold["success"] and cold["audit_count"] == 200
+    assert cold["chunks"] > 2
+    # One map call per chunk plus the final answer
+    assert cold_calls == cold["chunks"] + 1
+
+    audit = crud.get_open_audits(db)[100]
+    crud.update_audit(db, audit.audit_id, schemas.AuditUpdate(audit_title=audit.audit_title + " (edited)"))
+    rerun, rerun_calls = summarize()
+    assert rerun["success"]
+    # The edited chunk (and at most a neighbour whose content-defined boundary moved) plus the final answer
+    assert rerun_calls <= 3
+
+
+class SlowStreamingProvider(llm_providers.LLMProvider):
+    """Streams an answer in six chunks 50ms apart, counting the chunks it produced"""
+
+    name = "slow-streaming"
+    CHUNKS = ['{"notifications": {}, ', '"recommended_type": ', '"completion"', ", ", '"note": "x"', "}"]
+
+    def __init__(self):
+        self.sent = 0
+
+    def generate_content(self, prompt, stream=False):
+        def chunks():
+            for text in self.CHUNKS:
+                time.sleep(0.05)
+                self.sent += 1
+                yield llm_providers.GeneratedText(text)
+
+        if stream:
+            return chunks()
+        return llm_providers.GeneratedText("".join(chunk.text for chunk in chunks()))
+
+
+def test_closing_a_stream_stops_the_model_and_frees_its_slot(db):
+    crud.seed_sample_data(db)
+    provider = SlowStreamingProvider()
+    service = ai_service.QMSAIService(max_concurrency=1, provider=provider)
+
+    async def run():
+        # What the SSE routes do when the client disconnects after the first token
+        stream = service.stream_ai_tool("generate_notification", "Draft a notice", db)
+        async for kind, _ in stream:
+            if kind == "token":
+                break
+        await stream.aclose()
+        # Give the worker thread time to reach its next chunk and notice
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert provider.sent < len(provider.CHUNKS)
+    assert not service._semaphore.locked()
+
+
+class RecordingProvider(llm_providers.StubProvider):
+    """The stub provider, keeping every prompt it was sent"""
+
+    def __init__(self):
+        super().__init__(latency="fixed:0")
+        self.prompts = []
+
+    def generate_content(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        return super().generate_content(prompt, stream=stream)
+
+
+@pytest.mark.parametrize("tool", ["summarize_open_events", "identify_trends", "show_high_risk_events"])
+def test_each_tools_encoded_prompt_size_is_recorded(db, tool):
+    crud.seed_sample_data(db)
+    metrics.reset()
+    provider = RecordingProvider()
+    service = ai_service.QMSAIService(provider=provider)
+    assert asyncio.run(service.execute_ai_tool(tool, "What stands out?", db))["success"]
+
+    assert provider.prompts
+    assert metrics.LLM_PROMPT_TOKENS.count(tool) == len(provider.prompts)
+    recorded = next(line for line in metrics.render().splitlines()
+                    if line.startswith(f'qms_llm_prompt_tokens_sum{{tool="{tool}"}}'))
+    assert float(recorded.split()[-1]) == sum(llm_providers.estimate_tokens(p) for p in provider.prompts)
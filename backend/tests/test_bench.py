@@ -0,0 +1,17 @@
+from bench import endpoints
+
+
+def _run(**p95_ms):
+    return {"endpoints": {
+        name: {"p50_ms": p95 / 2, "p95_ms": p95, "p99_ms": p95 * 2, "throughput_rps": 100.0}
+        for name, p95 in p95_ms.items()
+    }}
+
+
+def test_only_p95_increases_past_the_threshold_are_regressions(capsys):
+    baseline = _run(list=10.0, detail=10.0, search=10.0)
+    current = _run(list=10.9, detail=11.5, search=5.0, summary=99.0)
+    assert endpoints.compare_endpoint_results(baseline, current, threshold_pct=10) == ["detail"]
+    output = capsys.readouterr().out
+    assert "summary        (not in baseline)" in output
+    assert output.count("REGRESSION") == 1
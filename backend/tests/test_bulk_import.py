@@ -0,0 +1,29 @@
+from sqlalchemy import text
+
+import crud
+from models import Audit
+
+ROW = dict(
+    audit_title="T", audit_type="Internal", audit_scope="scope", audit_objective="obj", auditee_name="n",
+    auditee_site_location="loc", auditee_country="USA", primary_contact_name="p",
+    confirmed_start_date="2025-01-01", confirmed_end_date="2025-01-05", lead_auditor="QA", audit_criteria="c",
+)
+
+
+def test_a_failed_batch_reports_the_bad_row_and_inserts_the_rest(db):
+    # A valid row the database still refuses, as a constraint or trigger would
+    db.execute(text(
+        "CREATE TRIGGER reject_bad_title BEFORE INSERT ON audits WHEN new.audit_title = 'bad' "
+        "BEGIN SELECT RAISE(ABORT, 'bad title'); END"
+    ))
+    db.commit()
+    titles = ["a", "b", "bad", "c", "d"]
+    rows = [(number, dict(ROW, audit_title=title)) for number, title in enumerate(titles, start=2)]
+
+    report = crud.bulk_create_audits(db, rows, batch_size=len(titles))
+
+    assert report["inserted"] == 4
+    assert report["failed"] == 1
+    assert [error["row"] for error in report["errors"]] == [4]
+    assert "bad title" in report["errors"][0]["errors"][0]
+    assert sorted(title for (title,) in db.query(Audit.audit_title)) == ["a", "b", "c", "d"]
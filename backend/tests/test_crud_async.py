@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import crud_async
+import database
+import schemas
+
+AUDIT = {
+    "audit_title": "Async session audit", "audit_type": "Internal", "audit_scope": "Warehouse controls",
+    "audit_objective": "Check temperature mapping.", "auditee_name": "Warehouse 2", "auditee_site_location": "Basel",
+    "auditee_country": "Switzerland", "primary_contact_name": "Contact", "confirmed_start_date": "2025-02-01",
+    "confirmed_end_date": "2025-02-03", "lead_auditor": "QA Manager", "audit_criteria": "EU GDP",
+}
+
+
+@pytest.fixture
+def async_session_factory(engine, tmp_path):
+    """AsyncSessions on aiosqlite over the same migrated database as `engine`"""
+    async_engine = database.create_async_db_engine(f"sqlite:///{tmp_path}/qms.db")
+    yield async_sessionmaker(async_engine, autoflush=False)
+    asyncio.run(async_engine.dispose())
+
+
+def test_the_aiosqlite_driver_is_used(async_session_factory):
+    assert async_session_factory.kw["bind"].dialect.driver == "aiosqlite"
+
+
+def test_crud_round_trip_through_an_async_session(async_session_factory):
+    async def run():
+        async with async_session_factory() as db:
+            created = await crud_async.create_audit(db, schemas.AuditCreate(**AUDIT))
+            audit_id = created.audit_id
+            version = await crud_async.get_audit_version(db, audit_id)
+            page, _, _ = await crud_async.get_audits_page(db, limit=10)
+            matches = await crud_async.search_audits(db, "temperature")
+            updated = await crud_async.update_audit(
+                db, audit_id, schemas.AuditUpdate(audit_team="Team 7"), expected_version=version[1]
+            )
+            counts = await crud_async.get_audit_status_counts(db)
+            total = await crud_async.get_audits_count(db)
+            deleted = await crud_async.delete_audit(db, audit_id)
+            missing = await crud_async.get_audit(db, audit_id)
+        return audit_id, page, matches, updated, counts, total, deleted, missing
+
+    audit_id, page, matches, updated, counts, total, deleted, missing = asyncio.run(run())
+    assert [row.audit_id for row in page] == [audit_id]
+    assert [row.audit_id for row, _ in matches] == [audit_id]
+    # Returned fully loaded, so reading it after the session closed does no lazy IO
+    assert updated.audit_team == "Team 7"
+    assert updated.to_dict()["audit_id"] == audit_id
+    assert counts == {"Planned": 1}
+    assert total == 1
+    assert deleted and missing is None
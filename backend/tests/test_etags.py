@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import schemas
+
+AUDIT = {
+    "audit_title": "ETag test", "audit_type": "Internal", "audit_scope": "scope", "audit_objective": "objective",
+    "auditee_name": "Line B", "auditee_site_location": "Boston, MA", "auditee_country": "USA",
+    "primary_contact_name": "Contact", "confirmed_start_date": "2025-01-01", "confirmed_end_date": "2025-01-05",
+    "lead_auditor": "QA Manager", "audit_criteria": "criteria",
+}
+
+
+@pytest.fixture
+def audit(client):
+    response = client.post("/audits/", json=AUDIT)
+    assert response.status_code == 200, response.text
+    return response.json()["audit_id"]
+
+
+def test_if_none_match_returns_304(client, audit):
+    etag = client.get(f"/audits/{audit}").headers["ETag"]
+    response = client.get(f"/audits/{audit}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+
+def test_a_stale_if_match_returns_412(client, audit):
+    etag = client.get(f"/audits/{audit}").headers["ETag"]
+    first = client.put(f"/audits/{audit}", json={"audit_title": "First"}, headers={"If-Match": etag})
+    assert first.status_code == 200
+    assert first.headers["ETag"] != etag
+    second = client.put(f"/audits/{audit}", json={"audit_title": "Second"}, headers={"If-Match": etag})
+    assert second.status_code == 412
+    assert client.get(f"/audits/{audit}").json()["audit_title"] == "First"
+
+
+@pytest.mark.parametrize("if_match", ["*", '"a1-1"'])
+def test_if_match_on_a_missing_audit_returns_412(client, if_match):
+    response = client.put("/audits/AUD-0000-MISSING", json={"audit_title": "x"}, headers={"If-Match": if_match})
+    assert response.status_code == 412
+    assert client.put("/audits/AUD-0000-MISSING", json={"audit_title": "x"}).status_code == 404
+
+
+def test_concurrent_puts_with_the_same_etag_let_one_through(client, audit):
+    etag = client.get(f"/audits/{audit}").headers["ETag"]
+    barrier = threading.Barrier(2)
+    statuses = []
+
+    def put(title):
+        barrier.wait()
+        statuses.append(client.put(f"/audits/{audit}", json={"audit_title": title}, headers={"If-Match": etag}).status_code)
+
+    threads = [threading.Thread(target=put, args=(title,)) for title in ("A", "B")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses) == [200, 412]
+
+
+def test_a_write_between_read_and_commit_raises_a_version_conflict(engine, monkeypatch):
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    setup, stale, winner = Session(), Session(), Session()
+    apply_risk = crud._apply_risk
+
+    def interleave(db_audit):
+        # After the stale update has read the row (version 1) and before it writes, another one commits
+        if winner.info.pop("pending", False):
+            crud.update_audit(winner, db_audit.audit_id, schemas.AuditUpdate(audit_title="Winner"))
+        apply_risk(db_audit)
+
+    try:
+        audit_id = crud.create_audit(setup, schemas.AuditCreate(**AUDIT)).audit_id
+        monkeypatch.setattr(crud, "_apply_risk", interleave)
+        winner.info["pending"] = True
+        with pytest.raises(crud.AuditVersionConflict):
+            crud.update_audit(stale, audit_id, schemas.AuditUpdate(audit_title="Loser"))
+        setup.expire_all()
+        audit = crud.get_audit(setup, audit_id)
+        assert (audit.audit_title, audit.row_version) == ("Winner", 2)
+    finally:
+        for session in (setup, stale, winner):
+            session.close()
@@ -0,0 +1,24 @@
+import pytest
+
+import crud
+
+
+@pytest.fixture
+def seeded(db):
+    crud.seed_sample_data(db)
+    return db
+
+
+def test_audit_id_match_overrides_match_for_audit_id_only(seeded):
+    audit_id = crud.get_audits(seeded)[0].audit_id
+    fragment = audit_id[4:].lower()
+    assert crud.get_audits(seeded, audit_id=fragment, match="prefix") == []
+    found = crud.get_audits(seeded, audit_id=fragment, match="prefix", audit_id_match="contains")
+    assert audit_id in [audit.audit_id for audit in found]
+    # match still governs the select-style filters
+    assert crud.get_audits(seeded, lead_auditor="manager", match="prefix", audit_id_match="contains") == []
+
+
+def test_unknown_audit_id_match_is_rejected(seeded):
+    with pytest.raises(ValueError):
+        crud.get_audits(seeded, audit_id="AUD", audit_id_match="fuzzy")
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+import ai_service
+import llm_providers
+import synthetic
+
+
+@pytest.mark.parametrize("value, expected", [
+    (5, 5),
+    ("7", 7),
+    (-5, 1),
+    (0, 1),
+    (10 ** 9, ai_service.HIGH_RISK_MAX_TOP_N),
+    ("lots", ai_service.HIGH_RISK_TOP_N),
+    (None, ai_service.HIGH_RISK_TOP_N),
+    (float("inf"), ai_service.HIGH_RISK_TOP_N),
+])
+def test_high_risk_limit_is_parsed_and_clamped(value, expected):
+    assert ai_service.high_risk_limit(value) == expected
+
+
+@pytest.mark.parametrize("limit, expected", [(-5, 1), (10 ** 9, ai_service.HIGH_RISK_MAX_TOP_N), ("x", ai_service.HIGH_RISK_TOP_N)])
+def test_show_high_risk_events_clamps_the_context_limit(db, limit, expected):
+    synthetic.load_audits(db, 1000, synthetic.AuditGenerator(seed=2))
+    service = ai_service.QMSAIService(provider=llm_providers.StubProvider(latency="fixed:0"))
+    context = {"limit": limit, "commentary": False}
+    result = asyncio.run(service.execute_ai_tool("show_high_risk_events", "risks", db, context))
+    analysis = result["ai_analysis"]
+    assert analysis["total_high_risk"] > ai_service.HIGH_RISK_MAX_TOP_N
+    assert len(analysis["high_risk_audits"]) == expected
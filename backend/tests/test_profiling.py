@@ -0,0 +1,21 @@
+import sys
+from types import SimpleNamespace
+
+import profiling
+
+
+class Sampled:
+    def method(self):
+        return sys._getframe()
+
+
+def test_frames_are_keyed_by_qualified_name_where_available():
+    name, filename, _ = profiling._frame_key(Sampled().method())
+    assert name == ("Sampled.method" if sys.version_info >= (3, 11) else "method")
+    assert filename == __file__
+
+
+def test_frames_fall_back_to_the_bare_name_before_python_3_11():
+    # Code objects before 3.11 have no co_qualname
+    code = SimpleNamespace(co_name="method", co_filename="app.py", co_firstlineno=7)
+    assert profiling._frame_key(SimpleNamespace(f_code=code)) == ("method", "app.py", 7)
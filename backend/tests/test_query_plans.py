@@ -0,0 +1,89 @@
+"""EXPLAIN QUERY PLAN checks for every list filter combination, match mode and sort.
+
+A filtered listing must seek an index on audits (a "SEARCH audits" step). Accepted exceptions:
+
+* every filter is a `contains` text filter: LIKE '%x%' cannot use a B-tree index, so the
+  planner walks the sort's keyset index and filters rows until LIMIT is reached;
+* a sort other than the default created_at walks its own (sort, id) index the same way;
+  only created_at has composite (filter, created_at, id) indexes.
+
+crud.get_audits orders by id, so for it the walk is a plain "SCAN audits" in rowid order;
+for every other listing a bare "SCAN audits" is a failure.
+"""
+import itertools
+
+import pytest
+from sqlalchemy import event
+
+import crud
+import synthetic
+
+FILTERS = {
+    "audit_id": "AUD-2025-0000",
+    "audit_type": "Regulatory",
+    "status": "Planned",
+    "lead_auditor": "QA Manager",
+    "site": "India",
+}
+TEXT_FILTERS = {"audit_id", "lead_auditor", "site"}
+DEFAULT_SORT = "created_at"
+
+
+def _plan(engine, statement, parameters):
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+
+def _sort_walks(sort):
+    """Plan steps that read audits in the listing's order without seeking"""
+    if sort == "id":
+        return {"SCAN audits"}
+    walks = {f"SCAN audits USING INDEX ix_audits_{sort}_id"}
+    if sort == "audit_id":
+        # audit_id's unique index serves the same (audit_id, id) order
+        walks.add("SCAN audits USING INDEX ix_audits_audit_id")
+    return walks
+
+
+def _accepted_scan(names, match, sort, plan):
+    if not any(line.strip() in _sort_walks(sort) for line in plan):
+        return False
+    if match == "contains" and set(names) <= TEXT_FILTERS:
+        return True
+    return sort != DEFAULT_SORT
+
+
+@pytest.fixture
+def audits(engine, db):
+    # load_audits runs ANALYZE, so the planner sees realistic statistics
+    synthetic.load_audits(db, 2000, synthetic.AuditGenerator(seed=11))
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM audits" in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield db, captured
+    event.remove(engine, "before_cursor_execute", capture)
+
+
+@pytest.mark.parametrize("match", crud.FILTER_MATCH_MODES)
+def test_filtered_listings_seek_an_index(engine, audits, match):
+    db, captured = audits
+    failures = []
+    for size in range(1, len(FILTERS) + 1):
+        for names in itertools.combinations(FILTERS, size):
+            kwargs = {name: FILTERS[name] for name in names}
+            for sort in ["id", *crud.SORTABLE_COLUMNS]:
+                captured.clear()
+                if sort == "id":
+                    crud.get_audits(db, match=match, **kwargs)
+                else:
+                    crud.get_audits_page(db, sort=sort, match=match, **kwargs)
+                for statement, parameters in captured:
+                    plan = _plan(engine, statement, parameters)
+                    if not any(line.strip().startswith("SEARCH audits") for line in plan) \
+                            and not _accepted_scan(names, match, sort, plan):
+                        failures.append((names, sort, plan))
+    assert not failures, "\n".join(f"{names} sort={sort}: {plan}" for names, sort, plan in failures)
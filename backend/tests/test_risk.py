@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+
+import crud
+import risk
+from models import Audit, AuditStatus, AuditType
+
+TODAY = date(2025, 6, 1)
+
+
+def _audit(**fields):
+    audit = {
+        "audit_type": AuditType.INTERNAL, "status": AuditStatus.PLANNED, "audit_title": "Annual GMP Review",
+        "audit_scope": "Line B", "audit_objective": "Verify compliance.", "auditee_site_location": "Boston, MA",
+        "auditee_country": risk.HOME_COUNTRY, "proposed_start_date": date(2025, 7, 1),
+        "confirmed_start_date": date(2025, 7, 1), "confirmed_end_date": date(2025, 7, 3),
+    }
+    audit.update(fields)
+    return audit
+
+
+def test_a_plain_supplier_audit_is_below_the_high_risk_threshold():
+    score, factors = risk.score_audit(_audit(audit_type=AuditType.SUPPLIER_VENDOR, audit_title="Qualification Audit for API Inc."), TODAY)
+    assert score < risk.HIGH_RISK_MIN_SCORE
+    assert factors == ["Supplier/Vendor audit"]
+
+
+@pytest.mark.parametrize("fields", [
+    {"audit_title": "Critical Raw Material Audit of Apex Chemicals Ltd."},
+    {"audit_objective": "To qualify the supplier of sterile components."},
+])
+def test_a_critical_material_supplier_audit_scores_seven_to_eight(fields):
+    score, factors = risk.score_audit(_audit(audit_type=AuditType.SUPPLIER_VENDOR, **fields), TODAY)
+    assert 7 <= score <= 8
+    assert factors == ["Supplier audit of critical materials"]
+
+
+def test_mild_factors_do_not_add_up_to_high_risk():
+    audit = _audit(audit_type=AuditType.SUPPLIER_VENDOR, auditee_country="India")
+    score, factors = risk.score_audit(audit, TODAY)
+    assert score < risk.HIGH_RISK_MIN_SCORE
+    assert factors == ["International audit", "Supplier/Vendor audit"]
+
+
+def test_a_scope_naming_the_auditees_sites_is_not_multi_site():
+    audit = _audit(audit_scope="Walkthrough of the production sites and warehouse")
+    assert risk.score_audit(audit, TODAY) == (0, [])
+    audit = _audit(auditee_site_location="Multi-site: Boston, MA")
+    assert risk.score_audit(audit, TODAY) == (6, ["Multi-site audit"])
+
+
+def test_high_risk_factors_compound():
+    audit = _audit(audit_type=AuditType.REGULATORY, confirmed_end_date=date(2025, 1, 1))
+    score, factors = risk.score_audit(audit, TODAY)
+    assert score == 10
+    assert factors == ["Regulatory audit", "Overdue by 151 days"]
+
+
+def test_overdue_scores_grow_with_the_delay():
+    scores = [risk.score_audit(_audit(confirmed_end_date=date.fromordinal(TODAY.toordinal() - days)), TODAY)[0]
+              for days in (10, 45, 120)]
+    assert scores == [6, 7, 8]
+
+
+def test_closed_audits_are_never_overdue():
+    audit = _audit(status=AuditStatus.CLOSED, confirmed_end_date=date(2025, 1, 1))
+    assert risk.score_audit(audit, TODAY) == (0, [])
+
+
+def test_scores_from_older_rules_are_refreshed(db):
+    crud.seed_sample_data(db)
+    db.query(Audit).update({Audit.risk_score: 0, Audit.risk_rules_version: risk.RULES_VERSION - 1})
+    db.commit()
+    assert crud.refresh_risk_scores(db) == db.query(Audit).count()
+    assert db.query(Audit).filter(Audit.risk_rules_version < risk.RULES_VERSION).count() == 0
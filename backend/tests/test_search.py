@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import text
+
+import crud
+import models
+import schemas
+from models import Audit
+
+AUDIT = {
+    "audit_title": "Sterile filling review", "audit_type": "Internal", "audit_scope": "Aseptic processing on Line C",
+    "audit_objective": "Verify gowning practices.", "auditee_name": "Line C", "auditee_site_location": "Cork",
+    "auditee_country": "Ireland", "primary_contact_name": "Contact", "confirmed_start_date": "2025-01-01",
+    "confirmed_end_date": "2025-01-05", "lead_auditor": "QA Manager", "audit_criteria": "EU GMP Annex 1",
+}
+
+
+def _ids(matches):
+    return [row.audit_id for row, _ in matches]
+
+
+def _fts_rowids(db, term):
+    return [rowid for (rowid,) in db.execute(
+        text("SELECT rowid FROM audits_fts WHERE audits_fts MATCH :term"), {"term": term}
+    )]
+
+
+def test_the_index_follows_inserts_updates_and_deletes(db):
+    audit = crud.create_audit(db, schemas.AuditCreate(**AUDIT))
+    assert _ids(crud.search_audits(db, "aseptic")) == [audit.audit_id]
+
+    crud.update_audit(db, audit.audit_id, schemas.AuditUpdate(audit_scope="Lyophilization on Line C"))
+    assert crud.search_audits(db, "aseptic") == []
+    assert _ids(crud.search_audits(db, "lyophilization")) == [audit.audit_id]
+    assert _fts_rowids(db, "aseptic") == []
+
+    crud.delete_audit(db, audit.audit_id)
+    assert crud.search_audits(db, "lyophilization") == []
+    assert _fts_rowids(db, "lyophilization") == []
+
+
+def test_updates_to_other_columns_leave_the_index_alone(db):
+    audit = crud.create_audit(db, schemas.AuditCreate(**AUDIT))
+    crud.update_audit(db, audit.audit_id, schemas.AuditUpdate(lead_auditor="Head of Quality"))
+    assert _ids(crud.search_audits(db, "gowning")) == [audit.audit_id]
+    assert db.execute(text("SELECT count(*) FROM audits_fts")).scalar() == db.query(Audit).count()
+
+
+def test_terms_are_anded_and_the_last_is_a_prefix(db):
+    audit = crud.create_audit(db, schemas.AuditCreate(**AUDIT))
+    crud.create_audit(db, schemas.AuditCreate(**dict(AUDIT, audit_title="Warehouse review", audit_scope="Storage")))
+    assert _ids(crud.search_audits(db, "sterile fill")) == [audit.audit_id]
+    assert crud.search_audits(db, "sterile warehouse") == []
+    snippet = crud.search_audits(db, "gowning")[0][1]
+    assert "[gowning]" in snippet
+
+
+def test_existing_rows_are_indexed_when_the_search_table_is_created(engine, db):
+    crud.create_audit(db, schemas.AuditCreate(**AUDIT))
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE audits_fts"))
+        for trigger in ("ai", "ad", "au"):
+            conn.execute(text(f"DROP TRIGGER audits_fts_{trigger}"))
+    models.create_search_index(engine)
+    assert len(crud.search_audits(db, "aseptic")) == 1
+
+
+@pytest.fixture
+def like_fallback(db, monkeypatch):
+    """search_audits as it runs on databases without FTS5"""
+    monkeypatch.setattr(db.get_bind().dialect, "name", "postgresql")
+
+
+def test_the_like_fallback_matches_every_term_in_any_narrative_column(db, like_fallback):
+    audit = crud.create_audit(db, schemas.AuditCreate(**AUDIT))
+    other = crud.create_audit(db, schemas.AuditCreate(**dict(AUDIT, audit_title="Warehouse review", audit_scope="Storage")))
+    assert _ids(crud.search_audits(db, "STERILE annex")) == [audit.audit_id]
+    assert sorted(_ids(crud.search_audits(db, "review"))) == sorted([audit.audit_id, other.audit_id])
+    assert crud.search_audits(db, "sterile warehouse") == []
+    assert crud.search_audits(db, "  ") == []
+    assert all(snippet is None for _, snippet in crud.search_audits(db, "review"))
+
+
+def test_the_like_fallback_treats_underscores_literally(db, like_fallback):
+    crud.create_audit(db, schemas.AuditCreate(**AUDIT))
+    assert crud.search_audits(db, "Line_C") == []
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+
+import orjson
+from sqlalchemy import text
+
+import crud
+import schemas
+import serialization
+import synthetic
+from models import Audit
+
+
+def _validated_detail(audit):
+    """What the route produced before RowEncoder: the model validated from Audit.to_dict()"""
+    return schemas.AuditResponse(**audit.to_dict()).model_dump(mode="json")
+
+
+def _validated_list_item(audit, snippet=None):
+    """The list route's original dict, validated as AuditListResponse"""
+    return schemas.AuditListResponse(
+        id=audit.id,
+        audit_id=audit.audit_id,
+        audit_title=audit.audit_title,
+        audit_type=audit.audit_type.value if audit.audit_type else "",
+        status=audit.status.value if audit.status else "",
+        auditee_name=audit.auditee_name,
+        lead_auditor=audit.lead_auditor,
+        confirmed_end_date=audit.confirmed_end_date.isoformat() if audit.confirmed_end_date else "",
+        auditee_country=audit.auditee_country,
+        snippet=snippet,
+    ).model_dump(mode="json")
+
+
+def _seed(db):
+    crud.seed_sample_data(db)
+    synthetic.load_audits(db, 20, synthetic.AuditGenerator(seed=3))
+    audits = db.query(Audit).order_by(Audit.id).all()
+    # Cover a whole-second timestamp, an updated row, and optional columns left empty
+    audits[0].created_at = datetime(2025, 3, 1, 8, 0, 0, tzinfo=timezone.utc)
+    audits[1].audit_title += " (revised)"
+    audits[2].primary_contact_email = None
+    audits[2].audit_team = None
+    audits[2].audit_agenda = None
+    audits[2].proposed_start_date = None
+    audits[2].proposed_end_date = None
+    db.commit()
+    # status is nullable; the list view renders a missing one as ""
+    db.execute(text("UPDATE audits SET status = NULL WHERE id = :id"), {"id": audits[3].id})
+    db.commit()
+    db.expire_all()
+    return [audit.audit_id for audit in audits]
+
+
+def test_detail_encoding_matches_the_validated_model(db):
+    for audit_id in _seed(db):
+        audit = crud.get_audit(db, audit_id)
+        if audit.status is None:
+            continue  # AuditResponse.status is required; such a row never reached the detail route
+        assert orjson.loads(serialization.audit_json(audit)) == _validated_detail(audit)
+
+
+def test_list_encoding_matches_the_validated_model(db):
+    _seed(db)
+    rows, _, _ = crud.get_audits_page(db, limit=100)
+    encoded = orjson.loads(serialization.audit_list_json([(row, None) for row in rows]))
+    expected = [_validated_list_item(db.get(Audit, row.id)) for row in rows]
+    assert encoded == expected
+    assert any(item["status"] == "" for item in encoded)
+
+
+def test_search_results_carry_their_snippet(db):
+    _seed(db)
+    matches = crud.search_audits(db, "compliance")
+    assert matches and all(snippet for _, snippet in matches)
+    encoded = orjson.loads(serialization.audit_list_json(matches))
+    assert encoded == [_validated_list_item(db.get(Audit, row.id), snippet) for row, snippet in matches]
+
+
+def test_orm_objects_encode_like_projected_rows(db):
+    _seed(db)
+    rows, _, _ = crud.get_audits_page(db, limit=100)
+    objects = [db.get(Audit, row.id) for row in rows]
+    assert serialization.audit_list_json([(audit, None) for audit in objects]) == \
+        serialization.audit_list_json([(row, None) for row in rows])
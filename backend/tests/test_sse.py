@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import sse
+
+DOCUMENTS = [
+    '{"summary": "Three \\"overdue\\" audits, one at C:\\\\QA", "total": 3, "ok": true, "none": null}',
+    '{"key {with}: [brackets], commas": "value, with: {braces}", "unicode": "caf\\u00e9 \\ud83d\\ude00"}',
+    '{"nested": {"a": [1, {"b": "}"}], "c": "]"}, "list": ["x", "y\\n"], "n": -1.5e3}',
+    '```json\n{"after_fence": "yes", "empty": "", "obj": {}, "arr": []}\n```',
+]
+
+
+def _fields(chunks):
+    parser = sse.PartialJSONFields()
+    return [field for chunk in chunks for field in parser.feed(chunk)]
+
+
+def _expected(document):
+    return list(json.loads(document[document.index("{"):document.rindex("}") + 1]).items())
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_fields_survive_every_chunk_boundary(document):
+    expected = _expected(document)
+    for split in range(len(document) + 1):
+        assert _fields([document[:split], document[split:]]) == expected, split
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_fields_from_single_character_chunks(document):
+    assert _fields(list(document)) == _expected(document)
+
+
+def test_each_field_is_reported_as_soon_as_its_value_completes():
+    parser = sse.PartialJSONFields()
+    assert parser.feed('{"summary": "Two au') == []
+    assert parser.feed('dits", "total": 2') == [("summary", "Two audits")]
+    assert parser.feed(', "items": [1, 2') == [("total", 2)]
+    assert parser.feed(']}') == [("items", [1, 2])]
+    # Anything after the closing brace is ignored
+    assert parser.feed('{"more": 1}') == []
+
+
+def test_a_value_that_does_not_parse_is_dropped():
+    assert _fields(['{"bad": tru, "good": 1}']) == [("good", 1)]
+
+
+def _events(lines):
+    events, event = [], None
+    for line in lines:
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/ai/query/stream", {"tool": "summarize_open_events", "query": "What is open?"}),
+    ("/ai/chat/stream", {"message": "Summarize the open audits"}),
+])
+def test_streaming_routes_send_start_tokens_fields_result_done(client, path, body):
+    with client.stream("POST", path, json=body) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.headers["cache-control"] == "no-cache"
+        events = _events(response.iter_lines())
+
+    names = [name for name, _ in events]
+    assert names[0] == "start"
+    assert names[-2:] == ["result", "done"]
+    assert "token" in names and "error" not in names
+    text = "".join(data["text"] for name, data in events if name == "token")
+    fields = [(data["key"], data["value"]) for name, data in events if name == "field"]
+    assert fields == _expected(text)
+    result = events[-2][1]
+    assert result["success"] is True
+
+
+def test_a_streamed_batch_sends_one_result_event_per_request(client):
+    requests = [
+        {"tool": "summarize_open_events", "query": "Summarize open audits"},
+        {"tool": "identify_trends", "query": "What trends do you see?"},
+        {"tool": "show_high_risk_events", "query": "Show high-risk audits"},
+    ]
+    with client.stream("POST", "/ai/batch", json={"requests": requests},
+                       headers={"Accept": "text/event-stream"}) as response:
+        assert response.status_code == 200
+        events = _events(response.iter_lines())
+
+    assert [name for name, _ in events] == ["start", "result", "result", "result", "done"]
+    results = sorted((data for name, data in events if name == "result"), key=lambda data: data["index"])
+    assert [result["tool"] for result in results] == [request["tool"] for request in requests]
+    assert events[-1][1] == {"success": True}
@@ -16,6 +16,7 @@ import {
 } from 'lucide-react';
 import { useDispatch } from 'react-redux';
 import { fetchAudits, setFilters } from '../redux/auditSlice';
+import aiAPI from '../services/aiAPI';
 
 const AIAssistant = ({ audits }) => {
   const [isExpanded, setIsExpanded] = useState(false);
@@ -25,6 +26,7 @@ const AIAssistant = ({ audits }) => {
   const [availableTools, setAvailableTools] = useState([]);
   const [selectedTool, setSelectedTool] = useState(null);
   const messagesEndRef = useRef(null);
+  const abortRef = useRef(null);
   const dispatch = useDispatch();
 
   const scrollToBottom = () => {
@@ -44,6 +46,9 @@ const AIAssistant = ({ audits }) => {
       content: 'Hi! I\'m your QMS AI Assistant. I can help you analyze audits, identify risks, generate reports, and provide recommendations. Try asking me to "show high-risk events" or "summarize open audits".',
       timestamp: new Date().toISOString()
     }]);
+
+    // Closing the stream cancels any AI query still running on the server
+    return () => abortRef.current?.abort();
   }, []);
 
   const fetchAITools = async () => {
@@ -81,54 +86,66 @@ const AIAssistant = ({ audits }) => {
     };
     setMessages(prev => [...prev, userMessage]);
 
-    try {
-      const response = await fetch('http://localhost:8000/ai/query', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
-          query: userQuery,
-          tool: tool,
-          context: context
-        })
-      });
-
-      if (!response.ok) {
-        throw new Error(`Server error: ${response.status} ${response.statusText}`);
-      }
+    // Placeholder AI message, filled in as fields of the answer stream in
+    const aiMessageId = (Date.now() + 1).toString();
+    const updateAIMessage = (changes) => {
+      setMessages(prev => prev.map(message => (
+        message.id === aiMessageId ? { ...message, ...changes(message) } : message
+      )));
+    };
+    setMessages(prev => [...prev, {
+      id: aiMessageId,
+      type: 'ai',
+      content: {},
+      tool: tool,
+      timestamp: new Date().toISOString()
+    }]);
 
-      const data = await response.json();
-      
-      // Add AI response
-      const aiMessage = {
-        id: (Date.now() + 1).toString(),
-        type: 'ai',
-        content: data.result || data,
-        tool: tool,
-        success: data.success,
-        timestamp: new Date().toISOString(),
-        error: data.error
-      };
-      
-      setMessages(prev => [...prev, aiMessage]);
-
-      // If the tool returns filtered audits, update the main audit list
-      if (data.success && data.result && data.result.filtered_audits && data.result.filtered_audits.length > 0) {
-        dispatch(fetchAudits(data.result.filtered_audits));
-        dispatch(setFilters({ ai_filtered: true }));
-      }
+    const controller = new AbortController();
+    abortRef.current = controller;
+
+    try {
+      await aiAPI.streamAIQuery(tool, userQuery, context, (event, data) => {
+        if (event === 'field') {
+          updateAIMessage(message => ({
+            content: {
+              ...message.content,
+              ai_analysis: { ...message.content.ai_analysis, [data.key]: data.value }
+            }
+          }));
+        } else if (event === 'result') {
+          // Same payload as /ai/query
+          updateAIMessage(() => ({
+            content: data.result || data,
+            success: data.success,
+            error: data.error
+          }));
+
+          // If the tool returns filtered audits, update the main audit list
+          if (data.success && data.result && data.result.filtered_audits && data.result.filtered_audits.length > 0) {
+            dispatch(fetchAudits(data.result.filtered_audits));
+            dispatch(setFilters({ ai_filtered: true }));
+          }
+        } else if (event === 'error') {
+          throw new Error(data.error);
+        }
+      }, controller.signal);
 
     } catch (error) {
-      console.error('AI Query Error:', error);
-      const errorMessage = {
-        id: (Date.now() + 1).toString(),
-        type: 'error',
-        content: `Failed to process request: ${error.message}`,
+      const cancelled = error.name === 'AbortError';
+      if (!cancelled) {
+        console.error('AI Query Error:', error);
+      }
+      setMessages(prev => [...prev.filter(message => message.id !== aiMessageId), {
+        id: aiMessageId,
+        type: cancelled ? 'system' : 'error',
+        content: cancelled ? 'Request cancelled.' : `Failed to process request: ${error.message}`,
         timestamp: new Date().toISOString()
-      };
-      setMessages(prev => [...prev, errorMessage]);
+      }]);
     } finally {
+      if (abortRef.current === controller) {
+        abortRef.current = null;
+      }
       setLoading(false);
     }
   };
@@ -564,9 +581,18 @@ const AIAssistant = ({ audits }) => {
         
         {loading && (
           <div className="ai-bubble response">
-            <div className="flex items-center text-sm text-gray-600">
-              <Loader2 className="w-4 h-4 mr-2 animate-spin" />
-              AI is analyzing your request...
+            <div className="flex items-center justify-between text-sm text-gray-600">
+              <span className="flex items-center">
+                <Loader2 className="w-4 h-4 mr-2 animate-spin" />
+                AI is analyzing your request...
+              </span>
+              <button
+                onClick={() => abortRef.current?.abort()}
+                className="text-xs text-gray-500 hover:text-gray-700"
+                title="Stop generating"
+              >
+                Stop
+              </button>
             </div>
           </div>
         )}
@@ -1,5 +1,50 @@
 import api from './api';
 
+// Reads a text/event-stream response, calling onEvent(name, data) for each event
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let name = 'message';
+      const data = [];
+      block.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) name = line.slice(7);
+        else if (line.startsWith('data: ')) data.push(line.slice(6));
+      });
+      // Blocks without data are keep-alive comments
+      if (data.length) onEvent(name, JSON.parse(data.join('\n')));
+    }
+  }
+};
+
+const streamAI = async (path, body, onEvent, signal) => {
+  const response = await fetch(`${api.defaults.baseURL}${path}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream'
+    },
+    body: JSON.stringify(body),
+    signal
+  });
+
+  if (!response.ok) {
+    throw new Error(`Server error: ${response.status} ${response.statusText}`);
+  }
+  await readEventStream(response, onEvent);
+};
+
 export const aiAPI = {
   // Get available AI tools
   getAITools: async () => {
@@ -27,6 +72,33 @@ export const aiAPI = {
     }
   },
 
+  // Execute several AI queries in one round trip; requests is a list of { tool, query, context }
+  executeAIBatch: async (requests) => {
+    try {
+      const response = await api.post('/ai/batch', { requests });
+      return response.data;
+    } catch (error) {
+      console.error('AI batch failed:', error);
+      throw new Error(`AI batch failed: ${error.response?.data?.detail || error.message}`);
+    }
+  },
+
+  // Stream a batch, receiving a result event ({ index, ...AI response }) as each query completes
+  streamAIBatch: (requests, onEvent, signal) => {
+    return streamAI('/ai/batch', { requests }, onEvent, signal);
+  },
+
+  // Stream an AI query as it is generated: start, token, field, result and done events.
+  // Aborting `signal` closes the connection, which cancels the query on the server.
+  streamAIQuery: (tool, query, context = null, onEvent, signal) => {
+    return streamAI('/ai/query/stream', { tool, query, context }, onEvent, signal);
+  },
+
+  // Streaming variant of aiChat; the result event carries the /ai/chat response
+  streamAIChat: (message, context = null, onEvent, signal) => {
+    return streamAI('/ai/chat/stream', { message, context }, onEvent, signal);
+  },
+
   // General AI chat interface
   aiChat: async (message, context = null) => {
     try {
@@ -36,7 +36,9 @@ api.interceptors.response.use(
 export const auditAPI = {
   // Get all audits with optional filters
   getAudits: async (filters = {}) => {
-    const params = new URLSearchParams();
+    // Prefix matching lets the backend answer the lead auditor and site selects from its
+    // indexes; the free-text audit ID box keeps case-insensitive substring matching
+    const params = new URLSearchParams({ match: 'prefix', audit_id_match: 'contains' });
     Object.keys(filters).forEach(key => {
       if (filters[key] && filters[key] !== 'All') {
         params.append(key, filters[key]);